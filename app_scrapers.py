@@ -0,0 +1,152 @@
+import requests
+from urllib.parse import urlparse
+
+import http_client
+import title_index
+from page import as_page
+from socials import (
+    SOCIAL_PATTERNS,
+    PLATFORM_REGEXES,
+    SOCIAL_HOSTS,
+    SOCIAL_REGEX,
+    match_platforms,
+    in_platform_order,
+)
+
+# Domains to exclude when scraping social links
+EXCLUDE_DOMAINS = ['.gov', 'wix']
+
+# Campaign detection exclusions
+CAMPAIGN_EXCLUDE = ['jotform.com', 'docs.google.com', 'forms.google.com']
+
+
+def find_ballotpedia_url(name):
+    known = title_index.lookup_url(name)
+    if known:
+        return known
+    slug = name.replace(' ', '_')
+    url = f"https://ballotpedia.org/{slug}"
+    try:
+        r = http_client.head(url, allow_redirects=True, timeout=5)
+        if r.status_code < 400:
+            return url
+        if r.status_code in title_index.MISSING_STATUSES:
+            return title_index.hint_url(name)
+    except requests.RequestException:
+        pass
+    # Fallback via SerpAPI could go here
+    return None
+
+
+def find_campaign_site(bp_url):
+    """Find the first external link on the Ballotpedia page (URL or Page) that isn't BP or excluded."""
+    if not bp_url:
+        return None
+    try:
+        for href in as_page(bp_url).anchors:
+            lhref = href.lower()
+            if not href.startswith('http'):
+                continue
+            # skip Ballotpedia itself and common excludes
+            if 'ballotpedia' in lhref or any(ex in lhref for ex in CAMPAIGN_EXCLUDE):
+                continue
+            return href
+    except requests.RequestException:
+        pass
+    return None
+
+
+def extract_infobox_socials(bp_url):
+    """Grab the social links from Ballotpedia’s infobox table (URL or Page)."""
+    socials = {}
+    if not bp_url:
+        return socials
+    try:
+        rows = as_page(bp_url).infobox_rows
+        if not rows:
+            return socials
+
+        for row in rows:
+            if row['th'] is None or not row['links']:
+                continue
+            label = row['th'].lower()
+            href = row['links'][0]
+            lhref = href.lower()
+            if not href.startswith('http'):
+                continue
+            # skip share-widget redirects
+            if 'special:redirect/media' in lhref or 'sharer.php' in lhref:
+                continue
+            # skip generic excludes
+            if any(ex in lhref for ex in EXCLUDE_DOMAINS):
+                continue
+            # match by label or by pattern
+            matched = set(match_platforms(href))
+            for platform in SOCIAL_PATTERNS:
+                if platform in matched or platform.lower() in label:
+                    socials[platform] = href
+        return socials
+    except requests.RequestException:
+        return {}
+
+
+def extract_social_links(url):
+    """Scrape raw <a> tags, but only keep true, direct links—
+       no share widgets and no links mentioning 'ballotpedia' or any EXCLUDE_DOMAINS.
+       url may also be an already fetched Page."""
+    socials = {}
+    if not url:
+        return socials
+    try:
+        anchors = as_page(url).anchors
+
+        # Single pass: the link's host picks the platform, so each link is
+        # checked once no matter how many platforms there are
+        for href in anchors:
+            if not SOCIAL_REGEX.search(href):
+                continue
+            lhref = href.lower()
+
+            # skip anything that mentions 'ballotpedia' or any excluded substring (e.g. wix)
+            if 'ballotpedia' in lhref or any(ex in lhref for ex in EXCLUDE_DOMAINS):
+                continue
+
+            # parse domain
+            parsed = urlparse(href)
+            domain = parsed.netloc.lower().split(':')[0]
+
+            # only accept official social domains
+            platform = SOCIAL_HOSTS.get(domain)
+            if platform and platform not in socials and PLATFORM_REGEXES[platform].search(href):
+                socials[platform] = href
+
+        socials = in_platform_order(socials)
+        return socials
+
+    except requests.RequestException:
+        return {}
+
+
+def ballotpedia_extracts(bp):
+    """
+    Returns (campaign site, Ballotpedia socials) from one fetch of the
+    Ballotpedia page (URL or Page).
+    """
+    # Fetch and parse the Ballotpedia page once for all three extractors
+    try:
+        bp_page = as_page(bp) if bp else None
+    except requests.RequestException:
+        bp_page = None
+    camp = find_campaign_site(bp_page)
+    # Ballotpedia socials = infobox + body
+    sb_infobox = extract_infobox_socials(bp_page)
+    sb_body = extract_social_links(bp_page)
+    return camp, {**sb_infobox, **sb_body}
+
+
+def get_candidate_socials(name):
+    bp = find_ballotpedia_url(name)
+    camp, socials_bp = ballotpedia_extracts(bp)
+    # campaign-site socials = body only
+    socials_camp = extract_social_links(camp) if camp else {}
+    return bp, camp, socials_bp, socials_camp
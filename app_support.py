@@ -0,0 +1,261 @@
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+import app_scrapers
+import batch
+import candidate_graph
+import contact_info
+import http_cache
+import result_store
+from contact_info import normalize_site
+from page import fetch_page
+from run_state import RunState
+from socials import SOCIAL_PATTERNS
+from throttle import HostQueue
+
+# How long lookups are reused across reruns and sessions (seconds)
+LOOKUP_TTL = int(os.getenv('SCRAPE_UI_CACHE_TTL', 3600))
+LOOKUP_MAX_ENTRIES = 1000
+
+# How often a running lookup's partial results are re-rendered (seconds)
+POLL_INTERVAL = 0.5
+
+# Batch uploads: concurrent rows, and the run state that lets resolved
+# candidates be reused by later uploads (see run_state.RunState)
+BATCH_WORKERS = int(os.getenv('SCRAPE_UI_BATCH_WORKERS', 8))
+UI_STATE_PATH = os.getenv('SCRAPE_UI_STATE')  # default: ui_state.sqlite in http_cache.CACHE_DIR
+
+# Per-row fields left out of the CSV/Parquet exports (still in JSONL)
+NESTED_FIELDS = ('sources',)
+
+
+def normalize_name(name):
+    """Cache key form of a typed candidate name."""
+    return ' '.join(name.split())
+
+
+# Streamlit data cache: shared by every session, keyed by the arguments
+
+@st.cache_data(ttl=LOOKUP_TTL, max_entries=LOOKUP_MAX_ENTRIES, show_spinner=False)
+def cached_ballotpedia_url(name):
+    # Races the slug guess against the result store / MediaWiki API, and
+    # leaves the page in the HTTP cache for cached_ballotpedia_extracts.
+    # Raises when the slug page couldn't be checked, so only real misses are cached
+    return candidate_graph.find_ballotpedia_url(name, raise_errors=True)
+
+
+@st.cache_data(ttl=LOOKUP_TTL, max_entries=LOOKUP_MAX_ENTRIES, show_spinner=False)
+def cached_ballotpedia_extracts(bp_url):
+    # fetch_page raises on failure, so failed fetches are not cached
+    return app_scrapers.ballotpedia_extracts(fetch_page(bp_url))
+
+
+@st.cache_data(ttl=LOOKUP_TTL, max_entries=LOOKUP_MAX_ENTRIES, show_spinner=False)
+def cached_social_links(url):
+    # fetch_page raises on failure, so failed fetches are not cached
+    return app_scrapers.extract_social_links(fetch_page(url))
+
+
+@st.cache_data(ttl=LOOKUP_TTL, max_entries=LOOKUP_MAX_ENTRIES, show_spinner=False)
+def cached_contact_info(url):
+    # Raises on failure, so failed fetches are not cached
+    info = contact_info.crawl_contact_info(url)
+    store = result_store.get_store()
+    if store is not None:
+        store.record_contacts(url, info)
+    return info
+
+
+def lookup_candidate(lookup, name):
+    """
+    The socialmediaapp pipeline, reporting each result as soon as it is known:
+    bp, then camp and socials_bp, then socials_camp.
+    """
+    bp = cached_ballotpedia_url(normalize_name(name))
+    lookup.update(bp=bp)
+    if not bp:
+        return
+    camp, socials_bp = cached_ballotpedia_extracts(bp)
+    lookup.update(camp=camp, socials_bp=socials_bp)
+    if camp:
+        lookup.update(socials_camp=cached_social_links(camp))
+
+
+def lookup_contact_info(lookup, url):
+    lookup.update(contact=cached_contact_info(url))
+
+
+def batch_candidates(lookup, names):
+    """
+    Runs batch.iter_candidate_socials over names, adding each result to 'rows'
+    as it finishes. Candidates resolved by an earlier upload within
+    LOOKUP_TTL come back from the run state ('fresh') without any requests.
+    Results are also written to the shared result store.
+    """
+    path = http_cache.cache_path('ui_state.sqlite', UI_STATE_PATH)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    state = RunState(path)
+    store = result_store.get_store()
+    for result in batch.iter_candidate_socials(names, BATCH_WORKERS, state=state,
+                                               max_age=LOOKUP_TTL):
+        if result['error']:
+            result['status'] = 'error'
+        elif store is not None:
+            store.record_candidate(result)
+        lookup.add('rows', result)
+
+
+def batch_contacts(lookup, urls):
+    """
+    Crawls each campaign site (cached per URL), adding a row per site as it
+    finishes. Sites are started in host-aware order (throttle.HostQueue), so
+    a rate-limited host doesn't hold up the others.
+    """
+    ctx = get_script_run_ctx()
+    attach = (lambda: add_script_run_ctx(threading.current_thread(), ctx)) if ctx else None
+    sites = HostQueue()
+    for url in urls:
+        sites.put(normalize_site(url), url)
+    with ThreadPoolExecutor(BATCH_WORKERS, initializer=attach) as pool:
+        futures = {}
+        while sites or futures:
+            while sites and len(futures) < BATCH_WORKERS:
+                url = sites.get()
+                futures[pool.submit(cached_contact_info, normalize_site(url))] = url
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                row = {'url': futures.pop(future)}
+                try:
+                    row.update(status='ok', error=None, **future.result())
+                except Exception as e:
+                    row.update(status='error', error=repr(e))
+                lookup.add('rows', row)
+
+
+class BackgroundLookup:
+    """
+    Runs func(lookup, *args) on a daemon thread so the script (and the UI)
+    never blocks on the network. func reports partial results through the
+    lookup with update(**values) or add(key, item) (appends to a list);
+    each rerun reads them with snapshot().
+    """
+
+    def __init__(self, func, *args):
+        self.args = args
+        self.error = None
+        self.done = False
+        self._results = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, args=(func,) + args, daemon=True)
+        ctx = get_script_run_ctx()
+        if ctx is not None:
+            # Lets the cached functions run on this thread without warnings
+            add_script_run_ctx(self._thread, ctx)
+        self._thread.start()
+
+    def update(self, **values):
+        with self._lock:
+            self._results.update(values)
+
+    def add(self, key, item):
+        with self._lock:
+            self._results.setdefault(key, []).append(item)
+
+    def snapshot(self):
+        with self._lock:
+            return {k: list(v) if isinstance(v, list) else v for k, v in self._results.items()}
+
+    def _run(self, func, *args):
+        try:
+            func(self, *args)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+
+
+def read_upload(upload, columns):
+    """Distinct values of the first matching column of an uploaded CSV (see batch.read_csv_column)."""
+    f = io.TextIOWrapper(io.BytesIO(upload.getvalue()), encoding='utf-8-sig', newline='')
+    return list(dict.fromkeys(batch.read_csv_column(f, columns)))
+
+
+def flatten_row(row):
+    """One CSV/Parquet row: social links as one column per platform, lists joined with '; '."""
+    flat = {}
+    for key, value in row.items():
+        if key in NESTED_FIELDS:
+            continue
+        if key == 'social_links':
+            for platform in SOCIAL_PATTERNS:
+                flat[platform] = value.get(platform)
+        elif isinstance(value, list):
+            flat[key] = '; '.join(str(v) for v in value)
+        else:
+            flat[key] = value
+    return flat
+
+
+def download_buttons(rows, stem):
+    """CSV, JSONL and Parquet downloads of the batch results."""
+    table = pd.DataFrame([flatten_row(r) for r in rows])
+    parquet = io.BytesIO()
+    table.to_parquet(parquet, index=False)
+    col1, col2, col3 = st.columns(3)
+    col1.download_button('Download CSV', table.to_csv(index=False), f'{stem}.csv', 'text/csv')
+    col2.download_button('Download JSONL', ''.join(json.dumps(r) + '\n' for r in rows),
+                         f'{stem}.jsonl', 'application/jsonl')
+    col3.download_button('Download Parquet', parquet.getvalue(), f'{stem}.parquet',
+                         'application/vnd.apache.parquet')
+
+
+def batch_section(key, label, columns, runner, status_fields, stem):
+    """
+    CSV upload section shared by both apps: runs runner(lookup, values) in the
+    background over the `columns` values of the upload, with a live progress
+    bar and per-row status table (status_fields), then offers the downloads.
+    """
+    st.subheader('Batch upload')
+    upload = st.file_uploader(label, type=['csv'], key=f'{key}_upload')
+    if key not in st.session_state:
+        st.session_state[key] = None
+        st.session_state[f'{key}_rows'] = None
+    if st.button('Run batch', key=f'{key}_run') and upload is not None:
+        values = read_upload(upload, columns)
+        st.session_state[key] = BackgroundLookup(runner, values)
+        st.session_state[f'{key}_rows'] = None
+
+    @st.fragment(run_every=POLL_INTERVAL)
+    def batch_progress():
+        task = st.session_state[key]
+        if task is None:
+            return
+        rows = task.snapshot().get('rows', [])
+        if task.done:
+            st.session_state[key] = None
+            st.session_state[f'{key}_rows'] = (rows, task.error)
+            st.rerun()
+        total = len(task.args[0])
+        st.progress(len(rows) / total if total else 1.0, text=f"{len(rows)} of {total} done")
+        if rows:
+            st.dataframe(pd.DataFrame([{f: r.get(f) for f in status_fields} for r in rows]))
+
+    batch_progress()
+
+    if st.session_state[f'{key}_rows']:
+        rows, error = st.session_state[f'{key}_rows']
+        if error is not None:
+            st.error(f"Batch stopped: {error}")
+        counts = pd.Series([r.get('status') for r in rows]).value_counts()
+        st.write(', '.join(f"{n} {status}" for status, n in counts.items()) or 'No rows.')
+        if rows:
+            st.dataframe(pd.DataFrame([flatten_row(r) for r in rows]))
+            download_buttons(rows, stem)
@@ -0,0 +1,380 @@
+import asyncio
+import queue
+import random
+import threading
+import time
+
+import aiohttp
+import requests
+
+import app_scrapers
+import contact_info
+import host_health
+import http_cache
+import http_client
+import socialmedia
+import title_index
+from metrics import metrics, site_of
+from page import Page
+from throttle import DEFAULT_HOST_LIMITS, host_limiter, host_of, retry_after_seconds
+
+# Total simultaneous connections across all hosts
+DEFAULT_MAX_CONNECTIONS = 1000
+
+# Candidates processed at once by iter_candidate_socials
+DEFAULT_CONCURRENCY = 200
+
+
+class AsyncScraper:
+    """
+    asyncio backend for the candidate pipeline.
+    Network I/O runs on a single aiohttp session (thousands of requests in
+    flight, capped per host like the sync client), goes through the same
+    on-disk cache, and CPU-bound HTML parsing is handed to `executor`
+    (the loop's default thread pool when None). Extraction reuses the sync
+    extractors, which accept an already fetched Page, so results are identical.
+
+        async with AsyncScraper() as scraper:
+            result = await scraper.get_candidate_socials('Jane Doe')
+    """
+
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS, host_limits=None,
+                 executor=None, timeout=http_client.DEFAULT_TIMEOUT):
+        self.max_connections = max_connections
+        self.host_limits = {**DEFAULT_HOST_LIMITS, **(host_limits or {})}
+        self.executor = executor
+        self.timeout = timeout
+        self._semaphores = {}
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            headers=http_client.REQUEST_HEADERS,
+            connector=aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        self._session = None
+
+    def _semaphore(self, url):
+        host = host_of(url)
+        for limited, limit in self.host_limits.items():
+            if host == limited or host.endswith('.' + limited):
+                if limited not in self._semaphores:
+                    self._semaphores[limited] = asyncio.Semaphore(limit)
+                return self._semaphores[limited]
+        return None
+
+    async def _read_body(self, r, html_only, max_bytes, stop_at):
+        """Streams a body within the limits, like http_client._read_body."""
+        content_type = r.headers.get('Content-Type', '')
+        check = html_only and r.status < 400
+        if check and http_client.media_type(content_type) not in (
+                http_client.HTML_CONTENT_TYPES + http_client.SNIFFED_CONTENT_TYPES):
+            raise http_client.NotHTMLError(f"{r.url}: not HTML ({content_type})")
+        reader = http_client.BodyReader(max_bytes or http_client.MAX_BODY_BYTES, stop_at)
+        async for chunk in r.content.iter_chunked(http_client.CHUNK_SIZE):
+            if check:
+                if not http_client.is_html(content_type, chunk):
+                    raise http_client.NotHTMLError(f"{r.url}: not HTML ({content_type or 'sniffed'})")
+                check = False
+            if not reader.feed(chunk):
+                break
+        return reader
+
+    async def _send_once(self, method, url, headers, allow_redirects, timeout,
+                         html_only=False, max_bytes=None, stop_at=None):
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+        async with self._session.request(method, url, headers=headers,
+                                         allow_redirects=allow_redirects,
+                                         timeout=client_timeout) as r:
+            body, truncated = b'', False
+            if method.upper() != 'HEAD':
+                reader = await self._read_body(r, html_only, max_bytes, stop_at)
+                body, truncated = reader.body, reader.truncated
+            # Decode like requests (ISO-8859-1 for text/* without a charset), not
+            # like aiohttp, so both backends read and cache the same text
+            encoding = requests.utils.get_encoding_from_headers(r.headers)
+            resp = http_cache.build_response(str(r.url), r.status, dict(r.headers), body, encoding)
+            resp.truncated = truncated
+            return resp
+
+    async def _send_scheduled(self, method, url, headers, allow_redirects, timeout, **body_options):
+        """_send_once after the host's rate limit (shared with http_client) allows it."""
+        queued = time.perf_counter()
+        delay = host_limiter.reserve(url)
+        if delay:
+            await asyncio.sleep(delay)
+        metrics.observe('host_wait_seconds', time.perf_counter() - queued, site=site_of(url))
+        return await self._send_once(method, url, headers, allow_redirects, timeout, **body_options)
+
+    async def _send(self, method, url, headers, allow_redirects=True, timeout=None, **body_options):
+        """
+        Network call with the same retry policy and metrics as http_client. aiohttp
+        errors are re-raised as requests exceptions so callers handle both backends alike.
+        """
+        health = host_health.get_tracker()
+        if health is not None:
+            health.check(url)
+        if not host_limiter.robots_loaded(url):
+            # First request to this site: fetch its robots.txt off the event loop
+            await asyncio.get_running_loop().run_in_executor(self.executor, host_limiter.allowed, url,
+                                                             timeout or self.timeout)
+        http_client.check_robots(url)
+        start = time.perf_counter()
+        try:
+            resp, retries = await self._send_retrying(method, url, headers, allow_redirects,
+                                                      timeout or self.timeout, **body_options)
+        except requests.RequestException as e:
+            http_client.record_error(method, url, e, time.perf_counter() - start)
+            if health is not None:
+                health.record_failure(url, e)
+            raise
+        if health is not None:
+            health.record_success(url)
+        http_client.record_response(method, url, resp, time.perf_counter() - start, retries)
+        return resp
+
+    async def _send_retrying(self, method, url, headers, allow_redirects, timeout, **body_options):
+        sem = self._semaphore(url)
+        for attempt in range(http_client.RETRIES + 1):
+            try:
+                if sem is None:
+                    resp = await self._send_scheduled(method, url, headers, allow_redirects,
+                                                      timeout, **body_options)
+                else:
+                    async with sem:
+                        resp = await self._send_scheduled(method, url, headers, allow_redirects,
+                                                          timeout, **body_options)
+            except asyncio.TimeoutError as e:
+                if attempt == http_client.RETRIES or not host_health.retry_timeouts(url):
+                    raise requests.Timeout(f"{url}: timed out") from e
+            except aiohttp.ClientError as e:
+                if attempt == http_client.RETRIES:
+                    raise requests.ConnectionError(f"{url}: {e}") from e
+            else:
+                throttled = resp.status_code in http_client.THROTTLE_STATUSES
+                if throttled:
+                    # Backs off the whole host; the next attempt waits out its pause
+                    host_limiter.penalize(url, retry_after_seconds(resp.headers.get('Retry-After')))
+                    metrics.incr('host_throttled_total', site=site_of(url), status=resp.status_code)
+                else:
+                    host_limiter.record_success(url)
+                if resp.status_code not in http_client.RETRY_STATUSES or attempt == http_client.RETRIES:
+                    return resp, attempt
+                if throttled:
+                    continue
+            delay = http_client.BACKOFF_FACTOR * (2 ** attempt)
+            await asyncio.sleep(delay + random.uniform(0, http_client.BACKOFF_JITTER))
+
+    async def request(self, method, url, headers=None, allow_redirects=True, timeout=None,
+                      html_only=False, max_bytes=None, stop_at=None):
+        """
+        Async, cached equivalent of http_client.request() (same body limits).
+        The cache's SQLite, file and zlib work runs in the loop's default
+        thread pool, so it never stalls the requests in flight.
+        """
+        loop = asyncio.get_running_loop()
+        cache, entry, resp, req_headers = await loop.run_in_executor(
+            None, http_cache.begin_request, method, url, headers)
+        if resp is None:
+            resp = await self._send(method, url, req_headers, allow_redirects, timeout,
+                                    html_only=html_only, max_bytes=max_bytes, stop_at=stop_at)
+            return await loop.run_in_executor(
+                None, http_cache.finish_request, cache, entry, method, url, resp)
+        if html_only and resp.ok and not http_client.is_html(resp.headers.get('Content-Type'), resp.content):
+            raise http_client.NotHTMLError(f"{url}: not HTML ({resp.headers.get('Content-Type')})")
+        return resp
+
+    async def fetch_page(self, url):
+        """Downloads url and returns a Page. Raises requests.RequestException on failure."""
+        resp = await self.request('GET', url, html_only=True, stop_at=http_client.HTML_END_MARKER)
+        resp.raise_for_status()
+        return Page(url, resp.text, resp)
+
+    async def _as_page(self, source):
+        if isinstance(source, Page):
+            return source
+        return await self.fetch_page(source)
+
+    async def _parse(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def find_ballotpedia_url(self, candidate_name, max_pages=2):
+        """Async socialmedia.find_ballotpedia_url: title index, HEAD probe, hint, then SerpAPI in a thread."""
+        url = title_index.lookup_url(candidate_name)
+        if url:
+            return url
+        url = socialmedia.ballotpedia_slug_url(candidate_name)
+        try:
+            resp = await self.request('HEAD', url, timeout=5)
+            if resp.status_code < 400:
+                title_index.learn_url(url)
+                return url
+            if resp.status_code in title_index.MISSING_STATUSES:
+                hint = title_index.hint_url(candidate_name)
+                if hint:
+                    return hint
+        except requests.RequestException:
+            pass
+        return await asyncio.get_running_loop().run_in_executor(
+            None, socialmedia.search_ballotpedia_url, candidate_name, max_pages
+        )
+
+    async def find_campaign_site(self, source, candidate_name=None):
+        """Async socialmedia.find_campaign_site; source is a URL or Page."""
+        if not source:
+            return None
+        try:
+            page = await self._as_page(source)
+        except requests.RequestException:
+            return None
+        return await self._parse(socialmedia.find_campaign_site, page, candidate_name)
+
+    async def extract_social_links(self, source):
+        """Async socialmedia.extract_social_links; source is a URL or Page."""
+        if not source:
+            return {}
+        try:
+            page = await self._as_page(source)
+        except requests.RequestException:
+            return {}
+        return await self._parse(socialmedia.extract_social_links, page)
+
+    async def extract_infobox_socials(self, source):
+        """Async app_scrapers.extract_infobox_socials; source is a URL or Page."""
+        if not source:
+            return {}
+        try:
+            page = await self._as_page(source)
+        except requests.RequestException:
+            return {}
+        return await self._parse(app_scrapers.extract_infobox_socials, page)
+
+    async def extract_contact_info(self, source, max_pages=None, max_bytes=None, max_depth=None,
+                                   workers=contact_info.CRAWL_WORKERS):
+        """Async contact_info.extract_contact_info (same crawl); source is a URL or Page."""
+        url = source.url if isinstance(source, Page) else source
+        crawl = contact_info.ContactCrawl(url, max_pages, max_bytes, max_depth)
+        pending = {}
+        try:
+            if isinstance(source, Page):
+                crawl.next_urls(1)
+                await self._parse(crawl.add_page, source, 0)
+            while True:
+                for next_url, depth in crawl.next_urls(workers - len(pending)):
+                    pending[asyncio.ensure_future(self.fetch_page(next_url))] = (next_url, depth)
+                if not pending or crawl.complete():
+                    break
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    next_url, depth = pending.pop(task)
+                    try:
+                        await self._parse(crawl.add_page, task.result(), depth)
+                    except requests.RequestException as e:
+                        if depth == 0:
+                            raise
+                        print(f"Error fetching {next_url}: {e}")
+        except requests.RequestException as e:
+            print(f"Error fetching {url}: {e}")
+            return contact_info.empty_contact_info()
+        finally:
+            for task in pending:
+                task.cancel()
+        return crawl.result()
+
+    async def get_candidate_socials(self, candidate_name):
+        """Async socialmedia.get_candidate_socials (without progress output)."""
+        with metrics.timer('stage_seconds', stage='find_ballotpedia_url'):
+            bp_url = await self.find_ballotpedia_url(candidate_name)
+        if not bp_url:
+            return {'ballotpedia_url': None, 'campaign_site': None, 'social_links': {}}
+        try:
+            with metrics.timer('stage_seconds', stage='fetch_ballotpedia'):
+                bp_page = await self.fetch_page(bp_url)
+        except requests.RequestException:
+            bp_page = None
+        with metrics.timer('stage_seconds', stage='find_campaign_site'):
+            campaign_site = await self.find_campaign_site(bp_page, candidate_name)
+        campaign_page = None
+        if campaign_site:
+            with metrics.timer('stage_seconds', stage='fetch_campaign'):
+                try:
+                    campaign_page = await self.fetch_page(campaign_site)
+                except requests.RequestException:
+                    pass
+        with metrics.timer('stage_seconds', stage='extract_social_links'):
+            socials_bp = await self.extract_social_links(bp_page)
+        socials_cam = {}
+        if campaign_page is not None:
+            with metrics.timer('stage_seconds', stage='extract_social_links'):
+                socials_cam = await self.extract_social_links(campaign_page)
+        merged = socialmedia.merge_socials(socials_bp, socials_cam)
+        return {'ballotpedia_url': bp_url, 'campaign_site': campaign_site, 'social_links': merged}
+
+    async def _resolve_one(self, name):
+        try:
+            with metrics.timer('candidate_seconds'):
+                result = await self.get_candidate_socials(name)
+            return {'name': name, **result, 'error': None}
+        except Exception as e:
+            return {'name': name, 'ballotpedia_url': None, 'campaign_site': None,
+                    'social_links': {}, 'error': repr(e)}
+
+    async def iter_candidate_socials(self, names, concurrency=DEFAULT_CONCURRENCY):
+        """
+        Async generator with the same contract as batch.iter_candidate_socials:
+        yields one result dict per candidate as it finishes, keeping at most
+        `concurrency` candidates in flight.
+        """
+        names = iter(names)
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < concurrency:
+                name = next(names, None)
+                if name is None:
+                    exhausted = True
+                    break
+                pending.add(asyncio.ensure_future(self._resolve_one(name)))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+
+def iter_candidate_socials(names, concurrency=DEFAULT_CONCURRENCY, **scraper_options):
+    """
+    Synchronous bridge over AsyncScraper.iter_candidate_socials: runs the event loop
+    in a background thread and yields results to the caller as they complete.
+    """
+    results = queue.Queue(maxsize=concurrency)
+    done = object()
+    errors = []
+
+    async def produce():
+        async with AsyncScraper(**scraper_options) as scraper:
+            async for result in scraper.iter_candidate_socials(names, concurrency):
+                await asyncio.get_running_loop().run_in_executor(None, results.put, result)
+
+    def run():
+        try:
+            asyncio.run(produce())
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            results.put(done)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while True:
+        result = results.get()
+        if result is done:
+            break
+        yield result
+    thread.join()
+    if errors:
+        raise errors[0]
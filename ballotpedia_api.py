@@ -0,0 +1,120 @@
+import os
+
+import requests
+
+import http_client
+import title_index
+from socialmedia import find_ballotpedia_url, search_ballotpedia_url
+from title_index import page_url
+
+# Ballotpedia's MediaWiki API endpoint
+BALLOTPEDIA_API = os.getenv('SCRAPE_BALLOTPEDIA_API', 'https://ballotpedia.org/wiki/api.php')
+
+# MediaWiki accepts at most 50 titles per query for normal clients
+MAX_TITLES_PER_QUERY = 50
+
+
+def title_for_name(candidate_name):
+    """Page title guessed from a candidate name (same guess as ballotpedia_slug_url)."""
+    return ' '.join(candidate_name.split())
+
+
+def _query_titles(titles, api_url):
+    params = {
+        'action': 'query',
+        'titles': '|'.join(titles),
+        'redirects': 1,
+        'format': 'json',
+        'formatversion': 2,
+    }
+    resp = http_client.get(api_url, params=params, timeout=15)
+    resp.raise_for_status()
+    data = resp.json()
+    if 'error' in data:
+        # e.g. too many titles: says nothing about whether the pages exist
+        raise ValueError(f"MediaWiki API error: {data['error'].get('info')}")
+    query = data.get('query', {})
+
+    normalized = {n['from']: n['to'] for n in query.get('normalized', [])}
+    redirects = {r['from']: r['to'] for r in query.get('redirects', [])}
+    existing = {p['title'] for p in query.get('pages', [])
+                if not p.get('missing') and not p.get('invalid')}
+
+    resolved = {}
+    for title in titles:
+        current = normalized.get(title, title)
+        seen = set()
+        while current in redirects and current not in seen:
+            seen.add(current)
+            current = redirects[current]
+        resolved[title] = current if current in existing else None
+    return resolved
+
+
+def resolve_titles(titles, api_url=None):
+    """
+    Resolves page titles through the MediaWiki query API, following
+    normalization and redirects, 50 titles per request.
+    Returns {title: canonical title, or None if the page does not exist}.
+    Titles in a batch whose request failed are left out of the result.
+    """
+    api_url = api_url or BALLOTPEDIA_API
+    titles = list(dict.fromkeys(titles))
+    resolved = {}
+    for i in range(0, len(titles), MAX_TITLES_PER_QUERY):
+        chunk = titles[i:i + MAX_TITLES_PER_QUERY]
+        try:
+            resolved.update(_query_titles(chunk, api_url))
+        except (requests.RequestException, ValueError):
+            continue
+    return resolved
+
+
+def resolve_ballotpedia_urls(candidate_names, api_url=None):
+    """
+    Bulk equivalent of find_ballotpedia_url's first step.
+    Returns {name: canonical page URL, or None when Ballotpedia has no such page};
+    names whose lookup failed are left out, so callers can fall back to the
+    per-name HEAD probe for those and to SerpAPI only for confirmed misses.
+    Names the local title index knows exactly are answered without an API
+    call, and the canonical titles the API returns are added to it. A
+    confirmed miss gets the index's loose match (hint_url), if any.
+    """
+    urls = {}
+    by_title = {}
+    for name in candidate_names:
+        known = title_index.lookup_url(name)
+        if known:
+            urls[name] = known
+        else:
+            by_title.setdefault(title_for_name(name), []).append(name)
+    if not by_title:
+        return urls
+    resolved = resolve_titles(by_title, api_url)
+    index = title_index.get_index()
+    if index is not None:
+        index.add_titles(t for t in set(resolved.values()) if t)
+    for title, names in by_title.items():
+        if title not in resolved:
+            continue
+        canonical = resolved[title]
+        for name in names:
+            urls[name] = page_url(canonical) if canonical else title_index.hint_url(name)
+    return urls
+
+
+def find_ballotpedia_urls(candidate_names, api_url=None, max_pages=2):
+    """
+    Resolves many names to Ballotpedia URLs in a handful of API calls, then
+    falls back per name: SerpAPI for confirmed misses, the full
+    find_ballotpedia_url (HEAD probe + SerpAPI) where the API call failed.
+    Returns {name: url or None}.
+    """
+    names = list(dict.fromkeys(candidate_names))
+    urls = resolve_ballotpedia_urls(names, api_url)
+    for name in names:
+        if name not in urls:
+            urls[name] = find_ballotpedia_url(name, max_pages)
+        elif urls[name] is None:
+            urls[name] = search_ballotpedia_url(name, max_pages)
+    return urls
@@ -0,0 +1,313 @@
+import argparse
+import contextlib
+import csv
+import json
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import host_health
+import page
+import result_store
+import serp_cache
+import title_index
+from ballotpedia_api import resolve_ballotpedia_urls, MAX_TITLES_PER_QUERY
+from candidate_graph import candidate_socials
+from metrics import JSONLSink, metrics
+from parse_pool import ParsePool
+from run_state import RunState
+from socialmedia import get_candidate_socials, search_ballotpedia_url
+from throttle import host_limiter
+
+# Column names recognised as the candidate name in roster CSVs
+NAME_COLUMNS = ('name', 'candidate', 'candidate_name', 'full_name')
+
+# Column names recognised as the campaign site in CSVs of sites
+URL_COLUMNS = ('url', 'campaign_site', 'campaign site', 'website', 'site')
+
+DEFAULT_WORKERS = 8
+
+
+def load_names(path, columns=NAME_COLUMNS, field='name'):
+    """
+    Reads candidate names from a roster file:
+      - .jsonl: one object per line with a 'name' key (or a bare JSON string)
+      - anything else: CSV with a name column (see NAME_COLUMNS), else the first column
+    Blank names are skipped. Other columns can be read the same way, e.g.
+    campaign sites with columns=URL_COLUMNS, field='url'.
+    """
+    if path.endswith('.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                row = json.loads(line)
+                name = row if isinstance(row, str) else row.get(field, '')
+                if name.strip():
+                    yield name.strip()
+        return
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from read_csv_column(f, columns)
+
+
+def read_csv_column(f, columns):
+    """
+    Yields the non-blank values of the first header column found in `columns`
+    from CSV file object f; without a recognised header, the first column
+    (the first row then counts as data).
+    """
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    lowered = [h.strip().lower() for h in header]
+    col = next((lowered.index(c) for c in columns if c in lowered), None)
+    if col is None:
+        # No recognised header: treat the first row as data
+        col = 0
+        if header and header[0].strip():
+            yield header[0].strip()
+    for row in reader:
+        if len(row) > col and row[col].strip():
+            yield row[col].strip()
+
+
+# Marks a name the bulk resolver confirmed has no Ballotpedia page
+NO_PAGE = object()
+
+
+def _resolve_one(name, bp_hint=None, state=None, max_age=None, parse_pool=None, hashes=None):
+    """
+    bp_hint: bulk-resolved URL, NO_PAGE, or None when unknown.
+    state: optional RunState; stored results are reused when still valid.
+    parse_pool: optional ParsePool that parses pages off this thread.
+    hashes: optional dict receiving the parsed pages' content hashes.
+    """
+    if state is not None:
+        try:
+            reused = state.reuse(name, max_age)
+        except Exception:
+            reused = None
+        if reused is not None:
+            return reused
+        hashes = {}
+        result = _resolve_one(name, bp_hint, parse_pool=parse_pool, hashes=hashes)
+        result['status'] = 'scraped'
+        try:
+            state.record(name, result, hashes)
+        except (OSError, sqlite3.Error) as e:
+            # The scrape itself succeeded: keep the result, it is just re-scraped next run
+            metrics.incr('run_state_errors_total', error=type(e).__name__)
+            print(f"⚠️ Could not save {name} to the run state: {e!r}", file=sys.stderr)
+        return result
+    try:
+        if bp_hint is NO_PAGE:
+            # Skip the HEAD probe we already know fails; only SerpAPI can help
+            bp_hint = search_ballotpedia_url(name)
+            if not bp_hint:
+                return {'name': name, 'ballotpedia_url': None, 'campaign_site': None,
+                        'social_links': {}, 'error': None}
+        with metrics.timer('candidate_seconds'):
+            if parse_pool is None:
+                result = candidate_socials(name, bp_url=bp_hint, hashes=hashes)
+            else:
+                result = get_candidate_socials(name, verbose=False, bp_url=bp_hint,
+                                               parse_pool=parse_pool, hashes=hashes)
+        return {'name': name, **result, 'error': None}
+    except Exception as e:
+        return {'name': name, 'ballotpedia_url': None, 'campaign_site': None,
+                'social_links': {}, 'error': repr(e)}
+
+
+def _with_bulk_hints(names):
+    """Yields (name, bp_hint), resolving Ballotpedia pages 50 names per API call."""
+    names = iter(names)
+    while True:
+        chunk = [name for _, name in zip(range(MAX_TITLES_PER_QUERY), names)]
+        if not chunk:
+            return
+        urls = resolve_ballotpedia_urls(chunk)
+        for name in chunk:
+            if name not in urls:
+                yield name, None
+            else:
+                yield name, urls[name] or NO_PAGE
+
+
+def iter_candidate_socials(names, workers=DEFAULT_WORKERS, host_limits=None, bulk_resolve=True,
+                           state=None, max_age=None, parse_processes=None):
+    """
+    Resolves many candidates concurrently, yielding one result dict per candidate
+    as soon as it finishes (not in input order):
+        {'name', 'ballotpedia_url', 'campaign_site', 'social_links', 'error'}
+    host_limits optionally overrides per-host concurrency caps, e.g. {'ballotpedia.org': 2}.
+    With bulk_resolve, Ballotpedia pages are looked up through the MediaWiki
+    API in batches instead of one HEAD probe per name.
+    With a RunState (incremental mode), each result also carries 'status':
+    'fresh' (checked within max_age seconds, reused as is), 'unchanged'
+    (pages revalidated, reused) or 'scraped'.
+    At most 2 * workers names are pulled from `names` ahead of completion, so
+    arbitrarily long iterables stream through in bounded memory.
+    With parse_processes, the workers only fetch; HTML parsing and extraction
+    run in a ParsePool of that many processes (-1: one per CPU).
+    """
+    for host, limit in (host_limits or {}).items():
+        host_limiter.set_limit(host, limit)
+
+    if bulk_resolve:
+        tasks = _with_bulk_hints(names)
+    else:
+        tasks = ((name, None) for name in names)
+    max_pending = max(1, workers) * 2
+    parse_pool = None
+    if parse_processes:
+        parse_pool = ParsePool(parse_processes if parse_processes > 0 else None)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool, \
+            parse_pool or contextlib.nullcontext():
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                    break
+                pending.add(pool.submit(_resolve_one, *task, state, max_age, parse_pool))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+
+
+def resolve_candidates(names, workers=DEFAULT_WORKERS, host_limits=None, bulk_resolve=True,
+                       state=None, max_age=None, parse_processes=None):
+    """Like iter_candidate_socials, but returns all results as a list."""
+    return list(iter_candidate_socials(names, workers=workers, host_limits=host_limits,
+                                       bulk_resolve=bulk_resolve, state=state, max_age=max_age,
+                                       parse_processes=parse_processes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Resolve campaign sites and social links for a roster of candidates.'
+    )
+    parser.add_argument('roster', help='CSV or JSONL file of candidate names')
+    parser.add_argument('-o', '--output', help='JSONL output file (default: stdout)')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'number of concurrent candidates (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--ballotpedia-limit', type=int, default=None,
+                        help='max simultaneous requests to ballotpedia.org')
+    parser.add_argument('--ballotpedia-rate', type=float, default=None,
+                        help='max requests per second to ballotpedia.org')
+    parser.add_argument('--ignore-robots', action='store_true',
+                        help="don't fetch or obey robots.txt (Disallow and Crawl-delay)")
+    parser.add_argument('--engine', choices=('threads', 'async'), default='threads',
+                        help='threads: worker pool; async: asyncio engine, where '
+                             '--workers is the number of candidates in flight (no --state, '
+                             '--max-age, --parse-processes or --no-bulk-resolve)')
+    parser.add_argument('--no-bulk-resolve', action='store_true',
+                        help='probe each Ballotpedia URL with HEAD instead of batched API lookups')
+    parser.add_argument('--no-title-index', action='store_true',
+                        help='always look Ballotpedia pages up over the network, ignoring the '
+                             'local title index (built with title_index.py)')
+    parser.add_argument('--state', metavar='PATH',
+                        help='incremental mode: SQLite run state; candidates whose pages '
+                             'have not changed since the last run are not re-scraped')
+    parser.add_argument('--max-age', type=float, default=None, metavar='HOURS',
+                        help='with --state, reuse results checked within HOURS without any requests')
+    parser.add_argument('--serp-budget', type=int, default=None,
+                        help='max paid SerpAPI searches for this run (cached queries are free)')
+    parser.add_argument('--parser', choices=page.PARSER_BACKENDS, default=page.PARSER_BACKEND,
+                        help=f'HTML parser backend (default: {page.PARSER_BACKEND})')
+    parser.add_argument('--parse-processes', type=int, default=None, metavar='N',
+                        help='parse pages in N worker processes (-1: one per CPU) while the '
+                             'worker threads only fetch (threads engine)')
+    parser.add_argument('--store', metavar='PATH', default=None,
+                        help='also write each result to this SQLite result store, queryable '
+                             f'with result_store.py (default: {result_store.store_path()})')
+    parser.add_argument('--no-store', action='store_true', help='do not write the result store')
+    parser.add_argument('--forget-dead-hosts', action='store_true',
+                        help='retry hosts remembered as unreachable (DNS/TLS errors, timeouts)')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='append timing/counter events to this JSON lines file as they happen')
+    parser.add_argument('--prometheus', metavar='PATH',
+                        help='write final metrics in Prometheus text format (node_exporter textfile)')
+    args = parser.parse_args(argv)
+    if args.engine == 'async':
+        unsupported = [option for option, value in (('--state', args.state),
+                                                    ('--max-age', args.max_age is not None),
+                                                    ('--parse-processes', args.parse_processes),
+                                                    ('--no-bulk-resolve', args.no_bulk_resolve))
+                       if value]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} not supported with --engine async")
+    page.PARSER_BACKEND = args.parser
+    sink = JSONLSink(args.metrics) if args.metrics else None
+    if sink:
+        metrics.add_sink(sink)
+    if args.serp_budget is not None:
+        serp_cache.configure(budget=args.serp_budget)
+    if args.forget_dead_hosts and host_health.get_tracker() is not None:
+        host_health.get_tracker().clear()
+
+    host_limits = {}
+    if args.ballotpedia_limit:
+        host_limits['ballotpedia.org'] = args.ballotpedia_limit
+    if args.ballotpedia_rate:
+        host_limiter.configure(rates={'ballotpedia.org': args.ballotpedia_rate})
+    if args.ignore_robots:
+        host_limiter.configure(robots=False)
+    if args.no_title_index:
+        title_index.configure(enabled=False)
+
+    names = load_names(args.roster)
+    if args.engine == 'async':
+        import async_engine
+        results = async_engine.iter_candidate_socials(names, args.workers, host_limits=host_limits)
+    else:
+        state = RunState(args.state) if args.state else None
+        max_age = args.max_age * 3600 if args.max_age is not None else None
+        results = iter_candidate_socials(names, args.workers, host_limits,
+                                         bulk_resolve=not args.no_bulk_resolve,
+                                         state=state, max_age=max_age,
+                                         parse_processes=args.parse_processes)
+
+    store = None
+    if not args.no_store:
+        result_store.configure(args.store)
+        store = result_store.get_store()
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    count = failed = 0
+    statuses = {}
+    try:
+        for result in results:
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+            if store is not None:
+                store.record_candidate(result)
+            count += 1
+            metrics.incr('candidates_total', outcome='error' if result['error'] else 'ok')
+            if 'status' in result:
+                statuses[result['status']] = statuses.get(result['status'], 0) + 1
+            if result['error']:
+                failed += 1
+                print(f"❌ {result['name']}: {result['error']}", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if sink:
+            metrics.remove_sink(sink)
+            sink.close()
+    print(f"✅ Resolved {count} candidates ({failed} errors)", file=sys.stderr)
+    if statuses:
+        print('   ' + ', '.join(f"{n} {s}" for s, n in sorted(statuses.items())), file=sys.stderr)
+    print(metrics.summary(), file=sys.stderr)
+    if args.prometheus:
+        metrics.write_prometheus(args.prometheus)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,415 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import app_scrapers
+import contact_info
+import host_health
+import http_cache
+import page
+import socialmedia
+from throttle import host_limiter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Stages timed for every candidate, in pipeline order
+STAGES = (
+    'fetch', 'parse', 'find_campaign_site', 'extract_social_links',
+    'extract_infobox_socials', 'extract_contact_info',
+)
+
+# Placeholder in fixture pages for the campaign-site origin, filled in by the stub
+# (Ballotpedia pages are served from 127.0.0.1, campaign sites from localhost,
+# so the two look like different hosts to the crawler)
+CAMPAIGN_ORIGIN = '{{CAMPAIGN}}'
+
+# Checked-in baseline for the default generated corpus (python bench.py --baseline ...)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+# A metric this much worse than the baseline counts as a regression
+DEFAULT_TOLERANCE = 0.10
+# Per-stage latency percentiles are too noisy to gate on: they are compared
+# and reported, but never count as a regression
+REPORTED_ONLY = ('p50_ms', 'p95_ms')
+# Timings below this (ms) are too small to compare meaningfully
+MIN_COMPARED_MS = 0.05
+
+_WORDS = (
+    'election', 'candidate', 'district', 'county', 'state', 'primary', 'general',
+    'incumbent', 'office', 'vote', 'results', 'campaign', 'party', 'term', 'seat',
+    'policy', 'community', 'education', 'budget', 'public', 'safety', 'housing',
+)
+_FIRST = ('Jane', 'John', 'Maria', 'David', 'Aisha', 'Wei', 'Carlos', 'Emily', 'Omar', 'Grace')
+_LAST = ('Doe', 'Smith', 'Garcia', 'Nguyen', 'Patel', 'Johnson', 'Kim', 'Brown', 'Lopez', 'Okafor')
+
+
+def _paragraphs(rng, count, words=60):
+    return ''.join(
+        '<p>' + ' '.join(rng.choice(_WORDS) for _ in range(words)) + '.</p>\n'
+        for _ in range(count)
+    )
+
+
+def _ballotpedia_html(rng, name, slug):
+    nav = ''.join(f'<li><a href="/Portal_{i}">Portal {i}</a></li>' for i in range(250))
+    results = ''.join(
+        f'<tr><td><a href="/Candidate_{i}">Candidate {i}</a></td><td>{rng.randint(1000, 99999)}</td></tr>'
+        for i in range(40)
+    )
+    handle = slug.replace('_', '').lower()
+    camp = f'{CAMPAIGN_ORIGIN}/camp/{slug}/'
+    return f"""<!DOCTYPE html>
+<html><head><title>{name} - Ballotpedia</title>
+<script>var wgPageName = "{slug}"; {'var x = 1;' * 2000}</script>
+<style>{'.c {{ color: red; }}' * 500}</style></head>
+<body><div id="nav"><ul>{nav}</ul></div>
+<div id="content"><h1>{name}</h1>
+<table class="infobox">
+<tr><th colspan="2">{name}</th></tr>
+<tr><th>Party</th><td><a href="/Independent">Independent</a></td></tr>
+<tr><th>Incumbent</th><td>No</td></tr>
+<tr><th>Contact</th><td><a href="{camp}">Campaign website</a> <a href="mailto:info@example.com">Email</a></td></tr>
+<tr><th>Campaign Facebook</th><td><a href="https://www.facebook.com/{handle}">Facebook</a></td></tr>
+<tr><th>Campaign Twitter</th><td><a href="https://twitter.com/{handle}">Twitter</a></td></tr>
+<tr><th>Campaign Instagram</th><td><a href="https://www.instagram.com/{handle}">Instagram</a></td></tr>
+</table>
+{_paragraphs(rng, 30)}
+<table class="results">{results}</table>
+{_paragraphs(rng, 20)}
+<a href="https://www.facebook.com/sharer.php?u=https://ballotpedia.org/{slug}">Share</a>
+</div>
+<div id="footer"><a href="https://ballotpedia.org/About">About</a><a href="https://twitter.com/ballotpedia">Ballotpedia on Twitter</a></div>
+<script>{'track();' * 3000}</script>
+</body></html>
+"""
+
+
+def _campaign_pages(rng, name, slug):
+    handle = slug.replace('_', '').lower()
+    root = f'/camp/{slug}/'
+    nav = (f'<nav><a href="{root}index.html">Home</a><a href="{root}about.html">About</a>'
+           f'<a href="{root}issues.html">Issues</a><a href="{root}news/1.html">News</a>'
+           f'<a href="{root}contact.html">Contact</a>'
+           '<a href="https://secure.actblue.com/donate/x">Donate</a></nav>')
+    footer = (f'<footer><a href="https://www.facebook.com/{handle}">Facebook</a>'
+              f'<a href="https://x.com/{handle}">X</a>'
+              f'<a href="https://www.youtube.com/@{handle}">YouTube</a>'
+              f'<p>Paid for by Friends of {name}</p></footer>')
+    phone = f'({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}'
+
+    def doc(title, body):
+        return (f'<!DOCTYPE html><html><head><title>{title}</title>'
+                f'<script>{"init();" * 1000}</script></head>'
+                f'<body>{nav}<main><h1>{title}</h1>{body}</main>{footer}</body></html>')
+
+    news = {
+        f'news/{i}.html': doc(f'News {i}', _paragraphs(rng, 8) + '<a href="../index.html">Back</a>')
+        for i in range(1, 6)
+    }
+    return {
+        'index.html': doc(name, _paragraphs(rng, 10) + f'<p>Call us: {phone}</p>'),
+        'about.html': doc(f'About {name}', _paragraphs(rng, 12)),
+        'issues.html': doc('Issues', _paragraphs(rng, 15)),
+        'contact.html': doc('Contact', (
+            f'<address>{rng.randint(1, 999)} Main St, Springfield, IL 627{rng.randint(10, 99)}</address>'
+            f'<p>Email: {handle}@example.com</p><p>PO Box {rng.randint(1, 999)}, Springfield IL 62701</p>'
+        )),
+        **news,
+    }
+
+
+def write_corpus(directory, count=50, seed=0):
+    """
+    Writes a synthetic fixture corpus of `count` candidates under directory:
+      - bp/<slug>.html           Ballotpedia-like article (nav, infobox, results, scripts)
+      - camp/<slug>/*.html       campaign site (landing, about, issues, news, contact)
+      - manifest.json            [{'name', 'ballotpedia', 'campaign'}] (paths relative to directory)
+    Recorded pages can be added the same way; campaign links inside
+    Ballotpedia pages use the {{CAMPAIGN}} origin placeholder.
+    """
+    rng = random.Random(seed)
+    manifest = []
+    for i in range(count):
+        name = f'{_FIRST[i % len(_FIRST)]} {_LAST[(i // len(_FIRST)) % len(_LAST)]} {i}'
+        slug = name.replace(' ', '_')
+        bp_path = f'bp/{slug}.html'
+        os.makedirs(os.path.join(directory, 'bp'), exist_ok=True)
+        with open(os.path.join(directory, bp_path), 'w', encoding='utf-8') as f:
+            f.write(_ballotpedia_html(rng, name, slug))
+        for rel, html in _campaign_pages(rng, name, slug).items():
+            path = os.path.join(directory, 'camp', slug, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(html)
+        manifest.append({'name': name, 'ballotpedia': bp_path, 'campaign': f'camp/{slug}/index.html'})
+    with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+class _StubHandler(SimpleHTTPRequestHandler):
+    """Serves the corpus, filling in the campaign origin placeholder."""
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not path.endswith('.html') or not os.path.isfile(path):
+            return super().send_head()
+        with open(path, 'rb') as f:
+            body = f.read().replace(CAMPAIGN_ORIGIN.encode(), self.server.campaign_origin.encode())
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return None
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(directory, ready):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(_StubHandler, directory=directory))
+    server.campaign_origin = f'http://localhost:{server.server_port}'
+    ready.put(server.server_port)
+    server.serve_forever()
+
+
+def start_stub(directory):
+    """
+    Serves directory over HTTP from a separate process, so the stub's own CPU
+    time is not counted. Returns (process, port); terminate the process when done.
+    """
+    ready = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_serve, args=(directory, ready), daemon=True)
+    proc.start()
+    return proc, ready.get(timeout=10)
+
+
+class StageTimer:
+    """Wall-clock latencies and process CPU time per stage."""
+
+    def __init__(self):
+        self.latencies = {stage: [] for stage in STAGES}
+        self.cpu = {stage: 0.0 for stage in STAGES}
+
+    def run(self, stage, func, *args):
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = func(*args)
+        self.latencies[stage].append(time.perf_counter() - wall)
+        self.cpu[stage] += time.process_time() - cpu
+        return result
+
+
+def _parse(p):
+    p._extract()
+    return p
+
+
+def run_benchmark(directory, port, repeat=3, parser=None, crawl_pages=None):
+    """
+    Runs every candidate in the corpus through the pipeline `repeat` times
+    (HTTP cache off, so each fetch hits the stub) and returns the metrics dict.
+    """
+    with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    http_cache.configure(enabled=False)
+    # Nor host health: a stub port remembered as down from an earlier run would be skipped
+    host_health.configure(enabled=False)
+    # Measures the pipeline, not politeness: no rate limits or robots.txt for the stub
+    host_limiter.configure(rates={'127.0.0.1': None, 'localhost': None}, robots=False)
+    timer = StageTimer()
+    pages = 0
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(repeat):
+        for item in manifest:
+            url = f"http://127.0.0.1:{port}/{item['ballotpedia']}"
+            bp = timer.run('fetch', page.fetch_page, url, None, 10, parser)
+            timer.run('parse', _parse, bp)
+            site = timer.run('find_campaign_site', socialmedia.find_campaign_site, bp, item['name'])
+            timer.run('extract_social_links', socialmedia.extract_social_links, bp)
+            timer.run('extract_infobox_socials', app_scrapers.extract_infobox_socials, bp)
+            pages += 1
+            if site:
+                info = timer.run('extract_contact_info', contact_info.extract_contact_info, site,
+                                 crawl_pages)
+                pages += len(info['pages'])
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    metrics = {
+        # What was run: a baseline is only comparable with the same parameters
+        'params': {'corpus_size': len(manifest), 'repeat': repeat,
+                   'parser': parser or page.PARSER_BACKEND, 'crawl_pages': crawl_pages},
+        'candidates': len(manifest) * repeat,
+        'pages': pages,
+        'pages_per_sec': pages / wall if wall else 0.0,
+        'wall_s': wall,
+        'cpu_s': cpu,
+        'parse_cpu_s': timer.cpu['parse'],
+        'peak_rss_mb': _peak_rss_mb(),
+        'stages': {},
+    }
+    for stage, values in timer.latencies.items():
+        if not values:
+            continue
+        ordered = sorted(values)
+        metrics['stages'][stage] = {
+            'count': len(values),
+            'mean_ms': statistics.mean(values) * 1000,
+            'p50_ms': ordered[len(ordered) // 2] * 1000,
+            'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+            'cpu_ms': timer.cpu[stage] / len(values) * 1000,
+        }
+    return metrics
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def flatten(metrics):
+    """
+    {'pages_per_sec': ..., 'wall_ms_per_candidate': ..., 'parse.p50_ms': ..., ...}:
+    the metrics compared against a baseline. Totals are divided by the number
+    of candidates run, so they don't depend on the size of the run.
+    """
+    candidates = metrics['candidates'] or 1
+    flat = {
+        'pages_per_sec': metrics['pages_per_sec'],
+        'wall_ms_per_candidate': metrics['wall_s'] / candidates * 1000,
+        'cpu_ms_per_candidate': metrics['cpu_s'] / candidates * 1000,
+        'parse_cpu_ms_per_candidate': metrics['parse_cpu_s'] / candidates * 1000,
+    }
+    if metrics.get('peak_rss_mb') is not None:
+        flat['peak_rss_mb'] = metrics['peak_rss_mb']
+    for stage, values in metrics['stages'].items():
+        for key in ('p50_ms', 'p95_ms', 'cpu_ms'):
+            flat[f'{stage}.{key}'] = values[key]
+    return flat
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares two metrics dicts. Returns a list of
+    (metric, baseline, current, relative change, regressed) tuples; for
+    pages_per_sec higher is better, for everything else lower is better.
+    regressed is None for the REPORTED_ONLY metrics, which are not gated.
+    Raises ValueError when the two runs had different params (corpus size,
+    repeat, parser, crawl pages).
+    """
+    if current.get('params') != baseline.get('params'):
+        raise ValueError(f"baseline was run with {baseline.get('params')}, "
+                         f"this run with {current.get('params')}")
+    rows = []
+    now, before = flatten(current), flatten(baseline)
+    for metric, value in now.items():
+        if metric not in before or not before[metric]:
+            continue
+        if metric.endswith('_ms') and max(value, before[metric]) < MIN_COMPARED_MS:
+            continue
+        change = (value - before[metric]) / before[metric]
+        worse = -change if metric == 'pages_per_sec' else change
+        regressed = None if metric.endswith(REPORTED_ONLY) else worse > tolerance
+        rows.append((metric, before[metric], value, change, regressed))
+    return rows
+
+
+def print_report(metrics, out=sys.stdout):
+    print(f"{metrics['candidates']} candidates, {metrics['pages']} pages in {metrics['wall_s']:.2f}s "
+          f"({metrics['pages_per_sec']:.1f} pages/s), CPU {metrics['cpu_s']:.2f}s "
+          f"(parse {metrics['parse_cpu_s']:.2f}s)", file=out)
+    if metrics['peak_rss_mb'] is not None:
+        print(f"peak RSS {metrics['peak_rss_mb']:.1f} MB", file=out)
+    print(f"{'stage':<26}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'cpu ms':>10}", file=out)
+    for stage, s in metrics['stages'].items():
+        print(f"{stage:<26}{s['count']:>7}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}"
+              f"{s['p95_ms']:>10.2f}{s['cpu_ms']:>10.2f}", file=out)
+
+
+def print_comparison(rows, out=sys.stdout):
+    print(f"{'metric':<36}{'baseline':>12}{'current':>12}{'change':>9}", file=out)
+    for metric, before, now, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else '  (not gated)' if regressed is None else ''
+        print(f"{metric:<36}{before:>12.2f}{now:>12.2f}{change:>+8.1%}{flag}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Offline benchmark of the extraction pipeline against a local fixture corpus.'
+    )
+    parser.add_argument('--corpus', metavar='DIR',
+                        help='fixture corpus with a manifest.json (default: a generated one)')
+    parser.add_argument('--write-corpus', metavar='DIR',
+                        help='generate the synthetic corpus into DIR and exit')
+    parser.add_argument('-n', '--candidates', type=int, default=50,
+                        help='candidates in the generated corpus (default: 50)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='passes over the corpus (default: 3)')
+    parser.add_argument('--parser', choices=page.PARSER_BACKENDS, default=page.PARSER_BACKEND,
+                        help=f'HTML parser backend (default: {page.PARSER_BACKEND})')
+    parser.add_argument('--crawl-pages', type=int, default=None,
+                        help='page budget per campaign site for extract_contact_info')
+    parser.add_argument('-o', '--output', help='write the metrics as JSON to this file')
+    parser.add_argument('--baseline', metavar='PATH', nargs='?', const=BASELINE_PATH,
+                        help='compare against a saved metrics file; exit 1 on regression '
+                             f'(without PATH: the checked-in {os.path.basename(BASELINE_PATH)})')
+    parser.add_argument('--save-baseline', metavar='PATH',
+                        help='save these metrics as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f'relative slowdown counted as a regression (default: {DEFAULT_TOLERANCE})')
+    args = parser.parse_args(argv)
+
+    if args.write_corpus:
+        write_corpus(args.write_corpus, args.candidates)
+        print(f"Wrote {args.candidates} candidates to {args.write_corpus}", file=sys.stderr)
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.corpus
+        if directory is None:
+            directory = tmp
+            write_corpus(directory, args.candidates)
+        proc, port = start_stub(directory)
+        try:
+            metrics = run_benchmark(directory, port, args.repeat, args.parser, args.crawl_pages)
+        finally:
+            proc.terminate()
+    if args.corpus is not None:
+        metrics['params']['corpus'] = os.path.abspath(args.corpus)
+
+    print_report(metrics)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(metrics, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        try:
+            rows = compare(metrics, baseline, args.tolerance)
+        except ValueError as e:
+            print(f"Not comparable with {args.baseline}: {e}", file=sys.stderr)
+            return 2
+        print(file=sys.stdout)
+        print_comparison(rows)
+        if any(row[4] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import time
+
+import requests
+
+import result_store
+import title_index
+from ballotpedia_api import resolve_ballotpedia_urls
+from metrics import metrics
+from page import content_hash, fetch_page
+from socialmedia import (
+    ballotpedia_slug_url, extract_social_links, find_campaign_site, merge_socials,
+    search_ballotpedia_url,
+)
+from task_graph import TaskGraph
+
+# Seconds the slug probe runs alone before the store/API lookup is started
+# too (at once if the probe misses sooner)
+LOOKUP_DELAY = 1.0
+
+
+def _fetched(url):
+    """(url, Page) for url, or None if it can't be fetched."""
+    try:
+        return url, fetch_page(url)
+    except requests.RequestException:
+        return None
+
+
+def _timed(stage, func):
+    """func wrapped in a stage_seconds timer, like the stages of get_candidate_socials."""
+    def run(*args):
+        with metrics.timer('stage_seconds', stage=stage):
+            return func(*args)
+    return run
+
+
+def probe_ballotpedia(candidate_name, errors=None):
+    """
+    The slug guess fetched with GET rather than probed with HEAD: when it
+    exists, the page it returns is the one the next step needs anyway.
+    errors: optional list that receives the exception when the slug page
+    could not be checked (any failure but a missing page).
+    """
+    url = ballotpedia_slug_url(candidate_name)
+    try:
+        found = url, fetch_page(url)
+    except requests.RequestException as e:
+        response = getattr(e, 'response', None)
+        if errors is not None and (response is None
+                                   or response.status_code not in title_index.MISSING_STATUSES):
+            errors.append(e)
+        return None
+    title_index.learn_url(url)
+    return found
+
+
+def lookup_ballotpedia(candidate_name):
+    """
+    The page known from the result store or the MediaWiki API (which also
+    follows redirects and title normalization, and gives the title index's
+    hint once the slug is confirmed missing), fetched. Returns None when
+    neither knows it, or when it is the slug guess probe_ballotpedia is
+    already fetching.
+    """
+    store = result_store.get_store()
+    stored = store.candidate(candidate_name) if store is not None else None
+    url = stored and stored.get('ballotpedia_url')
+    if not url:
+        url = resolve_ballotpedia_urls([candidate_name]).get(candidate_name)
+    if not url or url == ballotpedia_slug_url(candidate_name):
+        return None
+    return _fetched(url)
+
+
+def race_ballotpedia(graph, name, candidate_name, errors=None):
+    """
+    Adds a step racing probe_ballotpedia against lookup_ballotpedia: (url, Page)
+    or None. The lookup is a hedge, started only after LOOKUP_DELAY or once the
+    probe misses, so a slug that exists costs no API request; a racer already
+    running when the other wins runs to completion. A page the title index
+    knows is fetched directly, without a race. errors: see probe_ballotpedia.
+    """
+    start = time.perf_counter()
+    known = title_index.lookup_url(candidate_name)
+    if known:
+        step = graph.add(name, lambda: _fetched(known))
+    else:
+        step = graph.race(name, lambda: probe_ballotpedia(candidate_name, errors),
+                          lambda: lookup_ballotpedia(candidate_name), stagger=LOOKUP_DELAY)
+    step.add_done_callback(lambda _: metrics.observe(
+        'stage_seconds', time.perf_counter() - start, stage='find_ballotpedia_url'))
+    return step
+
+
+def find_ballotpedia_url(candidate_name, raise_errors=False):
+    """
+    Ballotpedia URL from the title index, else the race alone (no SerpAPI), or
+    None. With raise_errors, a miss that may only be a failed fetch (the slug
+    page could not be checked) raises the requests exception instead.
+    """
+    known = title_index.lookup_url(candidate_name)
+    if known:
+        return known
+    errors = [] if raise_errors else None
+    with TaskGraph() as graph:
+        race_ballotpedia(graph, 'bp', candidate_name, errors)
+        found = graph.result('bp')
+    if found:
+        return found[0]
+    if errors:
+        raise errors[0]
+    return None
+
+
+def candidate_socials(candidate_name, bp_url=None, hashes=None):
+    """
+    Same result as socialmedia.get_candidate_socials, computed as a graph so
+    a candidate costs about one chain of round trips:
+        bp page -> campaign site -> campaign page -> campaign socials
+                \\-> Ballotpedia socials (parsed while the campaign site loads)
+    Without bp_url, the slug guess and the store/API lookup race for the
+    Ballotpedia page; SerpAPI is only searched when both miss.
+    hashes: optional dict that receives the content_hash of the pages parsed
+    ('ballotpedia', 'campaign'), for run_state.RunState.record.
+    """
+    def ballotpedia_page(found):
+        if found:
+            return found
+        url = search_ballotpedia_url(candidate_name)
+        if not url:
+            return None, None
+        return _fetched(url) or (url, None)
+
+    def fetch_campaign(site):
+        if not site:
+            return None
+        with metrics.timer('stage_seconds', stage='fetch_campaign'):
+            found = _fetched(site)
+        return found[1] if found else None
+
+    def campaign_socials(page):
+        if page is None:
+            return {}
+        with metrics.timer('stage_seconds', stage='extract_social_links'):
+            return extract_social_links(page)
+
+    with TaskGraph() as graph:
+        if bp_url:
+            graph.add('found', _timed('fetch_ballotpedia',
+                                      lambda: _fetched(bp_url) or (bp_url, None)))
+        else:
+            race_ballotpedia(graph, 'found', candidate_name)
+        graph.add('bp', ballotpedia_page, 'found')
+        graph.add('campaign_site', _timed(
+            'find_campaign_site',
+            lambda bp: find_campaign_site(bp[1], candidate_name) if bp[1] else None), 'bp')
+        graph.add('socials_bp', _timed(
+            'extract_social_links', lambda bp: extract_social_links(bp[1]) if bp[1] else {}), 'bp')
+        graph.add('campaign_page', fetch_campaign, 'campaign_site')
+        graph.add('socials_cam', campaign_socials, 'campaign_page')
+        found_url, bp_page = graph.result('bp')
+        campaign_site = graph.result('campaign_site')
+        campaign_page = graph.result('campaign_page')
+        socials_cam = graph.result('socials_cam')
+        merged = merge_socials(graph.result('socials_bp'), socials_cam)
+    if hashes is not None:
+        if bp_page is not None:
+            hashes['ballotpedia'] = content_hash(bp_page)
+        if campaign_page is not None:
+            hashes['campaign'] = content_hash(campaign_page)
+    return {'ballotpedia_url': found_url, 'campaign_site': campaign_site, 'social_links': merged}
@@ -1,16 +1,14 @@
+import heapq
+import os
 import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urldefrag, urljoin, urlparse
+
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-
-# Common request headers to mimic a browser
-REQUEST_HEADERS = {
-    'User-Agent': (
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-        'AppleWebKit/537.36 (KHTML, like Gecko) '
-        'Chrome/114.0.0.0 Safari/537.36'
-    )
-}
+
+from metrics import metrics
+from page import Page, fetch_page
+from throttle import host_of
 
 # Regex patterns for phone, email, and PO Box
 PHONE_PATTERN = re.compile(r"(?:\+?1[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}")
@@ -18,69 +16,305 @@ EMAIL_PATTERN = re.compile(r"[\w\.-]+@[\w\.-]+")
 PO_PATTERN = re.compile(r"\bP\.?\s*O\.?\s*Box\b", re.IGNORECASE)
 ZIP_PATTERN = re.compile(r"\d{5}(?:-\d{4})?")
 
+# All of the above as one alternation, scanned once over the page text.
+# PO Boxes stay within a line like the per-line scan they replace.
+CONTACT_REGEX = re.compile(
+    r"(?P<email>" + EMAIL_PATTERN.pattern + ")"
+    r"|(?P<phone>" + PHONE_PATTERN.pattern + ")"
+    r"|(?P<zip>" + ZIP_PATTERN.pattern + ")"
+    r"|(?P<po>\bP\.?[^\S\n]*O\.?[^\S\n]*Box\b)",
+    re.IGNORECASE,
+)
+
+CONTACT_FIELDS = ('addresses', 'phones', 'emails')
+
+# Per-site crawl limits (overridable via environment or per call)
+CRAWL_MAX_PAGES = int(os.getenv('SCRAPE_CRAWL_MAX_PAGES', 8))
+CRAWL_MAX_BYTES = int(os.getenv('SCRAPE_CRAWL_MAX_BYTES', 2 * 1024 * 1024))
+CRAWL_MAX_DEPTH = int(os.getenv('SCRAPE_CRAWL_MAX_DEPTH', 2))
+CRAWL_WORKERS = int(os.getenv('SCRAPE_CRAWL_WORKERS', 4))
+
+# URL path keywords, most likely to hold contact details first
+CONTACT_PAGE_HINTS = (
+    ('contact',), ('about', 'meet', 'bio'), ('connect', 'office', 'visit', 'location'),
+    ('volunteer', 'involved', 'donate', 'join'),
+)
+
+# Directory index documents: /x/index.html is the page /x/ (crawled once)
+INDEX_DOCUMENT = re.compile(r'/index\.(?:html?|php|aspx?)$', re.IGNORECASE)
+
+# Links that are never HTML pages
+SKIP_EXTENSIONS = (
+    '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico', '.css', '.js',
+    '.zip', '.mp3', '.mp4', '.mov', '.doc', '.docx', '.xls', '.xlsx', '.ics',
+)
+
+
+def normalize_phone(phone):
+    """E.164 form of a PHONE_PATTERN match, e.g. '(555) 123-4567' -> '+15551234567'."""
+    digits = re.sub(r'\D', '', phone)
+    if len(digits) == 11 and digits.startswith('1'):
+        digits = digits[1:]
+    return '+1' + digits if len(digits) == 10 else phone
+
+
+def normalize_email(email):
+    """Lowercased EMAIL_PATTERN match without trailing sentence punctuation, or None."""
+    email = email.strip('.-').lower()
+    local, _, domain = email.partition('@')
+    return email if local and domain else None
+
 
-def extract_contact_info(campaign_url):
+def page_contact_info(page):
     """
-    Fetches the campaign site URL and extracts:
+    Extracts contact details from a single Page in one scan of its text:
       - Addresses from <address> tags and lines containing ZIP codes or PO Boxes
-      - Phone numbers via regex
-      - Emails via regex
+      - Phone numbers, normalized to E.164
+      - Emails, normalized (lowercase)
+    Each list is de-duplicated in order of first appearance.
     Returns a dict with 'addresses', 'phones', 'emails'.
     """
-    try:
-        resp = requests.get(campaign_url, headers=REQUEST_HEADERS, timeout=10)
-        resp.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Error fetching {campaign_url}: {e}")
-        return {'addresses': [], 'phones': [], 'emails': []}
+    text = page.text
+    # dicts as insertion-ordered sets
+    addresses = dict.fromkeys(addr for addr in page.addresses if addr)
+    phones = {}
+    emails = {}
 
-    soup = BeautifulSoup(resp.text, 'html.parser')
-    text = soup.get_text(separator='\n', strip=True)
+    line_end = -1
+    for m in CONTACT_REGEX.finditer(text):
+        kind = m.lastgroup
+        if kind == 'email':
+            email = normalize_email(m.group())
+            if email:
+                emails[email] = None
+        elif kind == 'phone':
+            phones[normalize_phone(m.group())] = None
+        elif m.start() > line_end:
+            # ZIP code or PO Box: the whole line is an address (once per line)
+            line_start = text.rfind('\n', 0, m.start()) + 1
+            line_end = text.find('\n', m.end())
+            if line_end == -1:
+                line_end = len(text)
+            clean = ' '.join(text[line_start:line_end].split())
+            if clean:
+                addresses[clean] = None
 
-    # 1) Extract <address> tags
-    addresses = []
-    for addr_tag in soup.find_all('address'):
-        addr = addr_tag.get_text(separator=' ', strip=True)
-        addresses.append(addr)
+    return {
+        'addresses': list(addresses),
+        'phones':   list(phones),
+        'emails':   list(emails)
+    }
 
-    # 2) Heuristic: look for lines with ZIP codes or PO Boxes
-    for line in text.split('\n'):
-        if ZIP_PATTERN.search(line) or PO_PATTERN.search(line):
-            clean = line.strip()
-            if clean and clean not in addresses:
-                addresses.append(clean)
 
-    # 3) Extract phone numbers
-    phones = PHONE_PATTERN.findall(text)
+def link_priority(url):
+    """Crawl priority of a same-site link: 0 for contact pages, up to len(CONTACT_PAGE_HINTS) for others."""
+    path = urlparse(url).path.lower()
+    for rank, words in enumerate(CONTACT_PAGE_HINTS):
+        if any(word in path for word in words):
+            return rank
+    return len(CONTACT_PAGE_HINTS)
 
-    # 4) Extract emails
-    emails = EMAIL_PATTERN.findall(text)
 
-    # Deduplicate
-    return {
-        'addresses': list(dict.fromkeys(addresses)),
-        'phones':   list(dict.fromkeys(phones)),
-        'emails':   list(dict.fromkeys(emails))
-    }
+class ContactCrawl:
+    """
+    Bookkeeping for a bounded crawl of one campaign site, shared by the
+    sync (crawl_contact_info) and async (AsyncScraper) crawlers:
+      - frontier: same-site links, likely contact pages first, then by depth
+      - budget:   at most max_pages pages and max_bytes of HTML per site
+      - merge:    de-duplicated items in discovery order, each with the URL
+                  it was first seen on
+    Stops early once every field in CONTACT_FIELDS has at least one item.
+    """
+
+    def __init__(self, start_url, max_pages=None, max_bytes=None, max_depth=None):
+        self.start_url = start_url
+        self.max_pages = CRAWL_MAX_PAGES if max_pages is None else max_pages
+        self.max_bytes = CRAWL_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_depth = CRAWL_MAX_DEPTH if max_depth is None else max_depth
+        self.site = host_of(start_url)
+        self.pages = []
+        self.bytes = 0
+        self.items = {field: {} for field in CONTACT_FIELDS}
+        self._frontier = []
+        self._seen = set()  # _page_key of every URL queued or landed on
+        self._crawled = set()  # _page_key of every page recorded
+        self._launched = 0
+        self._order = 0
+        self.add_link(start_url, 0)
+
+    @staticmethod
+    def _page_key(url):
+        """url without fragment or directory index document, for de-duplication."""
+        url = urldefrag(url)[0]
+        parsed = urlparse(url)
+        return parsed._replace(path=INDEX_DOCUMENT.sub('/', parsed.path)).geturl()
+
+    def add_link(self, url, depth):
+        url = urldefrag(url)[0]
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or host_of(url) != self.site:
+            return
+        key = self._page_key(url)
+        if parsed.path.lower().endswith(SKIP_EXTENSIONS) or key in self._seen:
+            return
+        self._seen.add(key)
+        priority = 0 if depth == 0 else link_priority(url)
+        heapq.heappush(self._frontier, (priority, depth, self._order, url))
+        self._order += 1
+
+    def complete(self):
+        """True once every contact field has been found."""
+        return all(self.items[field] for field in CONTACT_FIELDS)
+
+    def exhausted(self):
+        return self._launched >= self.max_pages or self.bytes >= self.max_bytes
+
+    def next_urls(self, n):
+        """Pops up to n (url, depth) pairs to fetch next, honouring the budgets."""
+        batch = []
+        while self._frontier and len(batch) < n and not self.complete() and not self.exhausted():
+            _, depth, _, url = heapq.heappop(self._frontier)
+            self._launched += 1
+            batch.append((url, depth))
+        return batch
+
+    def add_page(self, page, depth):
+        """Merges a fetched page's contact details and queues its links."""
+        final_url = page.response.url if page.response is not None else None
+        self.add_extracted(page.url, depth, page_contact_info(page), page.anchors,
+                           len(page.html), final_url)
+
+    def add_extracted(self, url, depth, info, anchors, size, final_url=None):
+        """
+        add_page for a page parsed elsewhere (see ParsePool.fetch_contact_page).
+        A redirected page is recorded, and its links resolved, at final_url.
+        """
+        if depth == 0 and final_url:
+            # Follow the site if the landing page redirected to another domain
+            self.site = host_of(final_url)
+        url = final_url or url
+        key = self._page_key(url)
+        self._seen.add(key)
+        self.bytes += size
+        if key in self._crawled:
+            # Redirected to a page already crawled
+            return
+        self._crawled.add(key)
+        self.pages.append(url)
+        for field, values in info.items():
+            for value in values:
+                self.items[field].setdefault(value, url)
+        if depth < self.max_depth:
+            for href in anchors:
+                self.add_link(urljoin(url, href), depth + 1)
+
+    def result(self):
+        """
+        Returns the extract_contact_info dict: 'addresses', 'phones', 'emails',
+        'sources' ({field: {item: url it was found on}}) and 'pages' (URLs crawled).
+        """
+        info = {field: list(found) for field, found in self.items.items()}
+        info['sources'] = {field: dict(found) for field, found in self.items.items()}
+        info['pages'] = list(self.pages)
+        return info
+
+
+def empty_contact_info():
+    """The extract_contact_info result for a site that could not be fetched."""
+    info = {field: [] for field in CONTACT_FIELDS}
+    info['sources'] = {field: {} for field in CONTACT_FIELDS}
+    info['pages'] = []
+    return info
+
+
+def normalize_site(url):
+    """Adds https:// to a bare domain as typed into the apps."""
+    url = url.strip()
+    if url and not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+
+def crawl_contact_info(campaign_url, max_pages=None, max_bytes=None, max_depth=None,
+                       workers=CRAWL_WORKERS, parse_pool=None):
+    """
+    Crawls the campaign site from campaign_url (a URL or an already fetched
+    Page), fetching up to `workers` pages at a time. See ContactCrawl for the
+    ordering, budgets and early stop. Pages that fail to load are skipped.
+    With a parse_pool (parse_pool.ParsePool), pages are parsed and scanned in
+    its worker processes instead of the fetching threads.
+    Raises requests.RequestException if the landing page isn't fetched
+    (including a URL that can't be crawled, such as a bare domain).
+    """
+    start = campaign_url if isinstance(campaign_url, Page) else None
+    crawl = ContactCrawl(start.url if start else campaign_url, max_pages, max_bytes, max_depth)
+    if start is not None:
+        # Already fetched: take it off the frontier and count it against the budget
+        crawl.next_urls(1)
+        crawl.add_page(start, 0)
+    fetch = fetch_page if parse_pool is None else parse_pool.fetch_contact_page
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    pending = {}
+    try:
+        while True:
+            for url, depth in crawl.next_urls(workers - len(pending)):
+                pending[pool.submit(fetch, url)] = (url, depth)
+            if not pending or crawl.complete():
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, depth = pending.pop(future)
+                try:
+                    fetched = future.result()
+                except requests.RequestException as e:
+                    if depth == 0:
+                        raise
+                    print(f"Error fetching {url}: {e}")
+                    continue
+                if parse_pool is None:
+                    crawl.add_page(fetched, depth)
+                else:
+                    crawl.add_extracted(url, depth, **fetched)
+    finally:
+        # Early stop: don't wait for fetches that are no longer needed
+        pool.shutdown(wait=False, cancel_futures=True)
+    if not crawl.pages:
+        raise requests.exceptions.InvalidURL(f"Nothing crawled from {campaign_url!r}")
+    return crawl.result()
+
+
+def extract_contact_info(campaign_url, max_pages=None, max_bytes=None, max_depth=None,
+                         workers=CRAWL_WORKERS, parse_pool=None):
+    """
+    Extracts contact details from the campaign site (a URL or an already
+    fetched Page), following same-site links to /contact, /about and similar
+    pages within the crawl budget (max_pages=1 scans only the given page).
+    Returns a dict with 'addresses', 'phones', 'emails', plus 'sources' and
+    'pages' (see ContactCrawl.result).
+    """
+    try:
+        with metrics.timer('stage_seconds', stage='extract_contact_info'):
+            return crawl_contact_info(campaign_url, max_pages, max_bytes, max_depth, workers,
+                                      parse_pool)
+    except requests.RequestException as e:
+        print(f"Error fetching {campaign_url}: {e}")
+        return empty_contact_info()
 
 
 if __name__ == '__main__':
     raw = input(
         'Enter campaign site (e.g. example.com, www.example.com, https://example.com): '
     ).strip()
-    # Normalize URL for requests
-    if not raw.startswith(('http://', 'https://')):
-        campaign_url = 'https://' + raw
-    else:
-        campaign_url = raw
-
-    info = extract_contact_info(campaign_url)
+    info = extract_contact_info(normalize_site(raw))
+    sources = info['sources']
+    print(f"\nPages scanned: {len(info['pages'])}")
     print("\nAddresses:")
     for a in info['addresses']:
-        print(f"  - {a}")
+        print(f"  - {a}  ({sources['addresses'][a]})")
     print("\nPhone Numbers:")
     for p in info['phones']:
-        print(f"  - {p}")
+        print(f"  - {p}  ({sources['phones'][p]})")
     print("\nEmail Addresses:")
     for e in info['emails']:
-        print(f"  - {e}")
+        print(f"  - {e}  ({sources['emails'][e]})")
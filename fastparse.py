@@ -0,0 +1,174 @@
+from html.parser import HTMLParser
+
+# Elements whose text BeautifulSoup's get_text() leaves out
+SKIP_TEXT_TAGS = {'script', 'style', 'template'}
+
+
+class _Extractor(HTMLParser):
+    """
+    Single pass over a document collecting only what the extractors use:
+    <a href> values, visible text strings, <address> text and the rows of the
+    first infobox table. No tree is built.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.anchors = []
+        self.strings = []
+        self.addresses = []
+        self.infobox_rows = None
+        self._pending = []            # adjacent data chunks, merged into one string like bs4 does
+        self._skip_depth = 0
+        self._address_stack = []      # (index in addresses, text pieces), one per open <address>
+        self._infobox_depth = 0       # open <table> elements inside the infobox
+        self._open_rows = []          # rows of the infobox whose <tr> is still open
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        attrs = dict(attrs)
+        if tag in SKIP_TEXT_TAGS:
+            self._skip_depth += 1
+        elif tag == 'address':
+            self.addresses.append(None)
+            self._address_stack.append((len(self.addresses) - 1, []))
+        elif tag == 'table':
+            if self._infobox_depth:
+                self._infobox_depth += 1
+            elif self.infobox_rows is None and 'infobox' in (attrs.get('class') or '').split():
+                self.infobox_rows = []
+                self._infobox_depth = 1
+        elif tag == 'tr' and self._infobox_depth:
+            row = {'th': None, 'td_links': None, 'links': [],
+                   '_th_depth': 0, '_th_parts': None, '_td_depth': 0}
+            self.infobox_rows.append(row)
+            self._open_rows.append(row)
+        elif tag == 'th':
+            for row in self._open_rows:
+                if row['_th_parts'] is None:
+                    row['_th_parts'] = []
+                    row['_th_depth'] = 1
+                elif row['_th_depth']:
+                    row['_th_depth'] += 1
+        elif tag == 'td':
+            for row in self._open_rows:
+                if row['td_links'] is None:
+                    row['td_links'] = []
+                    row['_td_depth'] = 1
+                elif row['_td_depth']:
+                    row['_td_depth'] += 1
+
+        if tag == 'a' and 'href' in attrs:
+            href = attrs['href'] or ''
+            self.anchors.append(href)
+            for row in self._open_rows:
+                row['links'].append(href)
+                if row['_td_depth']:
+                    row['td_links'].append(href)
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing syntax never opens a container we track; only links matter
+        self._flush()
+        if tag == 'a':
+            self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in SKIP_TEXT_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == 'address' and self._address_stack:
+            index, parts = self._address_stack.pop()
+            self.addresses[index] = ' '.join(parts)
+        elif tag == 'table' and self._infobox_depth:
+            self._infobox_depth -= 1
+            if not self._infobox_depth:
+                self._close_rows(len(self._open_rows))
+        elif tag == 'tr' and self._open_rows:
+            self._close_rows(1)
+        elif tag == 'th':
+            for row in self._open_rows:
+                if row['_th_depth']:
+                    row['_th_depth'] -= 1
+                    if not row['_th_depth']:
+                        row['th'] = ''.join(row['_th_parts'])
+        elif tag == 'td':
+            for row in self._open_rows:
+                if row['_td_depth']:
+                    row['_td_depth'] -= 1
+
+    def _close_rows(self, count):
+        for _ in range(count):
+            row = self._open_rows.pop()
+            if row['th'] is None and row['_th_parts'] is not None:
+                row['th'] = ''.join(row['_th_parts'])
+
+    def handle_data(self, data):
+        self._pending.append(data)
+
+    def _flush(self):
+        if not self._pending:
+            return
+        data = ''.join(self._pending)
+        self._pending = []
+        if self._skip_depth:
+            return
+        clean = data.strip()
+        if not clean:
+            return
+        self.strings.append(clean)
+        for _, parts in self._address_stack:
+            parts.append(clean)
+        for row in self._open_rows:
+            if row['_th_depth']:
+                row['_th_parts'].append(clean)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        # BeautifulSoup keeps CDATA sections as their own text string
+        self._flush()
+        if data.startswith('CDATA['):
+            self.handle_data(data[len('CDATA['):])
+            self._flush()
+
+    def close(self):
+        super().close()
+        self._flush()
+        for index, parts in self._address_stack:
+            self.addresses[index] = ' '.join(parts)
+        self._address_stack = []
+        self._close_rows(len(self._open_rows))
+        for row in self.infobox_rows or []:
+            for key in ('_th_depth', '_th_parts', '_td_depth'):
+                row.pop(key, None)
+
+
+def extract(html):
+    """
+    Parses html in one streaming pass and returns a dict with:
+      - anchors:      every <a href> value, in document order
+      - text:         visible text, equivalent to soup.get_text(separator='\\n', strip=True)
+      - addresses:    text of each <address>, like tag.get_text(separator=' ', strip=True)
+      - infobox_rows: None when the page has no infobox table, else one dict per <tr>:
+                      {'th': first <th> text or None,
+                       'td_links': hrefs inside the first <td> or None,
+                       'links': hrefs anywhere in the row}
+    Character references are decoded as the HTML5 spec says (html.unescape);
+    BeautifulSoup differs only on malformed ones, e.g. it drops the ';' of
+    an unknown "&foo;". tests/test_fastparse.py checks the equivalence.
+    """
+    parser = _Extractor()
+    parser.feed(html)
+    parser.close()
+    return {
+        'anchors': parser.anchors,
+        'text': '\n'.join(parser.strings),
+        'addresses': parser.addresses,
+        'infobox_rows': parser.infobox_rows,
+    }
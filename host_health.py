@@ -0,0 +1,249 @@
+import os
+import socket
+import sqlite3
+import ssl
+import threading
+import time
+
+import requests
+
+import http_cache
+from metrics import metrics
+from throttle import host_of
+
+# Host health settings (overridable via environment or configure())
+HEALTH_ENABLED = os.getenv('SCRAPE_HOST_HEALTH', '1') not in ('0', 'false', 'no', '')
+HEALTH_DB = os.getenv('SCRAPE_HOST_HEALTH_DB')  # default: hosts.sqlite in http_cache.CACHE_DIR
+
+# How long a host is skipped after each kind of failure (seconds)
+FAILURE_TTLS = {
+    'dns': 6 * 3600,       # name does not resolve (expired domain)
+    'tls': 6 * 3600,       # certificate / handshake errors
+    'refused': 30 * 60,    # connection refused or reset
+}
+
+# Circuit breaker for slow hosts: after this many consecutive timed-out
+# requests the host is skipped for TIMEOUT_COOLDOWN seconds, doubling on
+# every further failure up to MAX_COOLDOWN. Timeouts to tracked hosts are
+# not retried (see retry_timeouts), so each one counts.
+TIMEOUT_THRESHOLD = int(os.getenv('SCRAPE_TIMEOUT_THRESHOLD', 2))
+TIMEOUT_COOLDOWN = 10 * 60
+MAX_COOLDOWN = 6 * 3600
+
+# Once a host's down time is over, a single probe request is let through;
+# if it has neither succeeded nor failed after this long, another may go
+PROBE_TIMEOUT = 60
+
+# Hosts never failed fast (and subdomains): the pipeline can't work without them
+EXEMPT_HOSTS = ('ballotpedia.org', 'serpapi.com')
+
+
+class HostDownError(requests.ConnectionError):
+    """Raised instead of sending a request to a host known to be down or hanging."""
+
+
+def _causes(error):
+    """error and everything it wraps (cause, context, urllib3 reason, args)."""
+    seen = set()
+    stack = [error]
+    while stack:
+        e = stack.pop()
+        if not isinstance(e, BaseException) or id(e) in seen:
+            continue
+        seen.add(id(e))
+        yield e
+        stack.extend((e.__cause__, e.__context__, getattr(e, 'reason', None)))
+        stack.extend(e.args)
+
+
+def classify(error):
+    """
+    Failure kind of a request exception: 'dns', 'tls', 'refused', 'timeout',
+    or None for errors that say nothing about the host's health.
+    Works for the sync client (urllib3 errors) and AsyncScraper (aiohttp errors).
+    """
+    kinds = set()
+    for e in _causes(error):
+        name = type(e).__name__
+        if isinstance(e, socket.gaierror) or 'NameResolution' in name or 'DNS' in name:
+            kinds.add('dns')
+        elif isinstance(e, (ssl.SSLError, requests.exceptions.SSLError)) \
+                or 'SSL' in name or 'Certificate' in name:
+            kinds.add('tls')
+        elif isinstance(e, (requests.Timeout, TimeoutError, socket.timeout)) or 'Timeout' in name:
+            kinds.add('timeout')
+        elif isinstance(e, (ConnectionRefusedError, ConnectionResetError)):
+            kinds.add('refused')
+    for kind in ('dns', 'tls', 'timeout', 'refused'):
+        if kind in kinds:
+            return kind
+    return None
+
+
+class HostHealth:
+    """
+    Per-host health tracker shared by every fetch, persisted in SQLite so
+    dead hosts stay skipped across runs:
+      - negative cache: DNS, TLS and refused-connection failures mark the host
+        down for FAILURE_TTLS[kind]
+      - circuit breaker: TIMEOUT_THRESHOLD consecutive timeouts open the
+        circuit for a cooldown that doubles while the host keeps failing
+      - half-open: once the down time is over, check() lets exactly one
+        request through as a probe and keeps failing the others until it
+        ends (or PROBE_TIMEOUT passes); a failed probe reopens the circuit
+      - any response (even an HTTP error) marks the host healthy again
+    check() raises HostDownError for a host that is down.
+    """
+
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._hosts = {}  # host -> [kind, consecutive failures, down_until]
+        self._probes = {}  # host -> when its half-open probe was let through
+        self._db = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self._lock, self._db:
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS hosts ('
+                    ' host TEXT PRIMARY KEY, kind TEXT, failures INTEGER, down_until REAL)'
+                )
+                for host, kind, failures, down_until in self._db.execute('SELECT * FROM hosts'):
+                    self._hosts[host] = [kind, failures, down_until]
+
+    def _save(self, host, state):
+        if self._db is None:
+            return
+        with self._db:
+            if state is None:
+                self._db.execute('DELETE FROM hosts WHERE host = ?', (host,))
+            else:
+                self._db.execute('INSERT OR REPLACE INTO hosts VALUES (?, ?, ?, ?)', (host, *state))
+
+    @staticmethod
+    def _tracked(host):
+        return host and not any(host == h or host.endswith('.' + h) for h in EXEMPT_HOSTS)
+
+    def tracks(self, url):
+        """True if failures of url's host are tracked (it is not exempt)."""
+        return bool(self._tracked(host_of(url)))
+
+    def status(self, url):
+        """(kind, seconds until the host may be retried) if it is down, else None."""
+        host = host_of(url)
+        with self._lock:
+            state = self._hosts.get(host)
+        if state is None:
+            return None
+        kind, _, down_until = state
+        remaining = down_until - time.time()
+        return (kind, remaining) if remaining > 0 else None
+
+    def check(self, url):
+        """
+        Raises HostDownError if url's host is currently down, or if its down
+        time is over but another request is already probing it.
+        """
+        host = host_of(url)
+        now = time.time()
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or not state[2]:
+                return
+            kind, _, down_until = state
+            remaining = down_until - now
+            if remaining <= 0:
+                probing = self._probes.get(host)
+                if probing is None or now - probing >= PROBE_TIMEOUT:
+                    self._probes[host] = now
+                    metrics.incr('host_probe_total', reason=kind)
+                    return
+        metrics.incr('host_fail_fast_total', reason=kind)
+        if remaining > 0:
+            raise HostDownError(f"{host} is down ({kind}); skipping for another {remaining:.0f}s")
+        raise HostDownError(f"{host} is down ({kind}); waiting for the probe request")
+
+    def record_success(self, url):
+        host = host_of(url)
+        with self._lock:
+            self._probes.pop(host, None)
+            if host not in self._hosts:
+                return
+            del self._hosts[host]
+            self._save(host, None)
+
+    def record_failure(self, url, error):
+        """Updates the host's state after a request failed with error."""
+        host = host_of(url)
+        kind = classify(error)
+        with self._lock:
+            # Whatever the error, a probe that ended frees the way for the next
+            self._probes.pop(host, None)
+        if kind is None or not self._tracked(host):
+            return
+        now = time.time()
+        with self._lock:
+            _, failures, _ = self._hosts.get(host, (None, 0, 0.0))
+            failures += 1
+            if kind == 'timeout':
+                if failures < TIMEOUT_THRESHOLD:
+                    down_until = 0.0
+                else:
+                    trips = failures - TIMEOUT_THRESHOLD
+                    down_until = now + min(MAX_COOLDOWN, TIMEOUT_COOLDOWN * 2 ** trips)
+            else:
+                down_until = now + FAILURE_TTLS[kind]
+            state = [kind, failures, down_until]
+            self._hosts[host] = state
+            self._save(host, state)
+        if down_until:
+            metrics.incr('host_down_total', reason=kind)
+
+    def clear(self):
+        with self._lock:
+            self._hosts.clear()
+            self._probes.clear()
+            if self._db is not None:
+                with self._db:
+                    self._db.execute('DELETE FROM hosts')
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def configure(path=None, enabled=None):
+    """Overrides the default settings; takes effect on the next request."""
+    global HEALTH_DB, HEALTH_ENABLED, _tracker
+    with _tracker_lock:
+        if path is not None:
+            HEALTH_DB = path
+        if enabled is not None:
+            HEALTH_ENABLED = enabled
+        _tracker = None
+
+
+def retry_timeouts(url):
+    """
+    False when timeouts to url's host are tracked by the circuit breaker:
+    such a request fails on its first timeout, so a hanging host costs one
+    timeout per request and each one counts towards TIMEOUT_THRESHOLD.
+    """
+    tracker = get_tracker()
+    return tracker is None or not tracker.tracks(url)
+
+
+def get_tracker():
+    """Returns the shared HostHealth, or None when disabled."""
+    global _tracker
+    if not HEALTH_ENABLED:
+        return None
+    with _tracker_lock:
+        if _tracker is None:
+            try:
+                _tracker = HostHealth(http_cache.cache_path('hosts.sqlite', HEALTH_DB))
+            except (OSError, sqlite3.Error):
+                # Unwritable cache directory: track in memory only
+                _tracker = HostHealth(None)
+        return _tracker
@@ -0,0 +1,343 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from metrics import metrics
+
+# Cache settings (overridable via environment or configure())
+CACHE_ENABLED = os.getenv('SCRAPE_CACHE', '1') not in ('0', 'false', 'no', '')
+CACHE_DIR = os.getenv('SCRAPE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'scrapecontacts'))
+CACHE_TTL = int(os.getenv('SCRAPE_CACHE_TTL', 24 * 3600))
+CACHE_MAX_BYTES = int(os.getenv('SCRAPE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+# Eviction frees room down to this fraction of CACHE_MAX_BYTES, so it runs rarely
+EVICT_TO = 0.9
+
+# Only these response headers are kept with a cached entry
+KEPT_HEADERS = ('content-type', 'etag', 'last-modified', 'location')
+
+# HEAD error statuses worth caching: the page definitely isn't there
+HEAD_MISSING_STATUSES = (404, 410)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """
+    Canonical form of a URL used as the cache key: lowercase scheme and host,
+    default port dropped, empty path as '/', query parameters sorted, fragment removed.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+def _cache_key(method, url):
+    return hashlib.sha256(f"{method.upper()} {normalize_url(url)}".encode('utf-8')).hexdigest()
+
+
+class HTTPCache:
+    """
+    Persistent HTTP response cache.
+    Bodies are stored zlib-compressed on disk, one file per entry; an SQLite
+    index tracks metadata (status, validators, freshness, last access, size).
+      - Entries younger than ttl seconds are served without any network I/O.
+      - Stale entries are revalidated with If-None-Match / If-Modified-Since;
+        a 304 refreshes the entry and serves the stored body.
+      - When the stored bytes exceed max_bytes, least recently used entries are
+        evicted down to EVICT_TO of it. The total is kept in a one-row table by
+        triggers, so checking it doesn't scan the index, even with several
+        processes sharing the cache.
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'),
+                                   timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                ' key TEXT PRIMARY KEY, method TEXT, url TEXT, final_url TEXT,'
+                ' status INTEGER, headers TEXT, encoding TEXT,'
+                ' stored_at REAL, accessed_at REAL, size INTEGER)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)')
+            # INSERT OR REPLACE only fires the delete trigger for the replaced row with this on
+            self._db.execute('PRAGMA recursive_triggers = ON')
+            self._db.execute('CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY, size INTEGER)')
+            # Caches created before the totals table: counted once
+            self._db.execute('INSERT OR IGNORE INTO totals SELECT 0, COALESCE(SUM(size), 0) FROM entries')
+            self._db.execute(
+                'CREATE TRIGGER IF NOT EXISTS entries_added AFTER INSERT ON entries'
+                ' BEGIN UPDATE totals SET size = size + new.size WHERE id = 0; END'
+            )
+            self._db.execute(
+                'CREATE TRIGGER IF NOT EXISTS entries_removed AFTER DELETE ON entries'
+                ' BEGIN UPDATE totals SET size = size - old.size WHERE id = 0; END'
+            )
+
+    def _body_path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.z')
+
+    def lookup(self, method, url):
+        """Returns the stored entry dict for (method, url), or None."""
+        key = _cache_key(method, url)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT final_url, status, headers, encoding, stored_at FROM entries WHERE key = ?',
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        body = b''
+        if method.upper() != 'HEAD':
+            try:
+                with open(self._body_path(key), 'rb') as f:
+                    body = zlib.decompress(f.read())
+            except (OSError, zlib.error):
+                self.delete(method, url)
+                return None
+        final_url, status, headers, encoding, stored_at = row
+        return {
+            'key': key, 'url': final_url, 'status': status, 'headers': json.loads(headers),
+            'encoding': encoding, 'stored_at': stored_at, 'body': body,
+        }
+
+    def is_fresh(self, entry):
+        return time.time() - entry['stored_at'] < self.ttl
+
+    def touch(self, entry, revalidated=False):
+        """Marks an entry as recently used (and, if revalidated, fresh again)."""
+        now = time.time()
+        with self._lock, self._db:
+            if revalidated:
+                self._db.execute('UPDATE entries SET accessed_at = ?, stored_at = ? WHERE key = ?',
+                                 (now, now, entry['key']))
+                entry['stored_at'] = now
+            else:
+                self._db.execute('UPDATE entries SET accessed_at = ? WHERE key = ?',
+                                 (now, entry['key']))
+
+    def store(self, method, url, resp):
+        """Stores a response; HEAD entries keep only status, headers and final URL."""
+        key = _cache_key(method, url)
+        headers = {k: v for k, v in resp.headers.items() if k.lower() in KEPT_HEADERS}
+        size = 0
+        if method.upper() != 'HEAD':
+            data = zlib.compress(resp.content)
+            size = len(data)
+            path = self._body_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, method.upper(), normalize_url(url), resp.url or url, resp.status_code,
+                 json.dumps(headers), resp.encoding, now, now, size)
+            )
+        self.evict()
+
+    def delete(self, method, url):
+        key = _cache_key(method, url)
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+        try:
+            os.remove(self._body_path(key))
+        except OSError:
+            pass
+
+    def total_bytes(self):
+        with self._lock:
+            return self._db.execute('SELECT size FROM totals WHERE id = 0').fetchone()[0]
+
+    def evict(self):
+        """
+        Once the byte budget is exceeded, drops least recently used entries
+        until the cache is back under EVICT_TO of it.
+        """
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * EVICT_TO)
+        victims = []
+        with self._lock:
+            # Walks the accessed_at index only as far as needed
+            for key, size in self._db.execute('SELECT key, size FROM entries ORDER BY accessed_at'):
+                if excess <= 0:
+                    break
+                victims.append(key)
+                excess -= size
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM entries WHERE key = ?', [(k,) for k in victims])
+        for key in victims:
+            try:
+                os.remove(self._body_path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock, self._db:
+            keys = [r[0] for r in self._db.execute('SELECT key FROM entries')]
+            self._db.execute('DELETE FROM entries')
+        for key in keys:
+            try:
+                os.remove(self._body_path(key))
+            except OSError:
+                pass
+
+
+def build_response(url, status, headers, body, encoding=None, from_cache=False):
+    """Builds a requests.Response from raw parts (cache entries, other HTTP clients)."""
+    resp = requests.Response()
+    resp.status_code = status
+    resp.headers = CaseInsensitiveDict(headers)
+    resp.url = url
+    resp.encoding = encoding
+    resp._content = body
+    resp.from_cache = from_cache
+    return resp
+
+
+def response_from_entry(entry):
+    """Builds a requests.Response from a stored cache entry."""
+    return build_response(entry['url'], entry['status'], entry['headers'], entry['body'],
+                          entry['encoding'], from_cache=True)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def configure(directory=None, ttl=None, max_bytes=None, enabled=None):
+    """Overrides the default cache settings; takes effect on the next request."""
+    global CACHE_DIR, CACHE_TTL, CACHE_MAX_BYTES, CACHE_ENABLED, _cache
+    with _cache_lock:
+        if directory is not None:
+            CACHE_DIR = directory
+        if ttl is not None:
+            CACHE_TTL = ttl
+        if max_bytes is not None:
+            CACHE_MAX_BYTES = max_bytes
+        if enabled is not None:
+            CACHE_ENABLED = enabled
+        _cache = None
+
+
+def cache_path(name, path=None):
+    """
+    path when it is set, otherwise the file name in the current CACHE_DIR.
+    Stores kept beside the cache call this when they are opened, so they
+    follow a later configure(directory=...).
+    """
+    return path if path is not None else os.path.join(CACHE_DIR, name)
+
+
+def get_cache():
+    """Returns the shared HTTPCache, or None when caching is disabled or unavailable."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = HTTPCache(CACHE_DIR, CACHE_TTL, CACHE_MAX_BYTES)
+            except (OSError, sqlite3.Error):
+                return None
+        return _cache
+
+
+def begin_request(method, url, headers=None, revalidate=False):
+    """
+    First half of a cached request, shared by the sync and async clients.
+    Returns (cache, entry, response, req_headers): response is set when a fresh
+    entry can be served as is; otherwise send req_headers (with any validators)
+    over the network and pass the result to finish_request().
+    With revalidate, even a fresh entry is checked with a conditional request.
+    """
+    cache = get_cache()
+    if cache is None:
+        return None, None, None, headers
+
+    try:
+        entry = cache.lookup(method, url)
+    except sqlite3.Error:
+        return None, None, None, headers
+
+    if entry is not None and not revalidate and cache.is_fresh(entry):
+        cache.touch(entry)
+        metrics.incr('http_cache_total', result='hit')
+        return cache, entry, response_from_entry(entry), headers
+
+    req_headers = dict(headers or {})
+    if entry is not None:
+        stored_headers = CaseInsensitiveDict(entry['headers'])
+        etag = stored_headers.get('ETag')
+        modified = stored_headers.get('Last-Modified')
+        if etag:
+            req_headers['If-None-Match'] = etag
+        if modified:
+            req_headers['If-Modified-Since'] = modified
+    return cache, entry, None, req_headers
+
+
+def finish_request(cache, entry, method, url, resp):
+    """
+    Second half of a cached request: serves the stored body on a 304 and stores
+    cacheable responses. GET responses are cached when 200 and not cut short by
+    the body size cap; HEAD responses when 2xx/3xx or a definite 404/410, so
+    missing Ballotpedia pages are remembered too (but not 403s or 429s, which
+    say nothing about whether the page exists).
+    """
+    resp.from_cache = False
+    if cache is None:
+        return resp
+    try:
+        if entry is not None and resp.status_code == 304:
+            cache.touch(entry, revalidated=True)
+            metrics.incr('http_cache_total', result='revalidated')
+            return response_from_entry(entry)
+        metrics.incr('http_cache_total', result='miss')
+        if method.upper() == 'HEAD':
+            cacheable = resp.status_code < 400 or resp.status_code in HEAD_MISSING_STATUSES
+        else:
+            cacheable = resp.status_code == 200
+        if getattr(resp, 'truncated', False):
+            cacheable = False
+        if cacheable and 'no-store' not in resp.headers.get('Cache-Control', '').lower():
+            cache.store(method, url, resp)
+    except (OSError, sqlite3.Error):
+        pass
+    return resp
+
+
+def cached_request(send, method, url, headers=None, revalidate=False, **kwargs):
+    """
+    Performs a request through the shared cache; send(method, url, headers, **kwargs)
+    does the actual network call on a miss or revalidation.
+    Cache errors fall back to the network.
+    """
+    cache, entry, resp, req_headers = begin_request(method, url, headers, revalidate)
+    if resp is not None:
+        return resp
+    resp = send(method, url, req_headers, **kwargs)
+    return finish_request(cache, entry, method, url, resp)
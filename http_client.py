@@ -0,0 +1,315 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+import host_health
+import http_cache
+from metrics import metrics, site_of
+import throttle
+from throttle import RobotsDisallowedError, host_limiter
+
+# Common request headers to mimic a browser (sent with every request)
+REQUEST_HEADERS = {
+    'User-Agent': (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+        'AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/114.0.0.0 Safari/537.36'
+    )
+}
+
+# Session settings (overridable via environment or configure())
+POOL_CONNECTIONS = int(os.getenv('SCRAPE_POOL_CONNECTIONS', 32))  # distinct hosts kept alive
+POOL_MAXSIZE = int(os.getenv('SCRAPE_POOL_MAXSIZE', 16))          # connections per host
+RETRIES = int(os.getenv('SCRAPE_RETRIES', 3))
+BACKOFF_FACTOR = float(os.getenv('SCRAPE_BACKOFF', 0.5))
+BACKOFF_JITTER = float(os.getenv('SCRAPE_BACKOFF_JITTER', 0.5))
+DEFAULT_TIMEOUT = 10
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Responses that mean "slow down": the whole host is backed off (see throttle.HostScheduler)
+THROTTLE_STATUSES = (429, 503)
+
+# Response body limits (overridable via environment or configure())
+MAX_BODY_BYTES = int(os.getenv('SCRAPE_MAX_BODY_BYTES', 5 * 1024 * 1024)) or None
+CHUNK_SIZE = 64 * 1024
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+# Content types too vague to go by; the first bytes of the body decide
+SNIFFED_CONTENT_TYPES = ('', 'text/plain', 'application/octet-stream', 'binary/octet-stream')
+HTML_SIGNATURES = (
+    b'<!doctype html', b'<html', b'<head', b'<body', b'<title', b'<script', b'<meta',
+    b'<div', b'<table', b'<p>', b'<a ', b'<br', b'<!--',
+)
+# Everything the extractors read sits inside <body>; the rest of a page can be skipped
+HTML_END_MARKER = b'</body>'
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class NotHTMLError(requests.RequestException):
+    """Raised by html_only requests when the response is not an HTML document."""
+
+
+def media_type(content_type):
+    """'text/html; charset=utf-8' -> 'text/html'"""
+    return (content_type or '').split(';')[0].strip().lower()
+
+
+def is_html(content_type, head=b''):
+    """
+    True if a response looks like HTML: by Content-Type, or for missing or
+    generic types by sniffing the first bytes of the body.
+    """
+    ctype = media_type(content_type)
+    if ctype in HTML_CONTENT_TYPES:
+        return True
+    if ctype not in SNIFFED_CONTENT_TYPES:
+        return False
+    head = head[:1024].lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    return head.startswith(HTML_SIGNATURES)
+
+
+class BodyReader:
+    """
+    Collects a streamed response body, chunk by chunk, and says when to stop:
+      - after max_bytes (the body is cut there and .truncated is set)
+      - once stop_at (case-insensitive) has been read, e.g. HTML_END_MARKER
+    feed() returns False when no more data is wanted.
+    """
+
+    def __init__(self, max_bytes=None, stop_at=None):
+        self.max_bytes = max_bytes
+        self.stop_at = stop_at.lower() if stop_at else None
+        self.truncated = False
+        self._buf = bytearray()
+
+    @property
+    def body(self):
+        return bytes(self._buf)
+
+    def feed(self, chunk):
+        # Re-scan the tail of the previous chunk in case the marker straddles both
+        start = max(0, len(self._buf) - len(self.stop_at) + 1) if self.stop_at else 0
+        self._buf += chunk
+        if self.max_bytes and len(self._buf) > self.max_bytes:
+            del self._buf[self.max_bytes:]
+            self.truncated = True
+            return False
+        if self.stop_at and self.stop_at in bytes(self._buf[start:]).lower():
+            return False
+        return True
+
+
+class PoliteRetry(Retry):
+    """
+    Retry that reports every 429/503 to the host scheduler, so all threads
+    back off from the host rather than only the one that got the response.
+    Retry-After waits are capped at throttle.MAX_PAUSE.
+    Timeouts are not retried for hosts the circuit breaker tracks (see
+    host_health.retry_timeouts).
+    """
+
+    def get_retry_after(self, response):
+        seconds = super().get_retry_after(response)
+        return min(seconds, throttle.MAX_PAUSE) if seconds is not None else None
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None,
+                  _stacktrace=None):
+        if response is not None and response.status in THROTTLE_STATUSES and _pool is not None:
+            origin = f'{_pool.scheme}://{_pool.host}'
+            host_limiter.penalize(origin, self.get_retry_after(response))
+            metrics.incr('host_throttled_total', site=site_of(origin), status=response.status)
+        if error is not None and _pool is not None and host_health.classify(error) == 'timeout' \
+                and not host_health.retry_timeouts(f'{_pool.scheme}://{_pool.host}'):
+            raise MaxRetryError(_pool, url, error) from error
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def _retry_policy():
+    options = dict(
+        total=RETRIES,
+        connect=RETRIES,
+        read=RETRIES,
+        status=RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    try:
+        return PoliteRetry(backoff_jitter=BACKOFF_JITTER, **options)
+    except TypeError:
+        # urllib3 < 2 has no jitter support
+        return PoliteRetry(**options)
+
+
+def _build_session():
+    session = requests.Session()
+    session.headers.update(REQUEST_HEADERS)
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=_retry_policy(),
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session():
+    """Returns the shared keep-alive Session used by every scraper fetch."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session()
+        return _session
+
+
+def configure(pool_connections=None, pool_maxsize=None, retries=None,
+              backoff_factor=None, backoff_jitter=None, max_body_bytes=None):
+    """Overrides the session settings; the pooled session is rebuilt on next use."""
+    global POOL_CONNECTIONS, POOL_MAXSIZE, RETRIES, BACKOFF_FACTOR, BACKOFF_JITTER, _session
+    global MAX_BODY_BYTES
+    with _session_lock:
+        if max_body_bytes is not None:
+            MAX_BODY_BYTES = max_body_bytes or None
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if retries is not None:
+            RETRIES = retries
+        if backoff_factor is not None:
+            BACKOFF_FACTOR = backoff_factor
+        if backoff_jitter is not None:
+            BACKOFF_JITTER = backoff_jitter
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def _read_body(resp, html_only, max_bytes, stop_at):
+    """Reads a streamed response within the limits; see request()."""
+    content_type = resp.headers.get('Content-Type', '')
+    check = html_only and resp.ok
+    if check and media_type(content_type) not in HTML_CONTENT_TYPES + SNIFFED_CONTENT_TYPES:
+        # Declared as something else entirely (image, PDF, ...): don't download it
+        raise NotHTMLError(f"{resp.url}: not HTML ({content_type})", response=resp)
+    reader = BodyReader(max_bytes, stop_at)
+    for chunk in resp.iter_content(CHUNK_SIZE):
+        if check:
+            if not is_html(content_type, chunk):
+                raise NotHTMLError(f"{resp.url}: not HTML ({content_type or 'sniffed'})", response=resp)
+            check = False
+        if not reader.feed(chunk):
+            break
+    resp._content = reader.body
+    resp._content_consumed = True
+    resp.truncated = reader.truncated
+    return resp
+
+
+def record_response(method, url, resp, seconds, retries=0):
+    """Records timing, bytes, retries and HTTP errors of a response (both clients)."""
+    site = site_of(url)
+    metrics.observe('http_request_seconds', seconds, site=site, method=method.upper())
+    metrics.incr('http_bytes_total', len(resp.content or b''), site=site)
+    if retries:
+        metrics.incr('http_retries_total', retries, site=site)
+    if resp.status_code >= 400:
+        metrics.incr('http_errors_total', site=site, error=f'HTTP {resp.status_code}')
+
+
+def record_error(method, url, error, seconds):
+    """Records a request that failed with an exception (both clients)."""
+    site = site_of(url)
+    metrics.observe('http_request_seconds', seconds, site=site, method=method.upper())
+    metrics.incr('http_errors_total', site=site, error=type(error).__name__)
+
+
+def check_robots(url, timeout=None):
+    """
+    Raises RobotsDisallowedError if the site's robots.txt disallows url;
+    timeout (the request's) bounds a robots.txt fetch.
+    """
+    if not host_limiter.allowed(url, timeout):
+        metrics.incr('robots_blocked_total', site=site_of(url))
+        raise RobotsDisallowedError(f"{url}: disallowed by robots.txt")
+
+
+def _send(method, url, headers, html_only=False, max_bytes=None, stop_at=None, **kwargs):
+    health = host_health.get_tracker()
+    if health is not None:
+        # Known-dead or hanging host: fail now instead of waiting for the timeout
+        health.check(url)
+    check_robots(url, kwargs.get('timeout'))
+    queued = time.perf_counter()
+    with host_limiter.slot(url):
+        start = time.perf_counter()
+        metrics.observe('host_wait_seconds', start - queued, site=site_of(url))
+        try:
+            if method.upper() == 'HEAD':
+                resp = get_session().request(method, url, headers=headers, **kwargs)
+            else:
+                resp = get_session().request(method, url, headers=headers, stream=True, **kwargs)
+                try:
+                    _read_body(resp, html_only, max_bytes or MAX_BODY_BYTES, stop_at)
+                finally:
+                    # Also drops the connection if the body was not read to the end
+                    resp.close()
+        except requests.RequestException as e:
+            record_error(method, url, e, time.perf_counter() - start)
+            if health is not None:
+                health.record_failure(url, e)
+            raise
+        if health is not None:
+            health.record_success(url)
+        if resp.status_code not in THROTTLE_STATUSES:
+            host_limiter.record_success(url)
+        retry = getattr(resp.raw, 'retries', None)
+        retries = len(retry.history) if retry is not None else 0
+        record_response(method, url, resp, time.perf_counter() - start, retries)
+        return resp
+
+
+def request(method, url, headers=None, timeout=DEFAULT_TIMEOUT, html_only=False,
+            max_bytes=None, stop_at=None, revalidate=False, **kwargs):
+    """
+    Sends a request through the on-disk cache and the shared pooled session.
+    headers are merged over REQUEST_HEADERS by the session. Query params are
+    folded into the URL so they are part of the cache key.
+    Bodies are streamed and read up to max_bytes (MAX_BODY_BYTES by default;
+    resp.truncated tells whether it was cut), or until stop_at has been read.
+    With html_only, a successful response that is not HTML raises NotHTMLError
+    as soon as its headers or first chunk show it.
+    revalidate: check a fresh cache entry with a conditional request instead
+    of serving it as is.
+    """
+    params = kwargs.pop('params', None)
+    if params:
+        url = requests.Request(method, url, params=params).prepare().url
+    resp = http_cache.cached_request(_send, method, url, headers=headers, revalidate=revalidate,
+                                     timeout=timeout, html_only=html_only, max_bytes=max_bytes,
+                                     stop_at=stop_at, **kwargs)
+    if html_only and resp.from_cache and resp.ok \
+            and not is_html(resp.headers.get('Content-Type'), resp.content):
+        raise NotHTMLError(f"{url}: not HTML ({resp.headers.get('Content-Type')})", response=resp)
+    return resp
+
+
+def get(url, headers=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """Pooled, cached equivalent of requests.get()."""
+    return request('GET', url, headers=headers, timeout=timeout, **kwargs)
+
+
+def head(url, headers=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """Pooled, cached equivalent of requests.head()."""
+    kwargs.setdefault('allow_redirects', False)
+    return request('HEAD', url, headers=headers, timeout=timeout, **kwargs)
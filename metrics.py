@@ -0,0 +1,177 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from throttle import host_of
+
+# Prefix of every metric name in the Prometheus text export
+PROMETHEUS_PREFIX = 'scrapecontacts_'
+
+
+def site_of(url):
+    """Coarse label for where a request went: 'ballotpedia' or 'campaign'."""
+    host = host_of(url)
+    if host == 'ballotpedia.org' or host.endswith('.ballotpedia.org'):
+        return 'ballotpedia'
+    return 'campaign'
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+class JSONLSink:
+    """Appends every metrics event to a JSON lines file as it happens."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __call__(self, event):
+        with self._lock:
+            self._file.write(json.dumps(event) + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and timers for the scraping pipeline:
+      - incr(name, value=1, **labels):    counters (bytes downloaded, cache hits, errors...)
+      - observe(name, seconds, **labels): durations; timer() times a with-block
+    Every update is also passed to the registered sinks as an event dict
+    {'ts', 'type', 'name', 'labels', 'value'}, e.g. a JSONLSink.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}  # key -> [count, total seconds, max seconds]
+        self._sinks = []
+
+    def add_sink(self, sink):
+        """Registers a callable that receives every event."""
+        with self._lock:
+            self._sinks.append(sink)
+
+    def remove_sink(self, sink):
+        with self._lock:
+            self._sinks.remove(sink)
+
+    def _emit(self, kind, name, labels, value):
+        if not self._sinks:
+            return
+        event = {'ts': time.time(), 'type': kind, 'name': name, 'labels': labels, 'value': value}
+        for sink in list(self._sinks):
+            try:
+                sink(event)
+            except Exception:
+                # A broken sink must never fail a scrape
+                pass
+
+    def incr(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._emit('counter', name, labels, value)
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            stats = self._timers.setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+        self._emit('timer', name, labels, seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Times the with-block (also when it raises) as observe(name, ...)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def snapshot(self):
+        """Current values as a list of dicts, one per counter or timer series."""
+        with self._lock:
+            counters = list(self._counters.items())
+            timers = [(key, list(stats)) for key, stats in self._timers.items()]
+        rows = [{'type': 'counter', 'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(counters)]
+        rows += [{'type': 'timer', 'name': name, 'labels': dict(labels),
+                  'count': count, 'sum': total, 'max': peak}
+                 for (name, labels), (count, total, peak) in sorted(timers)]
+        return rows
+
+    def write_jsonl(self, path):
+        """Writes snapshot() as JSON lines."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for row in self.snapshot():
+                f.write(json.dumps(row) + '\n')
+
+    def to_prometheus(self):
+        """Prometheus text exposition format: counters, and timers as summaries."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timers = sorted((key, list(stats)) for key, stats in self._timers.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = PROMETHEUS_PREFIX + name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{_label_text(labels)} {value}')
+        for (name, labels), (count, total, _) in timers:
+            metric = PROMETHEUS_PREFIX + name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} summary')
+            lines.append(f'{metric}_count{_label_text(labels)} {count}')
+            lines.append(f'{metric}_sum{_label_text(labels)} {total:.6f}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+
+    def summary(self):
+        """Human-readable report: timers by total time, then counters."""
+        rows = self.snapshot()
+        timers = sorted((r for r in rows if r['type'] == 'timer'), key=lambda r: -r['sum'])
+        counters = [r for r in rows if r['type'] == 'counter']
+        lines = []
+        if timers:
+            lines.append(f"{'timer':<64}{'count':>8}{'total s':>10}{'mean ms':>10}{'max ms':>10}")
+            for r in timers:
+                label = r['name'] + _label_text(tuple(r['labels'].items()))
+                lines.append(f"{label:<64}{r['count']:>8}{r['sum']:>10.2f}"
+                             f"{r['sum'] / r['count'] * 1000:>10.1f}{r['max'] * 1000:>10.1f}")
+        if counters:
+            lines.append(f"{'counter':<64}{'value':>8}")
+            for r in counters:
+                label = r['name'] + _label_text(tuple(r['labels'].items()))
+                lines.append(f"{label:<64}{r['value']:>8}")
+        return '\n'.join(lines)
+
+
+# Shared registry used by every module
+metrics = Metrics()
@@ -0,0 +1,63 @@
+import re
+import unicodedata
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+# Nicknames in quotes or parentheses: Robert "Bob" Smith, Robert (Bob) Smith
+_NICKNAME = re.compile(r'["“”][^"“”]*["“”]|\([^)]*\)')
+# Hyphens and slashes separate name parts: Ocasio-Cortez matches Ocasio Cortez
+_SEPARATORS = re.compile(r'[-‐‑–—/]')
+
+# Name suffixes dropped from lookup keys
+SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv', 'v', 'md', 'phd', 'esq'}
+
+# Common nicknames -> the given name Ballotpedia titles usually use
+NICKNAMES = {
+    'abby': 'abigail', 'al': 'albert', 'alex': 'alexander', 'andy': 'andrew',
+    'barb': 'barbara', 'ben': 'benjamin', 'bill': 'william', 'billy': 'william',
+    'bob': 'robert', 'bobby': 'robert', 'cathy': 'catherine', 'chris': 'christopher',
+    'chuck': 'charles', 'dan': 'daniel', 'danny': 'daniel', 'dave': 'david',
+    'deb': 'deborah', 'debbie': 'deborah', 'dick': 'richard', 'don': 'donald',
+    'doug': 'douglas', 'ed': 'edward', 'eddie': 'edward', 'fred': 'frederick',
+    'greg': 'gregory', 'jack': 'john', 'jake': 'jacob', 'jeff': 'jeffrey',
+    'jen': 'jennifer', 'jenny': 'jennifer', 'jerry': 'gerald', 'jim': 'james',
+    'jimmy': 'james', 'joe': 'joseph', 'joey': 'joseph', 'jon': 'jonathan',
+    'kate': 'katherine', 'kathy': 'katherine', 'ken': 'kenneth', 'larry': 'lawrence',
+    'liz': 'elizabeth', 'beth': 'elizabeth', 'matt': 'matthew', 'mike': 'michael',
+    'nick': 'nicholas', 'pat': 'patrick', 'peggy': 'margaret', 'pete': 'peter',
+    'phil': 'philip', 'rich': 'richard', 'rick': 'richard', 'rob': 'robert',
+    'ron': 'ronald', 'sam': 'samuel', 'steve': 'steven', 'sue': 'susan',
+    'ted': 'edward', 'tim': 'timothy', 'tom': 'thomas', 'tony': 'anthony',
+    'vicky': 'victoria', 'will': 'william',
+}
+
+
+def normalize_name(name):
+    """
+    Lookup key for a candidate name: accents stripped, case-folded,
+    punctuation dropped and whitespace collapsed, so "José  O'Neil" and
+    "jose oneil" share a key.
+    """
+    decomposed = unicodedata.normalize('NFKD', name)
+    plain = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(_NON_WORD.sub('', plain.casefold()).split())
+
+
+def name_keys(name):
+    """
+    Keys for matching a name against page titles, strictest first:
+      - full:        every part, without quoted or parenthesized nicknames:
+                     'robert a smith jr'
+      - first_last:  first and last part only (middle names, initials and
+                     suffixes dropped): 'robert smith'
+      - canonical:   first_last with a nickname first name expanded:
+                     'bob smith' -> 'robert smith'
+    Returns a tuple of the three (fewer than two parts: all the same).
+    """
+    name = _SEPARATORS.sub(' ', _NICKNAME.sub(' ', name))
+    full = normalize_name(name)
+    parts = [p for p in full.split() if p not in SUFFIXES]
+    if len(parts) < 2:
+        return full, full, full
+    first, last = parts[0], parts[-1]
+    return full, f'{first} {last}', f'{NICKNAMES.get(first, first)} {last}'
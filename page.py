@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+
+from bs4 import BeautifulSoup
+
+import fastparse
+import http_client
+from metrics import metrics
+
+# Parser used for anchors/text/addresses/infobox rows:
+#   'bs4'  - BeautifulSoup tree (html.parser)
+#   'fast' - single streaming pass, no tree (fastparse.py)
+PARSER_BACKENDS = ('bs4', 'fast')
+PARSER_BACKEND = os.getenv('SCRAPE_PARSER', 'bs4')
+
+
+class Page:
+    """
+    A fetched HTML document, downloaded and parsed once and shared by every
+    extractor that needs it:
+      - response:     the requests.Response (None when built from raw HTML)
+      - soup:         BeautifulSoup tree, parsed on first access
+      - anchors:      list of every <a href> value, in document order
+      - text:         visible text, one stripped string per line
+      - addresses:    text of each <address> element
+      - infobox_rows: rows of the first 'infobox' table (see fastparse.extract), or None
+    The last four come from the selected parser backend; with 'fast' no
+    BeautifulSoup tree is built unless .soup itself is used.
+    """
+
+    def __init__(self, url, html, response=None, parser=None):
+        self.url = url
+        self.html = html
+        self.response = response
+        self.parser = parser or PARSER_BACKEND
+        if self.parser not in PARSER_BACKENDS:
+            raise ValueError(f"Unknown parser backend {self.parser!r}; expected one of {PARSER_BACKENDS}")
+        self._soup = None
+        self._extracted = None
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            self._soup = BeautifulSoup(self.html, 'html.parser')
+        return self._soup
+
+    def _extract(self):
+        if self._extracted is None:
+            with metrics.timer('parse_seconds', parser=self.parser):
+                if self.parser == 'fast':
+                    self._extracted = fastparse.extract(self.html)
+                else:
+                    self._extracted = _extract_soup(self.soup)
+        return self._extracted
+
+    @property
+    def anchors(self):
+        return self._extract()['anchors']
+
+    @property
+    def text(self):
+        return self._extract()['text']
+
+    @property
+    def addresses(self):
+        return self._extract()['addresses']
+
+    @property
+    def infobox_rows(self):
+        return self._extract()['infobox_rows']
+
+    def __repr__(self):
+        return f"Page({self.url!r})"
+
+
+def content_hash(page):
+    """
+    Hash of the parts of a page the extractors actually read (links and
+    infobox rows), so cosmetic changes elsewhere don't force a re-scrape.
+    """
+    digest = hashlib.sha256()
+    digest.update('\n'.join(page.anchors).encode('utf-8'))
+    digest.update(json.dumps(page.infobox_rows, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _extract_soup(soup):
+    """BeautifulSoup equivalent of fastparse.extract()."""
+    infobox_rows = None
+    box = soup.find('table', class_='infobox')
+    if box:
+        infobox_rows = []
+        for row in box.find_all('tr'):
+            th = row.find('th')
+            td = row.find('td')
+            infobox_rows.append({
+                'th': th.get_text(strip=True) if th else None,
+                'td_links': [a['href'] for a in td.find_all('a', href=True)] if td else None,
+                'links': [a['href'] for a in row.find_all('a', href=True)],
+            })
+    return {
+        'anchors': [a['href'] for a in soup.find_all('a', href=True)],
+        'text': soup.get_text(separator='\n', strip=True),
+        'addresses': [tag.get_text(separator=' ', strip=True) for tag in soup.find_all('address')],
+        'infobox_rows': infobox_rows,
+    }
+
+
+def fetch_html(url, headers=None, timeout=10, max_bytes=None, revalidate=False):
+    """
+    Downloads an HTML document and returns the requests.Response. Raises
+    requests.RequestException on failure, including http_client.NotHTMLError
+    for images, PDFs and other non-HTML.
+    The download stops after </body> or max_bytes (http_client.MAX_BODY_BYTES).
+    revalidate: see http_client.request.
+    """
+    resp = http_client.get(url, headers=headers, timeout=timeout, html_only=True,
+                           max_bytes=max_bytes, stop_at=http_client.HTML_END_MARKER,
+                           revalidate=revalidate)
+    resp.raise_for_status()
+    return resp
+
+
+def fetch_page(url, headers=None, timeout=10, parser=None, max_bytes=None, revalidate=False):
+    """Downloads url (see fetch_html) and returns a Page."""
+    resp = fetch_html(url, headers=headers, timeout=timeout, max_bytes=max_bytes,
+                      revalidate=revalidate)
+    return Page(url, resp.text, resp, parser=parser)
+
+
+def as_page(source, headers=None, timeout=10):
+    """Returns source unchanged if it is already a Page, otherwise fetches it as a URL."""
+    if isinstance(source, Page):
+        return source
+    return fetch_page(source, headers=headers, timeout=timeout)
@@ -0,0 +1,156 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+import contact_info
+import http_cache
+import page
+import socialmedia
+from metrics import metrics
+
+# Worker processes for parsing/extraction (0: one per CPU)
+PARSE_PROCESSES = int(os.getenv('SCRAPE_PARSE_PROCESSES', 0))
+
+
+def _page(url, body, encoding, parser):
+    # Same decoding as requests (falls back to charset detection when encoding is None)
+    html = http_cache.build_response(url, 200, {}, body, encoding).text
+    return page.Page(url, html, parser=parser)
+
+
+def _timed(task, *args):
+    start = time.process_time()
+    result = task(*args)
+    return result, time.process_time() - start
+
+
+def _staged(stages, stage, func, *args):
+    """func(*args), adding its wall time to stages[stage] (for the stage_seconds metric)."""
+    start = time.perf_counter()
+    result = func(*args)
+    stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - start
+    return result
+
+
+# Tasks run in the worker processes: raw bytes in, small picklable results out
+# (with the time each stage took, reported by the parent like the in-process stages)
+
+def ballotpedia_task(url, body, encoding, parser, candidate_name):
+    bp_page = _page(url, body, encoding, parser)
+    stages = {}
+    campaign_site = _staged(stages, 'find_campaign_site', socialmedia.find_campaign_site,
+                            bp_page, candidate_name)
+    socials = _staged(stages, 'extract_social_links', socialmedia.extract_social_links, bp_page)
+    return campaign_site, socials, page.content_hash(bp_page), stages
+
+
+def social_links_task(url, body, encoding, parser):
+    campaign_page = _page(url, body, encoding, parser)
+    stages = {}
+    socials = _staged(stages, 'extract_social_links', socialmedia.extract_social_links,
+                      campaign_page)
+    return socials, page.content_hash(campaign_page), stages
+
+
+def contact_page_task(url, body, encoding, parser):
+    contact_page = _page(url, body, encoding, parser)
+    return contact_info.page_contact_info(contact_page), contact_page.anchors
+
+
+class ParsePool:
+    """
+    Runs the CPU-bound half of the pipeline (HTML parsing, link matching and
+    contact regex scans) in worker processes, so it no longer competes with
+    the fetching threads for the GIL.
+      - fetching stays in the caller's threads; only response bytes are sent over
+      - at most max_pending tasks are queued; submit() blocks beyond that,
+        which holds back the fetchers when parsing can't keep up
+    Use as a context manager, or call close().
+    """
+
+    def __init__(self, processes=None, max_pending=None, parser=None):
+        self.processes = processes or PARSE_PROCESSES or os.cpu_count() or 1
+        self.parser = parser or page.PARSER_BACKEND
+        # Spawned, not forked: workers start at the first submit(), from a fetch
+        # thread, and a fork could copy a lock (metrics, host limiter) another
+        # thread holds at that moment, deadlocking the child
+        self._executor = ProcessPoolExecutor(self.processes,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * self.processes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, task, *args):
+        """Queues task(*args) on a worker; blocks while the queue is full."""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(_timed, task, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, task, *args):
+        """submit() and wait for the result."""
+        result, cpu = self.submit(task, *args).result()
+        metrics.observe('parse_task_seconds', cpu, task=task.__name__, parser=self.parser)
+        return result
+
+    def _run_on(self, task, url, resp, *args):
+        return self.run(task, url, resp.content, resp.encoding, self.parser, *args)
+
+    @staticmethod
+    def _observe_stages(stages):
+        for stage, seconds in stages.items():
+            metrics.observe('stage_seconds', seconds, stage=stage)
+
+    def extract_candidate(self, bp_url, candidate_name, hashes=None):
+        """
+        Pooled equivalent of the extraction steps of socialmedia.get_candidate_socials
+        (hashes included). Returns (campaign_site, socials_bp, socials_cam).
+        """
+        try:
+            with metrics.timer('stage_seconds', stage='fetch_ballotpedia'):
+                bp_resp = page.fetch_html(bp_url)
+        except requests.RequestException:
+            return None, {}, {}
+        campaign_site, socials_bp, bp_hash, stages = self._run_on(
+            ballotpedia_task, bp_url, bp_resp, candidate_name)
+        self._observe_stages(stages)
+        if hashes is not None:
+            hashes['ballotpedia'] = bp_hash
+        socials_cam = {}
+        if campaign_site:
+            try:
+                with metrics.timer('stage_seconds', stage='fetch_campaign'):
+                    campaign_resp = page.fetch_html(campaign_site)
+            except requests.RequestException:
+                pass
+            else:
+                socials_cam, campaign_hash, stages = self._run_on(social_links_task, campaign_site,
+                                                                  campaign_resp)
+                self._observe_stages(stages)
+                if hashes is not None:
+                    hashes['campaign'] = campaign_hash
+        return campaign_site, socials_bp, socials_cam
+
+    def fetch_contact_page(self, url):
+        """
+        Fetches url in the calling thread and scans it in a worker; returns the
+        keyword arguments of ContactCrawl.add_extracted (minus url and depth).
+        """
+        resp = page.fetch_html(url)
+        info, anchors = self._run_on(contact_page_task, url, resp)
+        return {'info': info, 'anchors': anchors, 'size': len(resp.content), 'final_url': resp.url}
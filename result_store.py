@@ -0,0 +1,271 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+import http_cache
+from contact_info import normalize_email, normalize_phone
+from names import normalize_name
+from socials import social_handle
+from throttle import host_of
+
+# Default store shared by the batch CLI and the apps (SCRAPE_RESULT_STORE='' disables it;
+# unset, it is results.sqlite in http_cache.CACHE_DIR)
+STORE_PATH = os.getenv('SCRAPE_RESULT_STORE')
+
+# Hosts serving many unrelated sites under their own paths: how many leading
+# path segments name one site there
+SHARED_HOSTS = {
+    'sites.google.com': 2,    # /view/<site> or /site/<site>
+    'linktr.ee': 1,
+    'facebook.com': 1,
+    'secure.actblue.com': 2,  # /donate/<page>
+    'secure.winred.com': 1,
+}
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS candidates ('
+    ' name_key TEXT PRIMARY KEY, name TEXT, bp_url TEXT, campaign_site TEXT,'
+    ' campaign_domain TEXT, updated REAL, result TEXT)',
+    'CREATE TABLE IF NOT EXISTS socials ('
+    ' name_key TEXT, platform TEXT, handle TEXT, url TEXT, PRIMARY KEY (name_key, platform))',
+    'CREATE TABLE IF NOT EXISTS contacts ('
+    ' domain TEXT PRIMARY KEY, url TEXT, updated REAL, result TEXT)',
+    'CREATE TABLE IF NOT EXISTS contact_values ('
+    ' domain TEXT, kind TEXT, value TEXT, PRIMARY KEY (domain, kind, value))',
+    'CREATE INDEX IF NOT EXISTS candidates_bp_url ON candidates (bp_url)',
+    'CREATE INDEX IF NOT EXISTS candidates_campaign_domain ON candidates (campaign_domain)',
+    'CREATE INDEX IF NOT EXISTS socials_handle ON socials (handle)',
+    'CREATE INDEX IF NOT EXISTS contact_values_value ON contact_values (kind, value)',
+)
+
+
+def site_key(site):
+    """
+    Key of the campaign site at site (a URL or bare domain): its host_of, plus
+    the path segments naming the site on a SHARED_HOSTS host, e.g.
+    'sites.google.com/view/janedoe', so unrelated sites there aren't merged.
+    """
+    url = site if '//' in site else '//' + site
+    host = host_of(url)
+    segments = SHARED_HOSTS.get(host)
+    if not segments:
+        return host
+    path = [part for part in urlsplit(url).path.lower().split('/') if part]
+    return '/'.join([host] + path[:segments])
+
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+class ResultStore:
+    """
+    Scraped results kept in SQLite so later jobs can query them instead of
+    re-scraping:
+      - candidates: get_candidate_socials results, keyed by normalized name
+        and indexed by Ballotpedia URL and campaign site (site_key)
+      - socials: one row per candidate and platform, indexed by the
+        normalized handle (socials.social_handle)
+      - contacts: extract_contact_info results per campaign site, with
+        each phone and email indexed
+    Writes replace the previous result for the same candidate or site, so
+    recording the same result twice is harmless.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            for statement in _SCHEMA:
+                self._db.execute(statement)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _candidates(self, where, args):
+        with self._lock:
+            rows = self._db.execute(
+                f'SELECT result FROM candidates WHERE {where} ORDER BY name', args
+            ).fetchall()
+        return [json.loads(result) for result, in rows]
+
+    # Writes
+
+    def record_candidate(self, result):
+        """
+        Stores a batch result ({'name', 'ballotpedia_url', 'campaign_site',
+        'social_links', ...}). Results with errors are skipped so they don't
+        overwrite an earlier good one.
+        """
+        if result.get('error'):
+            return
+        # Incremental-run status describes this run, not the candidate
+        result = {k: v for k, v in result.items() if k != 'status'}
+        key = normalize_name(result['name'])
+        campaign_site = result.get('campaign_site')
+        socials = [(key, platform, social_handle(url), url)
+                   for platform, url in (result.get('social_links') or {}).items()]
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO candidates VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, result['name'], result.get('ballotpedia_url'), campaign_site,
+                 site_key(campaign_site) if campaign_site else None, time.time(), json.dumps(result))
+            )
+            self._db.execute('DELETE FROM socials WHERE name_key = ?', (key,))
+            self._db.executemany('INSERT INTO socials VALUES (?, ?, ?, ?)', socials)
+
+    def record_contacts(self, url, info):
+        """Stores an extract_contact_info result for the campaign site at url."""
+        domain = site_key(url)
+        values = {(domain, kind, value) for kind in ('phones', 'emails') for value in info[kind]}
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO contacts VALUES (?, ?, ?, ?)',
+                             (domain, url, time.time(), json.dumps(info)))
+            self._db.execute('DELETE FROM contact_values WHERE domain = ?', (domain,))
+            self._db.executemany('INSERT INTO contact_values VALUES (?, ?, ?)', values)
+
+    # Lookups
+
+    def candidate(self, name):
+        """Stored result for name (any spelling with the same normalize_name), or None."""
+        found = self._candidates('name_key = ?', (normalize_name(name),))
+        return found[0] if found else None
+
+    def by_ballotpedia_url(self, url):
+        return self._candidates('bp_url = ?', (url,))
+
+    def by_campaign_domain(self, site):
+        """
+        Candidates whose campaign site is on site's domain (a URL or bare
+        domain), or is the same site on a SHARED_HOSTS host.
+        """
+        return self._candidates('campaign_domain = ?', (site_key(site),))
+
+    def by_social(self, url):
+        """Candidates linking to the same profile as url, e.g. a shared Facebook page."""
+        return self._candidates(
+            'name_key IN (SELECT name_key FROM socials WHERE handle = ?)', (social_handle(url),)
+        )
+
+    def missing_campaign_site(self):
+        return self._candidates('campaign_site IS NULL', ())
+
+    def missing_platform(self, platform):
+        """Candidates with no link for platform (e.g. 'Facebook')."""
+        return self._candidates(
+            'name_key NOT IN (SELECT name_key FROM socials WHERE platform = ?)', (platform,)
+        )
+
+    def shared_socials(self):
+        """{handle: [names]} for every profile linked by more than one candidate."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT s.handle, c.name FROM socials s JOIN candidates c USING (name_key)'
+                ' WHERE s.handle IN (SELECT handle FROM socials WHERE handle IS NOT NULL'
+                '  GROUP BY handle HAVING COUNT(*) > 1)'
+                ' ORDER BY s.handle, c.name'
+            ).fetchall()
+        shared = {}
+        for handle, name in rows:
+            shared.setdefault(handle, []).append(name)
+        return shared
+
+    def contacts(self, site):
+        """Stored contact info for site's campaign site (site_key), or None."""
+        with self._lock:
+            row = self._db.execute('SELECT result FROM contacts WHERE domain = ?',
+                                   (site_key(site),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def by_contact(self, value):
+        """Candidates whose campaign site lists this phone or email (any formatting)."""
+        value = normalize_email(value) if '@' in value else normalize_phone(value)
+        with self._lock:
+            domains = [d for d, in self._db.execute(
+                'SELECT domain FROM contact_values WHERE kind IN (?, ?) AND value = ?',
+                ('phones', 'emails', value)
+            )]
+        if not domains:
+            return []
+        return self._candidates(f'campaign_domain IN ({_placeholders(domains)})', domains)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def configure(path=None):
+    """Overrides the default store path ('' disables the shared store)."""
+    global STORE_PATH, _store
+    with _store_lock:
+        if path is not None:
+            STORE_PATH = path
+        _store = None
+
+
+def store_path():
+    """Path of the shared store ('' when disabled)."""
+    return http_cache.cache_path('results.sqlite', STORE_PATH)
+
+
+def get_store():
+    """Returns the shared ResultStore at store_path(), or None when disabled."""
+    global _store
+    with _store_lock:
+        path = store_path()
+        if not path:
+            return None
+        if _store is None:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            _store = ResultStore(path)
+        return _store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query stored scraping results (no network).')
+    parser.add_argument('--store', default=store_path(), help=f'SQLite store (default: {store_path()})')
+    query = parser.add_mutually_exclusive_group(required=True)
+    query.add_argument('--name', help='result for a candidate name')
+    query.add_argument('--ballotpedia-url', help='candidates with this Ballotpedia page')
+    query.add_argument('--domain', help='candidates whose campaign site is on this domain '
+                                        '(give the site URL on hosts like sites.google.com)')
+    query.add_argument('--social', metavar='URL', help='candidates linking to this profile')
+    query.add_argument('--contact', metavar='VALUE',
+                       help='candidates whose campaign site lists this phone or email')
+    query.add_argument('--missing-campaign-site', action='store_true',
+                       help='candidates without a campaign site')
+    query.add_argument('--missing-platform', metavar='PLATFORM',
+                       help='candidates without a link for PLATFORM (e.g. Facebook)')
+    query.add_argument('--shared-socials', action='store_true',
+                       help='profiles linked by more than one candidate')
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.store)
+    if args.shared_socials:
+        rows = [{'handle': h, 'names': names} for h, names in store.shared_socials().items()]
+    elif args.name:
+        rows = [r for r in (store.candidate(args.name),) if r]
+    elif args.ballotpedia_url:
+        rows = store.by_ballotpedia_url(args.ballotpedia_url)
+    elif args.domain:
+        rows = store.by_campaign_domain(args.domain)
+    elif args.social:
+        rows = store.by_social(args.social)
+    elif args.contact:
+        rows = store.by_contact(args.contact)
+    elif args.missing_campaign_site:
+        rows = store.missing_campaign_site()
+    else:
+        rows = store.missing_platform(args.missing_platform)
+    for row in rows:
+        print(json.dumps(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import json
+import sqlite3
+import threading
+import time
+
+import requests
+
+from page import content_hash, fetch_page
+
+
+def url_hash(url):
+    """
+    content_hash of the page at url, or None if it can't be fetched. Always
+    asks the server (a conditional request when the page is in the HTTP
+    cache), since a fresh cache entry says nothing about a change since.
+    """
+    if not url:
+        return None
+    try:
+        return content_hash(fetch_page(url, revalidate=True))
+    except requests.RequestException:
+        return None
+
+
+class RunState:
+    """
+    Per-candidate state persisted between roster runs (SQLite):
+    Ballotpedia URL, campaign site, content hashes of both pages, when the
+    candidate was last checked and the last result.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS candidates ('
+                ' name TEXT PRIMARY KEY, bp_url TEXT, campaign_site TEXT,'
+                ' bp_hash TEXT, campaign_hash TEXT, last_checked REAL, result TEXT)'
+            )
+
+    def get(self, name):
+        """Returns the stored record for name as a dict, or None."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT bp_url, campaign_site, bp_hash, campaign_hash, last_checked, result'
+                ' FROM candidates WHERE name = ?', (name,)
+            ).fetchone()
+        if row is None:
+            return None
+        bp_url, campaign_site, bp_hash, campaign_hash, last_checked, result = row
+        return {
+            'bp_url': bp_url, 'campaign_site': campaign_site, 'bp_hash': bp_hash,
+            'campaign_hash': campaign_hash, 'last_checked': last_checked,
+            'result': json.loads(result),
+        }
+
+    def record(self, name, result, hashes):
+        """
+        Stores a freshly scraped result. hashes holds the content_hash of the
+        pages the scrape parsed ({'ballotpedia': ..., 'campaign': ...}, see
+        candidate_socials); a page missing from it is stored unhashed, so the
+        candidate is re-scraped next run.
+        Results with errors are not stored, so the candidate is retried next run.
+        """
+        if result.get('error'):
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO candidates VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (name, result.get('ballotpedia_url'), result.get('campaign_site'),
+                 hashes.get('ballotpedia'), hashes.get('campaign'),
+                 time.time(), json.dumps(result))
+            )
+
+    def _touch(self, name):
+        with self._lock, self._db:
+            self._db.execute('UPDATE candidates SET last_checked = ? WHERE name = ?',
+                             (time.time(), name))
+
+    def reuse(self, name, max_age=None):
+        """
+        Returns the stored result for name if it can be reused, else None:
+          - status 'fresh':     checked less than max_age seconds ago, no network
+          - status 'unchanged': Ballotpedia page and campaign site still hash the
+                                same (conditional requests keep this cheap)
+        """
+        record = self.get(name)
+        if record is None:
+            return None
+        if max_age is not None and time.time() - record['last_checked'] < max_age:
+            return {**record['result'], 'status': 'fresh'}
+        if not record['bp_url'] or record['bp_hash'] is None:
+            return None
+        if url_hash(record['bp_url']) != record['bp_hash']:
+            return None
+        if record['campaign_site'] and url_hash(record['campaign_site']) != record['campaign_hash']:
+            return None
+        self._touch(name)
+        return {**record['result'], 'status': 'unchanged'}
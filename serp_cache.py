@@ -0,0 +1,214 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from serpapi import GoogleSearch
+
+import http_cache
+from metrics import metrics
+
+# SerpAPI cache/limit settings (overridable via environment or configure())
+SERP_CACHE_PATH = os.getenv('SCRAPE_SERP_CACHE')  # default: serpapi.sqlite in http_cache.CACHE_DIR
+SERP_CACHE_TTL = int(os.getenv('SCRAPE_SERP_CACHE_TTL', 30 * 24 * 3600))
+SERP_BUDGET = int(os.getenv('SCRAPE_SERP_BUDGET', 0)) or None       # max paid calls per process
+SERP_MIN_INTERVAL = float(os.getenv('SCRAPE_SERP_MIN_INTERVAL', 0))  # seconds between calls
+
+# Request parameters that don't change the answer (never part of the cache key)
+IGNORED_PARAMS = ('api_key',)
+
+# SerpAPI reports an empty result page as an error; that is still a valid answer
+NO_RESULTS_ERROR = "hasn't returned any results"
+
+
+class SerpBudgetExceeded(Exception):
+    """Raised when a search would exceed the configured SerpAPI call budget."""
+
+
+def query_key(params):
+    """Canonical cache key for a set of search parameters."""
+    kept = {k: v for k, v in params.items() if k not in IGNORED_PARAMS}
+    return json.dumps(kept, sort_keys=True, separators=(',', ':'))
+
+
+class SerpClient:
+    """
+    Memoizing front for SerpAPI searches:
+      - results persist in SQLite for ttl seconds, so re-runs repeat no paid queries
+      - concurrent lookups of the same query share one in-flight call
+      - at most `budget` calls are made (SerpBudgetExceeded afterwards), spaced
+        at least `min_interval` seconds apart
+    search_cls is the search client class (GoogleSearch by default); any class
+    taking params and exposing get_dict() can stand in, e.g. a local fake.
+    """
+
+    def __init__(self, path, ttl=SERP_CACHE_TTL, budget=SERP_BUDGET,
+                 min_interval=SERP_MIN_INTERVAL, search_cls=GoogleSearch):
+        self.ttl = ttl
+        self.budget = budget
+        self.min_interval = min_interval
+        self.search_cls = search_cls
+        self.calls_made = 0
+        self._lock = threading.Lock()
+        self._rate_lock = threading.Lock()
+        self._last_call = 0.0
+        self._inflight = {}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS searches ('
+                ' query TEXT PRIMARY KEY, result TEXT, stored_at REAL)'
+            )
+
+    def cached(self, params):
+        """Returns the stored result for params if still fresh, else None."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT result, stored_at FROM searches WHERE query = ?', (query_key(params),)
+            ).fetchone()
+        if row is None or time.time() - row[1] >= self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def _store(self, params, result):
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO searches VALUES (?, ?, ?)',
+                (query_key(params), json.dumps(result), time.time())
+            )
+
+    def _acquire_call(self):
+        with self._rate_lock:
+            if self.budget is not None and self.calls_made >= self.budget:
+                raise SerpBudgetExceeded(f"SerpAPI budget of {self.budget} calls used up")
+            wait = self._last_call + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_call = time.monotonic()
+            self.calls_made += 1
+
+    def search(self, params):
+        """Equivalent of GoogleSearch(params).get_dict(), served from cache when possible."""
+        result = self.cached(params)
+        if result is not None:
+            metrics.incr('serpapi_total', result='cached')
+            return result
+
+        key = query_key(params)
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            metrics.incr('serpapi_total', result='shared')
+            return future.result()
+
+        try:
+            # Another caller may have stored it between our lookup and taking ownership
+            result = self.cached(params)
+            if result is None:
+                try:
+                    self._acquire_call()
+                except SerpBudgetExceeded:
+                    metrics.incr('serpapi_total', result='over_budget')
+                    raise
+                metrics.incr('serpapi_total', result='call')
+                try:
+                    with metrics.timer('serpapi_seconds'):
+                        result = self.search_cls(params).get_dict()
+                except Exception as e:
+                    metrics.incr('serpapi_errors_total', error=type(e).__name__)
+                    raise
+                error = result.get('error')
+                if not error or NO_RESULTS_ERROR in error:
+                    self._store(params, result)
+                else:
+                    metrics.incr('serpapi_errors_total', error='api_error')
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+class FakeSearch:
+    """
+    Local stand-in for GoogleSearch, for tests and offline runs: pass it (or
+    a class from serving()) as search_cls. Answers q from `results`
+    ({query: [result links]}), paged by start/num like Google, without
+    network access or an API key; unknown queries get SerpAPI's "no results"
+    error. Each call is recorded in `calls`, after sleeping `delay` seconds.
+    """
+
+    results = {}
+    delay = 0
+    calls = []
+
+    def __init__(self, params):
+        self.params = params
+
+    @classmethod
+    def serving(cls, results, delay=0):
+        """A FakeSearch class with its own results, delay and call log."""
+        return type(cls.__name__, (cls,), {'results': results, 'delay': delay, 'calls': []})
+
+    def get_dict(self):
+        self.calls.append(dict(self.params))
+        if self.delay:
+            time.sleep(self.delay)
+        start = int(self.params.get('start', 0))
+        links = self.results.get(self.params.get('q'), [])[start:start + int(self.params.get('num', 10))]
+        if not links:
+            return {'search_parameters': dict(self.params),
+                    'error': f"Google {NO_RESULTS_ERROR} for this query."}
+        return {
+            'search_metadata': {'status': 'Success'},
+            'search_parameters': dict(self.params),
+            'organic_results': [{'position': start + i + 1, 'link': link}
+                                for i, link in enumerate(links)],
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+_search_cls = GoogleSearch
+
+
+def configure(path=None, ttl=None, budget=None, min_interval=None, search_cls=None):
+    """Overrides the default client settings; takes effect on the next search."""
+    global SERP_CACHE_PATH, SERP_CACHE_TTL, SERP_BUDGET, SERP_MIN_INTERVAL, _client, _search_cls
+    with _client_lock:
+        if path is not None:
+            SERP_CACHE_PATH = path
+        if ttl is not None:
+            SERP_CACHE_TTL = ttl
+        if budget is not None:
+            SERP_BUDGET = budget or None
+        if min_interval is not None:
+            SERP_MIN_INTERVAL = min_interval
+        if search_cls is not None:
+            _search_cls = search_cls
+        _client = None
+
+
+def get_client():
+    """Returns the shared SerpClient."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            path = http_cache.cache_path('serpapi.sqlite', SERP_CACHE_PATH)
+            _client = SerpClient(path, SERP_CACHE_TTL, SERP_BUDGET, SERP_MIN_INTERVAL, _search_cls)
+        return _client
+
+
+def search(params):
+    """Cached, de-duplicated, budgeted SerpAPI search through the shared client."""
+    return get_client().search(params)
@@ -1,52 +1,48 @@
 import os
-import re
 import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
-from serpapi import GoogleSearch
-
-# Social media regex patterns
-SOCIAL_PATTERNS = {
-    'Twitter': r'(twitter\.com|x\.com)/',
-    'Facebook': r'facebook\.com/',
-    'Instagram': r'instagram\.com/',
-    'Youtube': r'youtube\.com/',
-    'Tiktok': r'tiktok\.com/',
-    'Linkedin': r'linkedin\.com/',
-    'Threads': r'threads\.net/',
-    'Bluesky': r'bsky\.app/',
-}
-
-# Domains to exclude when searching for campaign site
-SOCIAL_DOMAINS = [
-    'twitter.com', 'x.com', 'facebook.com', 'instagram.com',
-    'youtube.com', 'tiktok.com', 'linkedin.com', 'threads.net', 'bsky.app'
-]
-
-# Common request headers to mimic a browser
-REQUEST_HEADERS = {
-    'User-Agent': (
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-        'AppleWebKit/537.36 (KHTML, like Gecko) '
-        'Chrome/114.0.0.0 Safari/537.36'
-    )
-}
+import http_client
+import serp_cache
+import title_index
+from metrics import metrics
+from page import as_page, content_hash, fetch_page
+from socials import SOCIAL_PATTERNS, SOCIAL_DOMAINS, match_platforms, in_platform_order
+
+
+def ballotpedia_slug_url(candidate_name):
+    """Canonical guess for a candidate's page: https://ballotpedia.org/First_Last"""
+    slug = candidate_name.replace(' ', '_')
+    return f"https://ballotpedia.org/{slug}"
 
 
 def find_ballotpedia_url(candidate_name, max_pages=2):
     """
-    1) Try canonical URL: https://ballotpedia.org/First_Last
-    2) Fallback: SerpAPI search for Ballotpedia page
+    1) Look the name up in the local title index (no network)
+    2) Try canonical URL: https://ballotpedia.org/First_Last
+    3) If that page doesn't exist, a loose title index match (e.g. without
+       the middle initial)
+    4) Fallback: SerpAPI search for Ballotpedia page
     """
-    slug = candidate_name.replace(' ', '_')
-    url = f"https://ballotpedia.org/{slug}"
+    url = title_index.lookup_url(candidate_name)
+    if url:
+        return url
+    url = ballotpedia_slug_url(candidate_name)
     try:
-        resp = requests.head(url, headers=REQUEST_HEADERS, allow_redirects=True, timeout=5)
+        resp = http_client.head(url, allow_redirects=True, timeout=5)
         if resp.status_code < 400:
+            title_index.learn_url(url)
             return url
+        if resp.status_code in title_index.MISSING_STATUSES:
+            hint = title_index.hint_url(candidate_name)
+            if hint:
+                return hint
     except requests.RequestException:
         pass
+    return search_ballotpedia_url(candidate_name, max_pages)
 
+
+def search_ballotpedia_url(candidate_name, max_pages=2):
+    """SerpAPI search for the candidate's Ballotpedia page; returns the first hit or None."""
     query = f"{candidate_name} Ballotpedia site:ballotpedia.org"
     for page in range(max_pages):
         params = {
@@ -58,7 +54,10 @@ def find_ballotpedia_url(candidate_name, max_pages=2):
             'hl': 'en',
             'api_key': os.getenv('SERPAPI_API_KEY')
         }
-        results = GoogleSearch(params).get_dict().get('organic_results', [])
+        try:
+            results = serp_cache.search(params).get('organic_results', [])
+        except serp_cache.SerpBudgetExceeded:
+            return None
         for res in results:
             for field in ('link', 'url', 'unified_url', 'displayed_link'):
                 candidate_url = res.get(field)
@@ -73,40 +72,35 @@ def find_campaign_site(candidate_bp_url, candidate_name=None):
       1) Infobox 'Contact' section: first external link (non-gov)
       2) Infobox labels: 'campaign website', 'campaign site', 'official website' (non-gov)
       3) Fallback: external links preferring ones containing the candidate slug (non-gov)
+    candidate_bp_url may be a URL or an already fetched Page.
     """
     if not candidate_bp_url:
         return None
     try:
-        resp = requests.get(candidate_bp_url, headers=REQUEST_HEADERS, timeout=10)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        infobox = soup.find('table', class_='infobox')
-        if infobox:
+        page = as_page(candidate_bp_url)
+        rows = page.infobox_rows
+        if rows:
             # 1) Contact row
-            for row in infobox.find_all('tr'):
-                th = row.find('th')
-                td = row.find('td')
-                if th and td and 'contact' in th.get_text(strip=True).lower():
-                    for a in td.find_all('a', href=True):
-                        href = a['href']
+            for row in rows:
+                th, td_links = row['th'], row['td_links']
+                if th is not None and td_links is not None and 'contact' in th.lower():
+                    for href in td_links:
                         if (href.startswith('http') and
                                 'mailto:' not in href and
                                 'ballotpedia' not in href.lower() and
                                 '.gov' not in href.lower()):
                             return href
             # 2) Specific labels
-            for row in infobox.find_all('tr'):
-                th = row.find('th')
-                td = row.find('td')
-                if th and td:
-                    label = th.get_text(strip=True).lower()
+            for row in rows:
+                th, td_links = row['th'], row['td_links']
+                if th is not None and td_links is not None:
+                    label = th.lower()
                     if any(key in label for key in ('campaign website', 'campaign site', 'official website')):
-                        link_tag = td.find('a', href=True)
-                        href = link_tag['href'] if link_tag else ''
+                        href = td_links[0] if td_links else ''
                         if href.startswith('http') and '.gov' not in href.lower():
                             return href
         # 3) Fallback: any external, non-gov, non-social link
-        all_links = [a['href'] for a in soup.find_all('a', href=True)]
+        all_links = page.anchors
         external = [l for l in all_links
                     if (l.startswith('http') and
                         'ballotpedia' not in l.lower() and
@@ -126,51 +120,105 @@ def find_campaign_site(candidate_bp_url, candidate_name=None):
 
 
 def extract_social_links(url):
-    """Scrapes URL, returns social media links filtering out Ballotpedia hosts and .gov."""
+    """
+    Scrapes URL (or an already fetched Page), returns social media links
+    filtering out Ballotpedia hosts and .gov.
+    """
     if not url:
         return {}
     try:
-        resp = requests.get(url, headers=REQUEST_HEADERS, timeout=10)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        links = [a['href'] for a in soup.find_all('a', href=True)]
+        links = as_page(url).anchors
         social_links = {}
-        for name, pattern in SOCIAL_PATTERNS.items():
-            for link in links:
-                if 'ballotpedia' in link.lower() or '.gov' in link.lower():
-                    continue
-                if re.search(pattern, link, re.IGNORECASE):
-                    social_links[name] = link
-                    break
-        return social_links
+        # One scan per link classifies it against every platform at once;
+        # the first link found for a platform wins
+        for link in links:
+            lower = link.lower()
+            if 'ballotpedia' in lower or '.gov' in lower:
+                continue
+            for name in match_platforms(link):
+                social_links.setdefault(name, link)
+            if len(social_links) == len(SOCIAL_PATTERNS):
+                break
+        return in_platform_order(social_links)
     except requests.RequestException:
         return {}
 
 
-def get_candidate_socials(candidate_name):
-    """Returns {'campaign_site': url_or_None, 'social_links': {...}}"""
-    bp_url = find_ballotpedia_url(candidate_name)
-    if not bp_url:
-        print(f"❌ No Ballotpedia page found for {candidate_name}")
-        return {'campaign_site': None, 'social_links': {}}
-
-    print(f"🔗 Ballotpedia: {bp_url}")
-    campaign_site = find_campaign_site(bp_url, candidate_name)
+def _extract_candidate(bp_url, candidate_name, hashes=None):
+    """
+    Returns (campaign_site, socials_bp, socials_cam) for a known Ballotpedia
+    page; see get_candidate_socials for hashes.
+    """
+    try:
+        with metrics.timer('stage_seconds', stage='fetch_ballotpedia'):
+            bp_page = fetch_page(bp_url)
+    except requests.RequestException:
+        bp_page = None
+    with metrics.timer('stage_seconds', stage='find_campaign_site'):
+        campaign_site = find_campaign_site(bp_page, candidate_name)
+    campaign_page = None
     if campaign_site:
-        print(f"🌐 Campaign Site: {campaign_site}")
-    else:
-        print("⚠️ Campaign site not found.")
-
-    socials_bp = extract_social_links(bp_url)
-    socials_cam = extract_social_links(campaign_site) if campaign_site else {}
+        with metrics.timer('stage_seconds', stage='fetch_campaign'):
+            try:
+                campaign_page = fetch_page(campaign_site)
+            except requests.RequestException:
+                pass
+    with metrics.timer('stage_seconds', stage='extract_social_links'):
+        socials_bp = extract_social_links(bp_page)
+    socials_cam = {}
+    if campaign_page is not None:
+        with metrics.timer('stage_seconds', stage='extract_social_links'):
+            socials_cam = extract_social_links(campaign_page)
+    if hashes is not None:
+        if bp_page is not None:
+            hashes['ballotpedia'] = content_hash(bp_page)
+        if campaign_page is not None:
+            hashes['campaign'] = content_hash(campaign_page)
+    return campaign_site, socials_bp, socials_cam
+
+
+def merge_socials(socials_bp, socials_cam):
+    """One link per platform, in SOCIAL_PATTERNS order; the campaign site's links win."""
     merged = {}
     for platform in SOCIAL_PATTERNS:
         if platform in socials_cam:
             merged[platform] = socials_cam[platform]
         elif platform in socials_bp:
             merged[platform] = socials_bp[platform]
+    return merged
+
+
+def get_candidate_socials(candidate_name, verbose=True, bp_url=None, parse_pool=None, hashes=None):
+    """
+    Returns {'ballotpedia_url': url_or_None, 'campaign_site': url_or_None, 'social_links': {...}}
+    Pass verbose=False to suppress progress output (e.g. in batch runs), and
+    bp_url when the Ballotpedia page is already known (e.g. bulk-resolved).
+    With a parse_pool (parse_pool.ParsePool), pages are parsed in its worker
+    processes while this thread only does the network I/O.
+    hashes: optional dict that receives the content_hash of the pages parsed
+    ('ballotpedia', 'campaign'), for run_state.RunState.record.
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
+    if not bp_url:
+        with metrics.timer('stage_seconds', stage='find_ballotpedia_url'):
+            bp_url = find_ballotpedia_url(candidate_name)
+    if not bp_url:
+        log(f"❌ No Ballotpedia page found for {candidate_name}")
+        return {'ballotpedia_url': None, 'campaign_site': None, 'social_links': {}}
+
+    log(f"🔗 Ballotpedia: {bp_url}")
+    if parse_pool is None:
+        campaign_site, socials_bp, socials_cam = _extract_candidate(bp_url, candidate_name, hashes)
+    else:
+        campaign_site, socials_bp, socials_cam = parse_pool.extract_candidate(
+            bp_url, candidate_name, hashes)
+    if campaign_site:
+        log(f"🌐 Campaign Site: {campaign_site}")
+    else:
+        log("⚠️ Campaign site not found.")
 
-    return {'campaign_site': campaign_site, 'social_links': merged}
+    merged = merge_socials(socials_bp, socials_cam)
+    return {'ballotpedia_url': bp_url, 'campaign_site': campaign_site, 'social_links': merged}
 
 
 if __name__ == '__main__':
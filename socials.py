@@ -0,0 +1,91 @@
+import re
+from urllib.parse import parse_qs, urlsplit
+
+# Social media regex patterns
+SOCIAL_PATTERNS = {
+    'Twitter': r'(?:twitter\.com|x\.com)/',
+    'Facebook': r'facebook\.com/',
+    'Instagram': r'instagram\.com/',
+    'Youtube': r'youtube\.com/',
+    'Tiktok': r'tiktok\.com/',
+    'Linkedin': r'linkedin\.com/',
+    'Threads': r'threads\.net/',
+    'Bluesky': r'bsky\.app/',
+}
+
+# Allowed domains for each platform
+ALLOWED_SOCIAL_DOMAINS = {
+    'Twitter':  {'twitter.com', 'www.twitter.com', 'x.com', 'www.x.com'},
+    'Facebook': {'facebook.com', 'www.facebook.com'},
+    'Instagram':{'instagram.com', 'www.instagram.com'},
+    'Youtube':  {'youtube.com', 'www.youtube.com', 'youtu.be'},
+    'Tiktok':   {'tiktok.com', 'www.tiktok.com'},
+    'Linkedin': {'linkedin.com', 'www.linkedin.com'},
+    'Threads':  {'threads.net', 'www.threads.net'},
+    'Bluesky':  {'bsky.app', 'www.bsky.app'},
+}
+
+# Domains to exclude when searching for campaign site
+SOCIAL_DOMAINS = [
+    'twitter.com', 'x.com', 'facebook.com', 'instagram.com',
+    'youtube.com', 'tiktok.com', 'linkedin.com', 'threads.net', 'bsky.app'
+]
+
+# Per-platform compiled patterns
+PLATFORM_REGEXES = {
+    platform: re.compile(pat, re.IGNORECASE) for platform, pat in SOCIAL_PATTERNS.items()
+}
+
+# All platforms as one alternation; group p<i> is the i-th platform in SOCIAL_PATTERNS
+SOCIAL_REGEX = re.compile(
+    '|'.join(f'(?P<p{i}>{pat})' for i, pat in enumerate(SOCIAL_PATTERNS.values())),
+    re.IGNORECASE,
+)
+_GROUP_PLATFORMS = {f'p{i}': platform for i, platform in enumerate(SOCIAL_PATTERNS)}
+
+# Exact host -> platform, from ALLOWED_SOCIAL_DOMAINS
+SOCIAL_HOSTS = {
+    host: platform for platform, hosts in ALLOWED_SOCIAL_DOMAINS.items() for host in hosts
+}
+
+
+def match_platforms(href):
+    """Yields every platform whose pattern occurs in href, scanning it once."""
+    for m in SOCIAL_REGEX.finditer(href):
+        yield _GROUP_PLATFORMS[m.lastgroup]
+
+
+def in_platform_order(socials):
+    """Returns socials re-ordered to follow SOCIAL_PATTERNS."""
+    return {platform: socials[platform] for platform in SOCIAL_PATTERNS if platform in socials}
+
+
+# Leading path segments that are not part of a profile's handle
+_HANDLE_PREFIXES = {'pages', 'people', 'pg', 'in', 'company', 'c', 'channel', 'user', 'profile'}
+
+
+def social_handle(url):
+    """
+    Normalized handle of a social profile URL, used to spot candidates that
+    share a page: 'facebook.com/janedoe' for any of
+    https://www.facebook.com/JaneDoe/, http://m.facebook.com/janedoe?ref=ts ...
+    Twitter and x.com URLs map to the same handle. Returns None for URLs
+    without a profile path.
+    """
+    parts = urlsplit(url if '//' in url else '//' + url)
+    host = (parts.hostname or '').lower()
+    for prefix in ('www.', 'm.', 'mobile.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    if host == 'x.com':
+        host = 'twitter.com'
+    segments = [s for s in parts.path.lower().split('/') if s]
+    if segments and segments[0] == 'profile.php':
+        # Numeric Facebook profiles: the id is the handle
+        user_id = parse_qs(parts.query).get('id')
+        return f'{host}/{user_id[0]}' if user_id else None
+    while len(segments) > 1 and segments[0] in _HANDLE_PREFIXES:
+        segments.pop(0)
+    if not segments:
+        return None
+    return f"{host}/{segments[0].lstrip('@')}"
@@ -0,0 +1,182 @@
+import os
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+
+# Threads of the pool shared by all graphs (started only as needed)
+GRAPH_WORKERS = int(os.getenv('SCRAPE_GRAPH_WORKERS', 64))
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    """The thread pool graphs run on unless given their own."""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ThreadPoolExecutor(GRAPH_WORKERS, thread_name_prefix='graph')
+        return _shared_pool
+
+
+def _found(result):
+    return result is not None
+
+
+def _copy_outcome(source, target):
+    """Resolves future target with source's result or exception."""
+    if source.cancelled():
+        target.set_exception(CancelledError())
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+def _when_done(futures, callback):
+    """Calls callback() once every future in futures is done (at once if there are none)."""
+    if not futures:
+        callback()
+        return
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def one_done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            callback()
+
+    for future in futures:
+        future.add_done_callback(one_done)
+
+
+class TaskGraph:
+    """
+    Runs the steps of one job as a dependency graph on a thread pool (by
+    default one shared by every graph): each step starts as soon as the steps
+    it depends on have finished, so independent steps (e.g. parsing one page
+    while another downloads) overlap.
+      - add(name, func, *deps):  func(*results of deps)
+      - race(name, *funcs, stagger=s): hedged alternatives - the first func
+                                 starts at once, each next one after `stagger`
+                                 seconds or as soon as the previous ones all
+                                 failed; the first result accepted (not None by
+                                 default) wins and funcs not yet started never run
+      - result(name) waits for a step; a failed dependency fails its dependents
+    Steps never block a pool thread waiting on each other, so graphs can't
+    deadlock however they are wired, even sharing a pool. Use as a context
+    manager: leaving it cancels whatever has not started. A racer or step
+    already running can't be interrupted: it runs to completion and its
+    result is dropped.
+    """
+
+    def __init__(self, pool=None):
+        self._pool = pool or shared_pool()
+        self._steps = {}
+        self._running = []
+        self._timers = []
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._closed = True
+        for timer in self._timers:
+            timer.cancel()
+        for future in list(self._steps.values()) + self._running:
+            future.cancel()
+
+    def _submit(self, func, *args):
+        if self._closed:
+            raise RuntimeError('graph closed')
+        future = self._pool.submit(func, *args)
+        self._running.append(future)
+        return future
+
+    def add(self, name, func, *deps):
+        """Schedules func(*dep results) once all deps are done; returns its Future."""
+        step = Future()
+        inputs = [self._steps[dep] for dep in deps]
+
+        def start():
+            if not step.set_running_or_notify_cancel():
+                return
+            try:
+                args = [future.result() for future in inputs]
+            except BaseException as e:
+                step.set_exception(e)
+                return
+            try:
+                self._submit(func, *args).add_done_callback(lambda f: _copy_outcome(f, step))
+            except RuntimeError as e:
+                # Graph closed while this step was waiting
+                step.set_exception(e)
+
+        self._steps[name] = step
+        _when_done(inputs, start)
+        return step
+
+    def race(self, name, *funcs, accept=_found, stagger=0):
+        """
+        Runs funcs as hedged alternatives (see the class docstring); the
+        step's result is the first one for which accept(result) is true, or
+        None when no result is accepted. A racer that raises simply loses.
+        With stagger=0 all funcs start at once.
+        """
+        step = Future()
+        step.set_running_or_notify_cancel()
+        racers = []
+        lock = threading.Lock()
+
+        def start_next():
+            with lock:
+                if step.done() or len(racers) == len(funcs):
+                    return
+                try:
+                    racer = self._submit(funcs[len(racers)])
+                except RuntimeError:
+                    # Graph closed: the race is abandoned
+                    step.set_result(None)
+                    return
+                racers.append(racer)
+            racer.add_done_callback(finished)
+            if stagger and len(racers) < len(funcs):
+                timer = threading.Timer(stagger, start_next)
+                timer.daemon = True
+                self._timers.append(timer)
+                timer.start()
+            elif not stagger:
+                start_next()
+
+        def finished(future):
+            try:
+                result = future.result()
+            except BaseException:
+                result = None
+            with lock:
+                if step.done():
+                    return
+                if accept(result):
+                    step.set_result(result)
+                elif len(racers) == len(funcs):
+                    if all(racer.done() for racer in racers):
+                        step.set_result(None)
+                    return
+            if step.done():
+                for racer in racers:
+                    racer.cancel()
+            else:
+                # Lost with no winner yet: start the next one without waiting out the stagger
+                start_next()
+
+        self._steps[name] = step
+        start_next()
+        return step
+
+    def result(self, name, timeout=None):
+        return self._steps[name].result(timeout)
@@ -0,0 +1,37 @@
+import os
+import sys
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The modules live at the repository root, next to this directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+
+
+def read_fixture(name, mode='r'):
+    with open(os.path.join(FIXTURES, name), mode, encoding=None if 'b' in mode else 'utf-8') as f:
+        return f.read()
+
+
+@pytest.fixture
+def fixture_site():
+    """Base URL of a local HTTP server serving tests/fixtures (no network)."""
+    handler = partial(_QuietHandler, directory=FIXTURES)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
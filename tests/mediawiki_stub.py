@@ -0,0 +1,135 @@
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# MediaWiki's per-query title limit for normal clients (ballotpedia_api.MAX_TITLES_PER_QUERY)
+MAX_TITLES = 50
+
+# Characters MediaWiki rejects in titles
+INVALID_TITLE_CHARS = set('<>[]{}|#')
+
+
+def normalize(title):
+    """MediaWiki title normalization: underscores to spaces, first letter upper-cased."""
+    title = ' '.join(title.replace('_', ' ').split())
+    return title[:1].upper() + title[1:]
+
+
+class MediaWikiStub(ThreadingHTTPServer):
+    """
+    Local stand-in for Ballotpedia's api.php, answering action=query
+    &titles=...&redirects=1&formatversion=2 like MediaWiki does:
+      - 'normalized' for titles that are not in canonical form
+      - 'redirects' for titles in `redirects` (followed in chains)
+      - pages marked 'missing' or 'invalid'
+    Requests containing a title from fail_titles get fail_status with an
+    HTML error page instead. Every request's title list is kept in .queries.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, pages=(), redirects=None, fail_titles=(), fail_status=403,
+                 host='127.0.0.1', port=0):
+        super().__init__((host, port), _Handler)
+        self.pages = {normalize(p) for p in pages}
+        self.redirects = {normalize(k): normalize(v) for k, v in (redirects or {}).items()}
+        self.fail_titles = set(fail_titles)
+        self.fail_status = fail_status
+        self.queries = []
+        self._thread = None
+
+    @property
+    def api_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/wiki/api.php'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def answer(self, titles):
+        normalized, redirects, pages = [], [], []
+        for title in titles:
+            if not title.strip() or INVALID_TITLE_CHARS & set(title):
+                pages.append({'title': title, 'invalid': True, 'invalidreason': 'bad title'})
+                continue
+            current = normalize(title)
+            if current != title:
+                normalized.append({'fromencoded': False, 'from': title, 'to': current})
+            seen = set()
+            while current in self.redirects and current not in seen:
+                seen.add(current)
+                redirects.append({'from': current, 'to': self.redirects[current]})
+                current = self.redirects[current]
+            if current in self.pages:
+                pages.append({'pageid': sorted(self.pages).index(current) + 1, 'ns': 0, 'title': current})
+            else:
+                pages.append({'ns': 0, 'title': current, 'missing': True})
+        query = {'pages': pages}
+        if normalized:
+            query['normalized'] = normalized
+        if redirects:
+            query['redirects'] = redirects
+        return {'batchcomplete': True, 'query': query}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        params = parse_qs(parts.query)
+        if parts.path != '/wiki/api.php' or params.get('action') != ['query']:
+            self._send(404, 'text/html', b'<html><body>Not Found</body></html>')
+            return
+        titles = params.get('titles', [''])[0].split('|')
+        self.server.queries.append(titles)
+        if self.server.fail_titles & set(titles):
+            self._send(self.server.fail_status, 'text/html',
+                       b'<html><body>Request blocked</body></html>')
+            return
+        if len(titles) > MAX_TITLES:
+            body = {'error': {'code': 'toomanyvalues',
+                              'info': f'Too many values supplied for parameter "titles". '
+                                      f'The limit is {MAX_TITLES}.'}}
+        else:
+            body = self.server.answer(titles)
+        self._send(200, 'application/json; charset=utf-8', json.dumps(body).encode('utf-8'))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve a fake Ballotpedia api.php; point SCRAPE_BALLOTPEDIA_API at it.')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--page', action='append', default=[], metavar='TITLE',
+                        help='an existing page (repeatable)')
+    parser.add_argument('--redirect', action='append', default=[], metavar='FROM=TO',
+                        help='a redirect (repeatable)')
+    args = parser.parse_args(argv)
+    redirects = dict(r.split('=', 1) for r in args.redirect)
+    stub = MediaWikiStub(args.page, redirects, port=args.port)
+    print(f'Serving {stub.api_url}')
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import pytest
+
+import ballotpedia_api
+import host_health
+import http_cache
+import title_index
+from mediawiki_stub import MediaWikiStub
+from throttle import host_limiter
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    """No HTTP cache, host health, title index or rate limit: every lookup reaches the stub."""
+    monkeypatch.setattr(http_cache, 'CACHE_ENABLED', False)
+    monkeypatch.setattr(http_cache, '_cache', None)
+    monkeypatch.setattr(host_health, 'HEALTH_ENABLED', False)
+    monkeypatch.setattr(title_index, 'INDEX_ENABLED', False)
+    monkeypatch.setitem(host_limiter.rates, '127.0.0.1', None)
+    monkeypatch.setattr(host_limiter, 'robots', False)
+    host_limiter.configure()
+    yield
+    host_limiter.configure()
+
+
+@pytest.fixture
+def stub():
+    server = MediaWikiStub(
+        pages=['Jane Doe', 'John Q. Public', 'José Ortiz'],
+        redirects={'John Public': 'John Q. Public', 'Johnny Public': 'John Public'},
+        fail_titles=['Blocked Name'],
+    ).start()
+    yield server
+    server.stop()
+
+
+def test_resolve_titles_follows_normalization_and_redirects(stub):
+    resolved = ballotpedia_api.resolve_titles(
+        ['Jane Doe', 'jane_Doe', 'John Public', 'Johnny_Public', 'Nobody Here', 'Bad <title>'],
+        stub.api_url)
+    assert resolved == {
+        'Jane Doe': 'Jane Doe',
+        'jane_Doe': 'Jane Doe',
+        'John Public': 'John Q. Public',
+        'Johnny_Public': 'John Q. Public',
+        'Nobody Here': None,
+        'Bad <title>': None,
+    }
+
+
+def test_resolve_ballotpedia_urls(stub):
+    urls = ballotpedia_api.resolve_ballotpedia_urls(
+        ['Jane Doe', 'jane   Doe', 'John Public', 'José Ortiz', 'Nobody Here'], stub.api_url)
+    assert urls == {
+        'Jane Doe': 'https://ballotpedia.org/Jane_Doe',
+        'jane   Doe': 'https://ballotpedia.org/Jane_Doe',
+        'John Public': 'https://ballotpedia.org/John_Q._Public',
+        'José Ortiz': 'https://ballotpedia.org/José_Ortiz',
+        'Nobody Here': None,
+    }
+    assert len(stub.queries) == 1
+
+
+def test_titles_are_sent_50_per_request(stub):
+    names = [f'Candidate Number{i}' for i in range(120)] + ['Jane Doe']
+    resolved = ballotpedia_api.resolve_titles(names, stub.api_url)
+    assert [len(q) for q in stub.queries] == [50, 50, 21]
+    assert resolved['Jane Doe'] == 'Jane Doe'
+    assert resolved['Candidate Number7'] is None
+
+
+def test_failed_batch_is_left_out(stub):
+    names = [f'Candidate Number{i}' for i in range(49)] + ['Blocked Name', 'Jane Doe']
+    resolved = ballotpedia_api.resolve_titles(names, stub.api_url)
+    # The first 50 titles (with the blocked one) failed as a whole; the rest resolved
+    assert set(resolved) == {'Jane Doe'}
+    urls = ballotpedia_api.resolve_ballotpedia_urls(names, stub.api_url)
+    assert 'Blocked Name' not in urls and 'Candidate Number0' not in urls
+    assert urls['Jane Doe'] == 'https://ballotpedia.org/Jane_Doe'
+
+
+def test_api_error_response_fails_the_batch(stub, monkeypatch):
+    monkeypatch.setattr(ballotpedia_api, 'MAX_TITLES_PER_QUERY', 60)
+    names = [f'Candidate Number{i}' for i in range(55)]
+    # The stub, like MediaWiki, refuses more than 50 titles: not the same as "missing"
+    assert ballotpedia_api.resolve_titles(names, stub.api_url) == {}
+
@@ -0,0 +1,46 @@
+import pytest
+
+from contact_info import EMAIL_PATTERN, ContactCrawl, page_contact_info
+from page import Page
+
+NO_INFO = {'addresses': [], 'phones': [], 'emails': []}
+
+
+def test_redirected_page_resolves_links_against_its_final_url():
+    crawl = ContactCrawl('http://example.org/camp')
+    assert crawl.next_urls(1) == [('http://example.org/camp', 0)]
+    info = {**NO_INFO, 'emails': ['jane@example.org']}
+    crawl.add_extracted('http://example.org/camp', 0, info,
+                        ['about.html', 'index.html', './', '#top', '/camp/'], 100,
+                        final_url='http://example.org/camp/')
+    assert crawl.pages == ['http://example.org/camp/']
+    assert crawl.items['emails'] == {'jane@example.org': 'http://example.org/camp/'}
+    # The landing page itself (under any of its names) is not queued again
+    assert crawl.next_urls(10) == [('http://example.org/camp/about.html', 1)]
+
+
+def test_page_redirected_to_a_crawled_page_is_recorded_once():
+    crawl = ContactCrawl('http://example.org/')
+    crawl.next_urls(1)
+    crawl.add_extracted('http://example.org/', 0, NO_INFO, ['/home', '/contact'], 100)
+    assert [url for url, _ in crawl.next_urls(10)] == ['http://example.org/contact',
+                                                       'http://example.org/home']
+    crawl.add_extracted('http://example.org/home', 1, NO_INFO, [], 100,
+                        final_url='http://example.org/')
+    assert crawl.pages == ['http://example.org/']
+    assert crawl.bytes == 200
+
+
+@pytest.mark.parametrize('text, emails', [
+    ('Email:jane@x.org', ['jane@x.org']),
+    ('555-1234jane@x.org', ['555-1234jane@x.org']),
+    ('Call (555) 555-1234jane@x.org', ['jane@x.org']),
+    ('Write to Jane.Doe@Example.org.', ['jane.doe@example.org']),
+])
+def test_emails_run_together_with_other_text(text, emails):
+    page = Page('https://example.org/', f'<html><body><p>{text}</p></body></html>')
+    info = page_contact_info(page)
+    assert info['emails'] == emails
+    # Everything the separate email scan finds is still found
+    for old in EMAIL_PATTERN.findall(text):
+        assert any(email in old.lower() for email in info['emails'])
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+import fastparse
+import page
+from conftest import FIXTURES, read_fixture
+
+PAGES = sorted(name for name in os.listdir(FIXTURES) if name.endswith('.html'))
+
+
+def soup_extract(html):
+    return page._extract_soup(BeautifulSoup(html, 'html.parser'))
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_matches_beautifulsoup(name):
+    html = read_fixture(name)
+    assert fastparse.extract(html) == soup_extract(html)
+
+
+@pytest.mark.parametrize('html', [
+    '',
+    '<p>no infobox</p>',
+    '<table class="infobox"></table>',
+    '<table class="infobox"><tr><td><a href="/a">a</a></td><th>late</th></tr></table>',
+    '<a href="/unclosed">text',
+    '<address>open <address>nested</address> tail',
+    '<![CDATA[cdata text]]><p>after</p>',
+])
+def test_edge_cases_match(html):
+    assert fastparse.extract(html) == soup_extract(html)
+
+
+def test_page_backends_agree():
+    html = read_fixture('ballotpedia_candidate.html')
+    fast = page.Page('https://ballotpedia.org/Jane_Q._Doe', html, parser='fast')
+    soup = page.Page('https://ballotpedia.org/Jane_Q._Doe', html, parser='bs4')
+    assert fast.anchors == soup.anchors
+    assert fast.infobox_rows == soup.infobox_rows
+    assert page.content_hash(fast) == page.content_hash(soup)
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+
+import host_health
+import http_cache
+import result_store
+import title_index
+from http_cache import HTTPCache, build_response
+
+
+def store(cache, path, size, method='GET'):
+    url = f'https://example.org/{path}'
+    cache.store(method, url, build_response(url, 200, {'Content-Type': 'text/html'},
+                                            os.urandom(size)))
+
+
+def summed(cache):
+    return cache._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+
+def test_total_tracks_stores_replacements_and_deletes(tmp_path):
+    cache = HTTPCache(str(tmp_path), max_bytes=10 ** 9)
+    for i in range(5):
+        store(cache, i, 500)
+    store(cache, 0, 2000)
+    store(cache, 0, 0, method='HEAD')
+    cache.delete('GET', 'https://example.org/1')
+    assert cache.total_bytes() == summed(cache) > 0
+    cache.clear()
+    assert cache.total_bytes() == 0
+
+
+def test_evicts_least_recently_used_below_the_budget(tmp_path):
+    cache = HTTPCache(str(tmp_path), max_bytes=5000)
+    for i in range(10):
+        store(cache, i, 1000)
+    assert cache.total_bytes() == summed(cache) <= 5000
+    assert cache.lookup('GET', 'https://example.org/9') is not None
+    assert cache.lookup('GET', 'https://example.org/0') is None
+
+
+def test_total_of_a_cache_from_before_the_totals_table(tmp_path):
+    cache = HTTPCache(str(tmp_path), max_bytes=10 ** 9)
+    for i in range(3):
+        store(cache, i, 500)
+    expected = cache.total_bytes()
+    cache._db.close()
+    db = sqlite3.connect(str(tmp_path / 'index.sqlite'))
+    with db:
+        db.execute('DROP TABLE totals')
+        db.execute('DROP TRIGGER entries_added')
+        db.execute('DROP TRIGGER entries_removed')
+    db.close()
+    assert HTTPCache(str(tmp_path)).total_bytes() == expected
+
+
+def test_stores_beside_the_cache_follow_its_directory(tmp_path, monkeypatch):
+    for module, path, opened in ((host_health, 'HEALTH_DB', '_tracker'),
+                                 (title_index, 'INDEX_PATH', '_index'),
+                                 (result_store, 'STORE_PATH', '_store')):
+        monkeypatch.setattr(module, path, None)
+        monkeypatch.setattr(module, opened, None)
+    monkeypatch.setattr(host_health, 'HEALTH_ENABLED', True)
+    monkeypatch.setattr(title_index, 'INDEX_ENABLED', True)
+    # Configured after the modules were imported
+    monkeypatch.setattr(http_cache, 'CACHE_DIR', str(tmp_path / 'moved'))
+    host_health.get_tracker()
+    title_index.get_index()
+    result_store.get_store()
+    assert sorted(os.listdir(tmp_path / 'moved')) == ['hosts.sqlite', 'results.sqlite', 'titles.sqlite']
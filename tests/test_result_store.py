@@ -0,0 +1,34 @@
+from result_store import ResultStore, site_key
+
+NO_INFO = {'addresses': [], 'phones': [], 'emails': []}
+
+
+def candidate(name, site):
+    return {'name': name, 'ballotpedia_url': None, 'campaign_site': site, 'social_links': {},
+            'error': None}
+
+
+def test_site_key():
+    assert site_key('https://www.JaneDoe.com/about') == 'janedoe.com'
+    assert site_key('janedoe.com') == 'janedoe.com'
+    assert site_key('https://sites.google.com/view/JaneDoe/home') == 'sites.google.com/view/janedoe'
+    assert site_key('linktr.ee/janedoe') == 'linktr.ee/janedoe'
+
+
+def test_sites_on_a_shared_host_are_kept_apart(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    store.record_candidate(candidate('Jane Doe', 'https://sites.google.com/view/janedoe'))
+    store.record_candidate(candidate('John Roe', 'https://sites.google.com/view/johnroe'))
+    store.record_candidate(candidate('Ann Poe', 'https://www.poe.org/'))
+    store.record_candidate(candidate('Bob Poe', 'https://poe.org/bob'))
+    store.record_contacts('https://sites.google.com/view/janedoe', {**NO_INFO, 'emails': ['jane@x.org']})
+    store.record_contacts('https://sites.google.com/view/johnroe/contact',
+                          {**NO_INFO, 'emails': ['john@x.org']})
+
+    def names(rows):
+        return [row['name'] for row in rows]
+    assert names(store.by_campaign_domain('https://sites.google.com/view/janedoe/')) == ['Jane Doe']
+    assert names(store.by_campaign_domain('poe.org')) == ['Ann Poe', 'Bob Poe']
+    assert store.contacts('https://sites.google.com/view/janedoe')['emails'] == ['jane@x.org']
+    assert store.contacts('https://sites.google.com/view/johnroe')['emails'] == ['john@x.org']
+    assert names(store.by_contact('JOHN@x.org')) == ['John Roe']
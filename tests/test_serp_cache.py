@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+
+import serp_cache
+import socialmedia
+from serp_cache import FakeSearch, SerpBudgetExceeded, SerpClient
+
+QUERY = 'Jane Doe Ballotpedia site:ballotpedia.org'
+RESULTS = {QUERY: ['https://en.wikipedia.org/wiki/Jane_Doe', 'https://ballotpedia.org/Jane_Doe']}
+
+
+def params(q=QUERY, **extra):
+    return {'engine': 'google', 'q': q, 'start': 0, 'num': 10, 'api_key': 'secret', **extra}
+
+
+@pytest.fixture
+def fake():
+    return FakeSearch.serving(RESULTS)
+
+
+@pytest.fixture
+def client(tmp_path, fake):
+    return SerpClient(str(tmp_path / 'serpapi.sqlite'), search_cls=fake)
+
+
+def test_repeated_query_is_served_from_cache(client, fake):
+    first = client.search(params())
+    second = client.search(params())
+    assert second == first
+    assert first['organic_results'][1]['link'] == 'https://ballotpedia.org/Jane_Doe'
+    assert len(fake.calls) == 1
+
+
+def test_api_key_is_not_part_of_the_cache_key(client, fake):
+    client.search(params(api_key='one'))
+    client.search(params(api_key='two'))
+    assert len(fake.calls) == 1
+
+
+def test_cache_persists_across_clients(tmp_path, fake):
+    path = str(tmp_path / 'serpapi.sqlite')
+    SerpClient(path, search_cls=fake).search(params())
+    SerpClient(path, search_cls=fake).search(params())
+    assert len(fake.calls) == 1
+
+
+def test_expired_entries_are_searched_again(tmp_path, fake):
+    client = SerpClient(str(tmp_path / 'serpapi.sqlite'), ttl=0, search_cls=fake)
+    client.search(params())
+    client.search(params())
+    assert len(fake.calls) == 2
+
+
+def test_no_results_answer_is_cached(client, fake):
+    assert 'error' in client.search(params(q='nobody at all'))
+    client.search(params(q='nobody at all'))
+    assert len(fake.calls) == 1
+
+
+def test_api_errors_are_not_cached(tmp_path):
+    class Failing(FakeSearch):
+        calls = []
+
+        def get_dict(self):
+            self.calls.append(self.params)
+            return {'error': 'Invalid API key.'}
+
+    client = SerpClient(str(tmp_path / 'serpapi.sqlite'), search_cls=Failing)
+    client.search(params())
+    client.search(params())
+    assert len(Failing.calls) == 2
+
+
+def test_concurrent_identical_queries_share_one_call(tmp_path):
+    slow = FakeSearch.serving(RESULTS, delay=0.2)
+    client = SerpClient(str(tmp_path / 'serpapi.sqlite'), search_cls=slow)
+    answers = []
+    threads = [threading.Thread(target=lambda: answers.append(client.search(params())))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(slow.calls) == 1
+    assert len(answers) == 8 and all(answer == answers[0] for answer in answers)
+
+
+def test_budget_counts_only_paid_calls(tmp_path, fake):
+    client = SerpClient(str(tmp_path / 'serpapi.sqlite'), budget=1, search_cls=fake)
+    client.search(params())
+    client.search(params())  # cached: free
+    with pytest.raises(SerpBudgetExceeded):
+        client.search(params(q='another query'))
+    assert len(fake.calls) == 1
+    assert client.calls_made == 1
+
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+    """Points the shared client at a temporary cache; returns a function installing a fake."""
+    monkeypatch.setattr(serp_cache, 'SERP_CACHE_PATH', str(tmp_path / 'serpapi.sqlite'))
+    monkeypatch.setattr(serp_cache, 'SERP_BUDGET', None)
+    monkeypatch.setattr(serp_cache, '_client', None)
+
+    def install(search_cls, budget=None):
+        monkeypatch.setattr(serp_cache, '_search_cls', search_cls)
+        monkeypatch.setattr(serp_cache, 'SERP_BUDGET', budget)
+        monkeypatch.setattr(serp_cache, '_client', None)
+    return install
+
+
+def test_search_ballotpedia_url_through_the_shared_client(shared, fake):
+    shared(fake)
+    assert socialmedia.search_ballotpedia_url('Jane Doe') == 'https://ballotpedia.org/Jane_Doe'
+    assert socialmedia.search_ballotpedia_url('Nobody Else', max_pages=2) is None
+    assert [call['q'] for call in fake.calls] == [
+        QUERY, 'Nobody Else Ballotpedia site:ballotpedia.org',
+        'Nobody Else Ballotpedia site:ballotpedia.org',
+    ]
+
+
+def test_search_ballotpedia_url_stops_at_the_budget(shared):
+    fake = FakeSearch.serving({})
+    shared(fake, budget=1)
+    assert socialmedia.search_ballotpedia_url('Nobody Else', max_pages=3) is None
+    assert len(fake.calls) == 1
@@ -0,0 +1,185 @@
+import multiprocessing
+import time
+
+import pytest
+
+import work_queue
+from work_queue import LEASE_EXPIRED, MemoryQueue, SQLiteQueue, Worker
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def make_queue(request, tmp_path):
+    """Opens queues of either backend; SQLite ones share one temp file."""
+    def make(**options):
+        if request.param == 'sqlite':
+            return SQLiteQueue(str(tmp_path / 'queue.sqlite'), **options)
+        return MemoryQueue(**options)
+    return make
+
+
+@pytest.fixture
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(work_queue, 'RETRY_DELAY', 0)
+
+
+def statuses(queue):
+    return {row['key']: (row['status'], row['attempts']) for row in queue.results()}
+
+
+def test_enqueue_is_idempotent(make_queue):
+    queue = make_queue()
+    assert queue.enqueue('socials', ['Jane Doe', 'John Roe']) == 2
+    assert queue.enqueue('socials', ['Jane Doe', 'Ann Poe']) == 1
+    assert queue.enqueue('contacts', ['Jane Doe']) == 1
+    assert queue.counts() == {'pending': 4}
+
+
+def test_done_tasks_are_not_requeued(make_queue):
+    queue = make_queue()
+    queue.enqueue('socials', ['Jane Doe'])
+    task, = queue.lease('a')
+    assert queue.complete(task, {'ok': True})
+    assert queue.enqueue('socials', ['Jane Doe']) == 0
+    assert queue.lease('a') == []
+    assert queue.counts() == {'done': 1}
+
+
+def test_each_task_is_leased_once(make_queue):
+    queue = make_queue()
+    queue.enqueue('socials', ['a', 'b', 'c'])
+    first = queue.lease('w1', 2)
+    second = queue.lease('w2', 2)
+    assert [t.key for t in first] == ['a', 'b']
+    assert [t.key for t in second] == ['c']
+    assert queue.lease('w3', 2) == []
+
+
+def test_expired_lease_is_reclaimed(make_queue):
+    queue = make_queue(lease_seconds=0.1)
+    queue.enqueue('socials', ['Jane Doe'])
+    crashed, = queue.lease('crashed')
+    assert queue.lease('other') == []
+    time.sleep(0.15)
+    task, = queue.lease('other')
+    assert (task.key, task.attempts) == ('Jane Doe', 2)
+    # The old holder lost its lease: its late result is dropped
+    assert not queue.complete(crashed, {'stale': True})
+    assert not queue.renew(crashed)
+    assert queue.complete(task, {'fresh': True})
+    assert [row['result'] for row in queue.results()] == [{'fresh': True}]
+
+
+def test_renew_keeps_the_lease(make_queue):
+    queue = make_queue(lease_seconds=0.2)
+    queue.enqueue('socials', ['Jane Doe'])
+    task, = queue.lease('a')
+    time.sleep(0.12)
+    assert queue.renew(task)
+    time.sleep(0.12)
+    assert queue.lease('b') == []
+
+
+def test_fail_retries_until_max_attempts(make_queue, no_retry_delay):
+    queue = make_queue(max_attempts=3)
+    queue.enqueue('socials', ['Jane Doe'])
+    for attempt in (1, 2, 3):
+        task, = queue.lease('a')
+        assert task.attempts == attempt
+        assert queue.fail(task, f'error {attempt}')
+    assert queue.lease('a') == []
+    row, = queue.results()
+    assert (row['status'], row['attempts'], row['error']) == ('failed', 3, 'error 3')
+
+
+def test_retry_waits_for_its_delay(make_queue, monkeypatch):
+    monkeypatch.setattr(work_queue, 'RETRY_DELAY', 60)
+    queue = make_queue()
+    queue.enqueue('socials', ['Jane Doe'])
+    task, = queue.lease('a')
+    queue.fail(task, 'boom')
+    assert queue.lease('a') == []
+    assert queue.counts() == {'pending': 1}
+
+
+def test_expired_last_attempt_fails_the_task(make_queue):
+    queue = make_queue(lease_seconds=0.05, max_attempts=2)
+    queue.enqueue('socials', ['Jane Doe'])
+    for _ in range(2):
+        queue.lease('crashed')
+        time.sleep(0.08)
+    assert queue.lease('a') == []
+    row, = queue.results()
+    assert (row['status'], row['attempts'], row['error']) == ('failed', 2, LEASE_EXPIRED)
+
+
+def test_requeue_failed(make_queue, no_retry_delay):
+    queue = make_queue(max_attempts=1)
+    queue.enqueue('socials', ['Jane Doe'])
+    task, = queue.lease('a')
+    queue.fail(task, 'boom')
+    assert queue.requeue_failed() == 1
+    task, = queue.lease('a')
+    assert task.attempts == 1
+
+
+def test_worker_drains_with_retries(make_queue, no_retry_delay, monkeypatch):
+    calls = []
+
+    def flaky(key):
+        calls.append(key)
+        if key == 'bad' or (key == 'flaky' and calls.count(key) == 1):
+            raise ValueError(key)
+        return {'key': key}
+
+    monkeypatch.setitem(work_queue.TASK_KINDS, 'test', flaky)
+    monkeypatch.setattr(work_queue.result_store, 'get_store', lambda: None)
+    monkeypatch.setattr(work_queue, 'POLL_INTERVAL', 0.01)
+    queue = make_queue(max_attempts=2)
+    queue.enqueue('test', ['good', 'flaky', 'bad'])
+    Worker(queue, threads=2).run()
+    assert statuses(queue) == {'good': ('done', 1), 'flaky': ('done', 2), 'bad': ('failed', 2)}
+
+
+@pytest.fixture
+def offline_env(monkeypatch, tmp_path):
+    """Environment for worker processes: no caches or stores, no politeness delays."""
+    for name, value in {
+        'SCRAPE_CACHE_DIR': str(tmp_path / 'cache'),
+        'SCRAPE_CACHE': '0',
+        'SCRAPE_HOST_HEALTH': '0',
+        'SCRAPE_ROBOTS': '0',
+        'SCRAPE_HOST_RATE': '0',
+        'SCRAPE_RESULT_STORE': '',
+        'SCRAPE_TITLE_INDEX': '0',
+        'SCRAPE_RETRIES': '0',
+    }.items():
+        monkeypatch.setenv(name, value)
+
+
+def test_worker_processes_drain_the_queue(tmp_path, fixture_site, offline_env):
+    path = str(tmp_path / 'queue.sqlite')
+    options = {'lease_seconds': 1, 'max_attempts': 2}
+    queue = SQLiteQueue(path, **options)
+    home = f'{fixture_site}/campaign_home.html'
+    contact = f'{fixture_site}/campaign_contact.html'
+    missing = f'{fixture_site}/missing.html'
+    queue.enqueue('contacts', [missing, home])
+    # A worker that crashed holding both: its leases expire and are handed out again
+    assert len(queue.lease('crashed', 2)) == 2
+    assert queue.enqueue('contacts', [contact, home]) == 1
+
+    # Spawned, so the workers read the environment above on import
+    context = multiprocessing.get_context('spawn')
+    procs = [context.Process(target=work_queue._work, args=(path, 2, options)) for _ in range(2)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(60)
+    assert [proc.exitcode for proc in procs] == [0, 0]
+
+    assert queue.counts() == {'done': 2, 'failed': 1}
+    rows = {row['key']: row for row in queue.results()}
+    assert (rows[home]['status'], rows[home]['attempts']) == ('done', 2)
+    assert (rows[contact]['status'], rows[contact]['attempts']) == ('done', 1)
+    assert (rows[missing]['status'], rows[missing]['attempts']) == ('failed', 2)
+    assert 'info@janedoeforohio.com' in rows[home]['result']['emails']
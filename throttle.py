@@ -0,0 +1,364 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+# Default per-host concurrency caps (hosts not listed are unlimited)
+DEFAULT_HOST_LIMITS = {
+    'ballotpedia.org': 4,
+}
+
+# Request rates (requests per second, with bursts of up to `burst`); a
+# host not listed gets its own bucket at DEFAULT_RATE. None: unlimited.
+DEFAULT_HOST_RATES = {
+    'ballotpedia.org': 5.0,
+    'serpapi.com': None,  # paid API, rate-limited by our search budget instead
+}
+DEFAULT_RATE = float(os.getenv('SCRAPE_HOST_RATE', 4.0)) or None
+DEFAULT_BURST = 8
+
+# After a 429/503: pause the host for its Retry-After (or DEFAULT_PAUSE,
+# capped at MAX_PAUSE) and halve its rate, down to MIN_RATE; each later
+# success gives back a tenth of the configured rate
+DEFAULT_PAUSE = 5.0
+MAX_PAUSE = 120.0
+MIN_RATE = 0.2
+
+# robots.txt: Disallow rules and Crawl-delay are obeyed for ROBOTS_AGENT
+ROBOTS_ENABLED = os.getenv('SCRAPE_ROBOTS', '1') not in ('0', 'false', 'no', '')
+ROBOTS_AGENT = os.getenv('SCRAPE_ROBOTS_AGENT', '*')
+ROBOTS_TTL = 24 * 3600
+ROBOTS_ERROR_TTL = 3600  # robots.txt that failed with a 5xx is retried sooner
+ROBOTS_TIMEOUT = 10  # at most; never longer than the request's own timeout
+ROBOTS_EXEMPT_HOSTS = ('serpapi.com',)
+
+
+class RobotsDisallowedError(requests.RequestException):
+    """Raised instead of fetching a URL the site's robots.txt disallows."""
+
+
+def retry_after_seconds(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None."""
+    value = (value or '').strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _matches(host, domain):
+    return host == domain or host.endswith('.' + domain)
+
+
+def host_of(url):
+    """Returns the lowercase host of a URL with any leading 'www.' removed."""
+    host = urlparse(url).netloc.lower().split(':')[0]
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
+
+class HostLimiter:
+    """
+    Caps the number of simultaneous requests per host.
+    A limit applies to the host itself and any of its subdomains.
+    """
+
+    def __init__(self, limits=None):
+        self._lock = threading.Lock()
+        self._limits = {}
+        self._semaphores = {}
+        for host, limit in (limits or {}).items():
+            self.set_limit(host, limit)
+
+    def set_limit(self, host, limit):
+        """Sets (or with limit=None removes) the concurrency cap for host."""
+        host = host.lower()
+        with self._lock:
+            if limit is None:
+                self._limits.pop(host, None)
+                self._semaphores.pop(host, None)
+            else:
+                self._limits[host] = int(limit)
+                self._semaphores[host] = threading.BoundedSemaphore(int(limit))
+
+    def _semaphore_for(self, url):
+        host = host_of(url)
+        with self._lock:
+            for limited, sem in self._semaphores.items():
+                if _matches(host, limited):
+                    return sem
+        return None
+
+    @contextmanager
+    def slot(self, url):
+        """Blocks until a request slot for the URL's host is free."""
+        sem = self._semaphore_for(url)
+        if sem is None:
+            yield
+            return
+        with sem:
+            yield
+
+
+class TokenBucket:
+    """
+    Request rate of one host. reserve() books the next free send time, so
+    concurrent callers are spaced out first come, first served.
+    """
+
+    def __init__(self, rate, burst):
+        self.configured = rate
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def available_at(self, not_before):
+        """When a token will be free (not before not_before), without taking it."""
+        self._refill(not_before)
+        if self._tokens >= 1:
+            return not_before
+        return self._updated + (1 - self._tokens) / self.rate
+
+    def reserve(self, not_before):
+        """Takes a token; returns the monotonic time the request may be sent."""
+        at = self.available_at(not_before)
+        self._tokens -= 1
+        return at
+
+
+class HostScheduler(HostLimiter):
+    """
+    HostLimiter that also keeps every host's request rate polite:
+      - token bucket per host (rates, or DEFAULT_RATE): slot() waits for a token
+      - robots.txt per host, fetched once and cached for ROBOTS_TTL:
+        allowed() checks Disallow rules, and a Crawl-delay lowers the host's rate
+      - penalize() after a 429/503 pauses the host for its Retry-After and
+        halves its rate; record_success() gradually restores it
+      - ready_in() tells how long a request to a host would wait, for queues
+        that want to serve other hosts meanwhile (see HostQueue)
+    """
+
+    def __init__(self, limits=None, rates=None, default_rate=DEFAULT_RATE,
+                 burst=DEFAULT_BURST, robots=ROBOTS_ENABLED):
+        super().__init__(limits)
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+        self.burst = burst
+        self.robots = robots
+        self._buckets = {}
+        self._paused = {}   # bucket key -> monotonic time the pause ends
+        self._robots = {}   # origin -> (RobotFileParser or None, expires)
+        self._robots_locks = {}
+
+    def configure(self, rates=None, default_rate=None, robots=None):
+        """Overrides rates (None values mean unlimited) and robots.txt handling."""
+        with self._lock:
+            if rates is not None:
+                self.rates.update(rates)
+            if default_rate is not None:
+                self.default_rate = default_rate or None
+            if robots is not None:
+                self.robots = robots
+            self._buckets.clear()
+
+    def _bucket_key(self, host):
+        for domain in self.rates:
+            if _matches(host, domain):
+                return domain
+        return host
+
+    def _bucket(self, url):
+        """(bucket key, TokenBucket or None when unlimited); call with the lock held."""
+        key = self._bucket_key(host_of(url))
+        if key not in self._buckets:
+            rate = self.rates.get(key, self.default_rate)
+            self._buckets[key] = TokenBucket(rate, self.burst) if rate else None
+        return key, self._buckets[key]
+
+    def ready_in(self, url):
+        """Seconds before a request to url's host could be sent (0: right away)."""
+        now = time.monotonic()
+        with self._lock:
+            key, bucket = self._bucket(url)
+            start = max(now, self._paused.get(key, 0.0))
+            ready = bucket.available_at(start) if bucket else start
+        return max(0.0, ready - now)
+
+    def reserve(self, url):
+        """Books a send time for url; returns the seconds to wait before sending."""
+        now = time.monotonic()
+        with self._lock:
+            key, bucket = self._bucket(url)
+            start = max(now, self._paused.get(key, 0.0))
+            ready = bucket.reserve(start) if bucket else start
+        return max(0.0, ready - now)
+
+    @contextmanager
+    def slot(self, url):
+        """Blocks until the URL's host has a free request slot and a token."""
+        with super().slot(url):
+            delay = self.reserve(url)
+            if delay:
+                time.sleep(delay)
+            yield
+
+    def penalize(self, url, retry_after=None):
+        """Backs off url's host after a 429/503 (retry_after: seconds, if the server said)."""
+        pause = min(MAX_PAUSE, retry_after if retry_after is not None else DEFAULT_PAUSE)
+        with self._lock:
+            key, bucket = self._bucket(url)
+            self._paused[key] = max(self._paused.get(key, 0.0), time.monotonic() + pause)
+            if bucket is not None:
+                bucket.rate = max(MIN_RATE, bucket.rate / 2)
+
+    def record_success(self, url):
+        with self._lock:
+            _, bucket = self._bucket(url)
+            if bucket is not None and bucket.rate < bucket.configured:
+                bucket.rate = min(bucket.configured, bucket.rate + bucket.configured / 10)
+
+    # robots.txt
+
+    def _robots_for(self, url, timeout=None):
+        parts = urlparse(url)
+        origin = f'{parts.scheme}://{parts.netloc}'
+        with self._lock:
+            cached = self._robots.get(origin)
+            if cached is not None and cached[1] > time.time():
+                return cached[0]
+            fetching = self._robots_locks.setdefault(origin, threading.Lock())
+        # One fetch per origin; other threads wait for it
+        with fetching:
+            with self._lock:
+                cached = self._robots.get(origin)
+            if cached is None or cached[1] <= time.time():
+                rules, ttl = _fetch_robots(origin + '/robots.txt', timeout)
+                cached = (rules, time.time() + ttl)
+                with self._lock:
+                    self._robots[origin] = cached
+                if rules is not None:
+                    delay = rules.crawl_delay(ROBOTS_AGENT)
+                    if delay:
+                        self._apply_crawl_delay(url, float(delay))
+        return cached[0]
+
+    def _apply_crawl_delay(self, url, delay):
+        with self._lock:
+            _, bucket = self._bucket(url)
+            rate = 1 / delay
+            if bucket is None:
+                key = self._bucket_key(host_of(url))
+                self._buckets[key] = TokenBucket(rate, 1)
+            else:
+                bucket.configured = bucket.rate = min(rate, bucket.configured)
+                bucket.burst = 1
+
+    def robots_loaded(self, url):
+        """True when allowed(url) won't need to fetch robots.txt."""
+        if not self.robots or any(_matches(host_of(url), h) for h in ROBOTS_EXEMPT_HOSTS):
+            return True
+        parts = urlparse(url)
+        with self._lock:
+            cached = self._robots.get(f'{parts.scheme}://{parts.netloc}')
+        return cached is not None and cached[1] > time.time()
+
+    def allowed(self, url, timeout=None):
+        """
+        False if url's robots.txt disallows it (fetching robots.txt on first
+        use, within timeout: the request's own timeout).
+        """
+        if not self.robots or any(_matches(host_of(url), h) for h in ROBOTS_EXEMPT_HOSTS):
+            return True
+        rules = self._robots_for(url, timeout)
+        return rules is None or rules.can_fetch(ROBOTS_AGENT, url)
+
+
+def _robots_timeout(timeout):
+    """The request's timeout (seconds or a (connect, read) tuple) capped at ROBOTS_TIMEOUT."""
+    if isinstance(timeout, tuple):
+        return tuple(_robots_timeout(t) for t in timeout)
+    return ROBOTS_TIMEOUT if timeout is None else min(timeout, ROBOTS_TIMEOUT)
+
+
+def _fetch_robots(robots_url, timeout=None):
+    """
+    (RobotFileParser, or None meaning no rules, and how long to keep the answer).
+    The fetch goes through host_health like any request: a host known to be
+    down is not asked, and a timeout or connection failure counts against it.
+    """
+    # Imported here: both depend on this module
+    import host_health
+    import http_client
+    health = host_health.get_tracker()
+    try:
+        if health is not None:
+            health.check(robots_url)
+        resp = http_client.get_session().get(robots_url, timeout=_robots_timeout(timeout))
+    except requests.RequestException as e:
+        # Unreachable: allow, let the request itself fail (or succeed) and ask again later
+        if health is not None and not isinstance(e, host_health.HostDownError):
+            health.record_failure(robots_url, e)
+        return None, ROBOTS_ERROR_TTL
+    if health is not None:
+        health.record_success(robots_url)
+    if resp.status_code >= 500:
+        return None, ROBOTS_ERROR_TTL
+    content_type = http_client.media_type(resp.headers.get('Content-Type'))
+    if resp.status_code >= 400 or content_type in http_client.HTML_CONTENT_TYPES:
+        # No robots.txt (or an HTML page served in its place): no rules
+        return None, ROBOTS_TTL
+    rules = RobotFileParser(robots_url)
+    rules.parse(resp.text.splitlines())
+    return rules, ROBOTS_TTL
+
+
+class HostQueue:
+    """
+    FIFO of (url, item) pairs that hands out first the items whose host can
+    be fetched right away, so workers stay busy on other hosts while one is
+    rate-limited or paused after a 429. Not thread-safe: one producer
+    thread feeds a pool from it.
+    """
+
+    # How far past the head of the queue get() looks for a ready host
+    SCAN_LIMIT = 256
+
+    def __init__(self, scheduler=None):
+        self.scheduler = scheduler or host_limiter
+        self._items = []
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, url, item):
+        self._items.append((url, item))
+
+    def get(self):
+        """Pops the first item whose host is ready, else the one ready soonest."""
+        best, best_wait = 0, None
+        for i, (url, _) in enumerate(self._items[:self.SCAN_LIMIT]):
+            wait = self.scheduler.ready_in(url)
+            if wait == 0:
+                best = i
+                break
+            if best_wait is None or wait < best_wait:
+                best, best_wait = i, wait
+        return self._items.pop(best)[1]
+
+
+# Shared scheduler used by all scraper fetches
+host_limiter = HostScheduler(DEFAULT_HOST_LIMITS, DEFAULT_HOST_RATES)
@@ -0,0 +1,273 @@
+import argparse
+import gzip
+import os
+import re
+import sqlite3
+import sys
+import threading
+from urllib.parse import unquote, urlsplit
+
+import http_cache
+from metrics import metrics
+from names import name_keys
+
+# Ballotpedia's article base URL
+BALLOTPEDIA_BASE = 'https://ballotpedia.org/'
+
+# Title index settings (overridable via environment or configure())
+INDEX_ENABLED = os.getenv('SCRAPE_TITLE_INDEX', '1') not in ('0', 'false', 'no', '')
+INDEX_PATH = os.getenv('SCRAPE_TITLE_INDEX_DB')  # default: titles.sqlite in http_cache.CACHE_DIR
+
+# Statuses confirming a page does not exist, after which a hint may be used
+MISSING_STATUSES = (404, 410)
+
+# Fuzzy matches: trigram (Dice) similarity of the full keys needed, and how
+# far ahead of the runner-up the best title must be to count as unambiguous
+FUZZY_THRESHOLD = 0.75
+FUZZY_MARGIN = 0.1
+
+
+def page_url(title):
+    """Article URL for a MediaWiki title, e.g. 'Jane Doe' -> https://ballotpedia.org/Jane_Doe"""
+    return BALLOTPEDIA_BASE + title.replace(' ', '_')
+
+
+def title_of(url):
+    """Page title of a Ballotpedia article URL, or None for other URLs."""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if host not in ('ballotpedia.org', 'www.ballotpedia.org') or len(parts.path) < 2:
+        return None
+    return unquote(parts.path[1:]).replace('_', ' ')
+
+
+# A trailing "(...)" marks a disambiguated title: "John Smith (Ohio)"
+_DISAMBIGUATION = re.compile(r'\s\([^)]*\)\s*$')
+
+
+def trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """
+    Known Ballotpedia page titles, matched against candidate names without
+    any network traffic:
+      - lookup(): the title whose full key (name_keys()[0]) is the name's,
+        when exactly one title has it. Only this is trusted on its own.
+      - hint(): a looser match - same first and last name, a nickname
+        expanded, or the clear trigram-similarity winner among titles with
+        the same last name. The index is usually partial, so a hint may be
+        another person: callers use it only once the exact slug is confirmed
+        missing, instead of a paid search.
+    Disambiguated titles ("John Smith (Ohio)") are stored but never matched,
+    since a bare name can't tell which of them is meant. Titles are kept in
+    SQLite; the lookup structures are built in memory when the index is opened.
+    """
+
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._titles = []            # title id -> title
+        self._ids = {}               # title -> title id
+        self._keys = ({}, {}, {})    # per name_keys() level: key -> set of title ids
+        self._grams = {}             # title id -> trigrams of the full key
+        self._by_last = {}           # last name -> title ids
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self._lock, self._db:
+                self._db.execute('CREATE TABLE IF NOT EXISTS titles (title TEXT PRIMARY KEY)')
+                for title, in self._db.execute('SELECT title FROM titles'):
+                    self._index(title)
+
+    def __len__(self):
+        return len(self._titles)
+
+    def _index(self, title):
+        """Adds title to the in-memory structures; call with the lock held."""
+        if title in self._ids:
+            return False
+        title_id = len(self._titles)
+        self._titles.append(title)
+        self._ids[title] = title_id
+        if _DISAMBIGUATION.search(title):
+            return True
+        keys = name_keys(title)
+        for level, key in enumerate(keys):
+            self._keys[level].setdefault(key, set()).add(title_id)
+        self._grams[title_id] = frozenset(trigrams(keys[0]))
+        self._by_last.setdefault(keys[1].rsplit(' ', 1)[-1], []).append(title_id)
+        return True
+
+    def add_titles(self, titles):
+        """Adds page titles (spaces or underscores); returns how many were new."""
+        with self._lock:
+            new = [t for t in (' '.join(t.replace('_', ' ').split()) for t in titles)
+                   if t and self._index(t)]
+            if new and self._db is not None:
+                with self._db:
+                    self._db.executemany('INSERT OR IGNORE INTO titles VALUES (?)',
+                                         ((t,) for t in new))
+        return len(new)
+
+    def add_url(self, url):
+        """Learns the title of a Ballotpedia URL (other URLs are ignored)."""
+        title = title_of(url) if url else None
+        return self.add_titles([title]) if title else 0
+
+    def _fuzzy(self, keys):
+        grams = trigrams(keys[0])
+        scored = sorted(
+            ((2 * len(grams & self._grams[title_id]) / (len(grams) + len(self._grams[title_id])),
+              title_id)
+             for title_id in self._by_last.get(keys[1].rsplit(' ', 1)[-1], ())),
+            reverse=True)
+        if not scored or scored[0][0] < FUZZY_THRESHOLD:
+            return None
+        if len(scored) > 1 and scored[0][0] - scored[1][0] < FUZZY_MARGIN:
+            return None
+        return scored[0][1]
+
+    def lookup(self, candidate_name):
+        """The title with candidate_name's full key, or None if unknown or ambiguous."""
+        full = name_keys(candidate_name)[0]
+        if not full:
+            return None
+        with self._lock:
+            ids = self._keys[0].get(full)
+            return self._titles[next(iter(ids))] if ids and len(ids) == 1 else None
+
+    def hint(self, candidate_name):
+        """
+        A title loosely matching candidate_name (see the class docstring), or
+        None; needs confirming before use. Never a full-key match, which is
+        lookup()'s.
+        """
+        keys = name_keys(candidate_name)
+        if ' ' not in keys[0]:
+            return None
+        with self._lock:
+            if keys[0] in self._keys[0]:
+                return None
+            for level, key in enumerate(keys[1:], 1):
+                ids = self._keys[level].get(key)
+                if ids:
+                    return self._titles[next(iter(ids))] if len(ids) == 1 else None
+            title_id = self._fuzzy(keys)
+            return self._titles[title_id] if title_id is not None else None
+
+    def lookup_url(self, candidate_name):
+        title = self.lookup(candidate_name)
+        return page_url(title) if title else None
+
+    def hint_url(self, candidate_name):
+        title = self.hint(candidate_name)
+        return page_url(title) if title else None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def configure(path=None, enabled=None):
+    """Overrides the default settings; the index is reopened on next use."""
+    global INDEX_PATH, INDEX_ENABLED, _index
+    with _index_lock:
+        if path is not None:
+            INDEX_PATH = path
+        if enabled is not None:
+            INDEX_ENABLED = enabled
+        _index = None
+
+
+def get_index():
+    """Returns the shared TitleIndex, or None when disabled."""
+    global _index
+    if not INDEX_ENABLED:
+        return None
+    with _index_lock:
+        if _index is None:
+            try:
+                path = http_cache.cache_path('titles.sqlite', INDEX_PATH)
+                if os.path.dirname(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                _index = TitleIndex(path)
+            except (OSError, sqlite3.Error):
+                # Unwritable cache directory: learn in memory only
+                _index = TitleIndex(None)
+        return _index
+
+
+def lookup_url(candidate_name):
+    """Ballotpedia URL for candidate_name from the shared index, or None."""
+    index = get_index()
+    if index is None:
+        return None
+    url = index.lookup_url(candidate_name)
+    metrics.incr('title_index_total', result='hit' if url else 'miss')
+    return url
+
+
+def hint_url(candidate_name):
+    """
+    Loosely matching Ballotpedia URL from the shared index, or None. Only for
+    names whose exact slug is confirmed missing (see TitleIndex).
+    """
+    index = get_index()
+    if index is None:
+        return None
+    url = index.hint_url(candidate_name)
+    if url:
+        metrics.incr('title_index_total', result='hint')
+    return url
+
+
+def learn_url(url):
+    """Adds a Ballotpedia URL found by a network lookup to the shared index."""
+    index = get_index()
+    if index is not None and url:
+        index.add_url(url)
+
+
+def read_titles(path):
+    """Titles from a dump: one per line (.gz ok); a header line 'page_title' is skipped."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            title = line.strip()
+            if title and title != 'page_title':
+                yield title
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or query the local Ballotpedia title index.')
+    default = http_cache.cache_path('titles.sqlite', INDEX_PATH)
+    parser.add_argument('--index', default=default, help=f'index file (default: {default})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help='add titles from dumps and/or a result store')
+    add.add_argument('dumps', nargs='*', help='title dumps, one title per line (.gz ok)')
+    add.add_argument('--store', metavar='PATH', help='also add every Ballotpedia URL in this result store')
+    lookup = commands.add_parser('lookup', help='match names against the index (exact, then hint)')
+    lookup.add_argument('names', nargs='+')
+    args = parser.parse_args(argv)
+
+    index = TitleIndex(args.index)
+    if args.command == 'add':
+        new = 0
+        for dump in args.dumps:
+            new += index.add_titles(read_titles(dump))
+        if args.store:
+            with sqlite3.connect(args.store) as db:
+                urls = [u for u, in db.execute('SELECT bp_url FROM candidates WHERE bp_url IS NOT NULL')]
+            new += index.add_titles(t for t in map(title_of, urls) if t)
+        print(f"Added {new} titles ({len(index)} in the index)", file=sys.stderr)
+    else:
+        for name in args.names:
+            exact = index.lookup_url(name)
+            hint = None if exact else index.hint_url(name)
+            print(f"{name}\t{exact or '-'}\t{hint or '-'}")
+
+
+if __name__ == '__main__':
+    main()
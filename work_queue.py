@@ -0,0 +1,454 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import contact_info
+import result_store
+from batch import URL_COLUMNS, load_names
+from candidate_graph import candidate_socials
+from metrics import metrics
+
+# Queue settings (overridable via environment or the CLI)
+LEASE_SECONDS = int(os.getenv('SCRAPE_LEASE_SECONDS', 300))
+MAX_ATTEMPTS = int(os.getenv('SCRAPE_MAX_ATTEMPTS', 3))
+RETRY_DELAY = 30  # seconds before a failed task is retried, doubling per attempt
+POLL_INTERVAL = 2.0  # workers with nothing runnable re-check for retries and expired leases
+
+# Error recorded for a task whose last attempt's worker never reported back
+LEASE_EXPIRED = 'lease expired: worker crashed or hung'
+
+# Kinds of work a task can be: key -> result dict
+TASK_KINDS = {
+    'socials': candidate_socials,                  # key: candidate name
+    'contacts': contact_info.crawl_contact_info,   # key: campaign site URL (normalize_site)
+}
+
+
+class Task:
+    """A leased unit of work: run TASK_KINDS[kind](key)."""
+
+    __slots__ = ('id', 'kind', 'key', 'attempts', 'owner')
+
+    def __init__(self, id, kind, key, attempts, owner):
+        self.id = id
+        self.kind = kind
+        self.key = key
+        self.attempts = attempts
+        self.owner = owner
+
+    def __repr__(self):
+        return f'Task({self.kind}:{self.key!r}, attempt {self.attempts})'
+
+
+def _retry_at(attempts, now):
+    return now + RETRY_DELAY * 2 ** (attempts - 1)
+
+
+class SQLiteQueue:
+    """
+    Work queue in a SQLite file shared by every worker process on the box
+    (or on a shared disk):
+      - enqueue() is idempotent: a (kind, key) pair is only ever queued once
+      - lease() hands each task to one worker for lease_seconds; a worker
+        that crashes or hangs loses the lease and the task is handed out again
+      - complete() stores the result, but only for the current lease holder,
+        so a worker that lost its lease can't overwrite a newer result
+      - fail() retries with a growing delay, up to max_attempts
+    Other backends (e.g. a Redis stand-in) only need the same methods; see
+    MemoryQueue and QUEUE_BACKENDS.
+    """
+
+    def __init__(self, path, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS tasks ('
+                ' id INTEGER PRIMARY KEY, kind TEXT, key TEXT, state TEXT, attempts INTEGER,'
+                ' owner TEXT, available_at REAL, error TEXT, result TEXT, finished REAL,'
+                ' UNIQUE (kind, key))'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (state, available_at)')
+
+    def _transaction(self, func, *args):
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(*args)
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            return result
+
+    def enqueue(self, kind, keys):
+        """Queues (kind, key) tasks not queued before; returns how many were new."""
+        def insert():
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO tasks (kind, key, state, attempts, available_at)"
+                " VALUES (?, ?, 'pending', 0, 0)", ((kind, key) for key in keys)
+            )
+            return self._db.total_changes - before
+        return self._transaction(insert)
+
+    def lease(self, owner, n=1):
+        """
+        Leases up to n runnable tasks to owner: pending ones whose retry delay
+        has passed, and leased ones whose lease has expired. An expired lease
+        that was the task's last attempt (its worker crashed or hung every
+        time) marks the task failed instead.
+        """
+        def take():
+            now = time.time()
+            self._db.execute(
+                "UPDATE tasks SET state = 'failed', error = ?, available_at = 0"
+                " WHERE state = 'leased' AND available_at <= ? AND attempts >= ?",
+                (LEASE_EXPIRED, now, self.max_attempts)
+            )
+            rows = self._db.execute(
+                "SELECT id, kind, key, attempts FROM tasks"
+                " WHERE state IN ('pending', 'leased') AND available_at <= ?"
+                " ORDER BY available_at, id LIMIT ?", (now, n)
+            ).fetchall()
+            self._db.executemany(
+                "UPDATE tasks SET state = 'leased', owner = ?, attempts = attempts + 1,"
+                " available_at = ? WHERE id = ?",
+                ((owner, now + self.lease_seconds, task_id) for task_id, *_ in rows)
+            )
+            return [Task(task_id, kind, key, attempts + 1, owner)
+                    for task_id, kind, key, attempts in rows]
+        return self._transaction(take)
+
+    def renew(self, task):
+        """Extends task's lease; False if the lease was lost to another worker."""
+        def extend():
+            cur = self._db.execute(
+                "UPDATE tasks SET available_at = ? WHERE id = ? AND state = 'leased' AND owner = ?",
+                (time.time() + self.lease_seconds, task.id, task.owner)
+            )
+            return cur.rowcount == 1
+        return self._transaction(extend)
+
+    def complete(self, task, result):
+        """Stores task's result; False (and nothing written) if the lease was lost."""
+        def finish():
+            cur = self._db.execute(
+                "UPDATE tasks SET state = 'done', result = ?, error = NULL, finished = ?"
+                " WHERE id = ? AND state = 'leased' AND owner = ?",
+                (json.dumps(result), time.time(), task.id, task.owner)
+            )
+            return cur.rowcount == 1
+        return self._transaction(finish)
+
+    def fail(self, task, error):
+        """Schedules a retry, or marks the task failed after max_attempts."""
+        def retry():
+            final = task.attempts >= self.max_attempts
+            cur = self._db.execute(
+                "UPDATE tasks SET state = ?, error = ?, available_at = ?"
+                " WHERE id = ? AND state = 'leased' AND owner = ?",
+                ('failed' if final else 'pending', error,
+                 0 if final else _retry_at(task.attempts, time.time()), task.id, task.owner)
+            )
+            return cur.rowcount == 1
+        return self._transaction(retry)
+
+    def requeue_failed(self):
+        """Gives failed tasks a fresh set of attempts; returns how many."""
+        def reset():
+            return self._db.execute(
+                "UPDATE tasks SET state = 'pending', attempts = 0, available_at = 0"
+                " WHERE state = 'failed'"
+            ).rowcount
+        return self._transaction(reset)
+
+    def counts(self):
+        """{state: number of tasks}."""
+        with self._lock:
+            return dict(self._db.execute('SELECT state, COUNT(*) FROM tasks GROUP BY state'))
+
+    def results(self):
+        """Yields {'kind', 'key', 'status', 'attempts', 'error', 'result'} per finished task."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT kind, key, state, attempts, error, result FROM tasks"
+                " WHERE state IN ('done', 'failed') ORDER BY id"
+            ).fetchall()
+        for kind, key, state, attempts, error, result in rows:
+            yield {'kind': kind, 'key': key, 'status': state, 'attempts': attempts,
+                   'error': error, 'result': json.loads(result) if result else None}
+
+
+class MemoryQueue:
+    """
+    In-process queue with SQLiteQueue's semantics, for tests and as the
+    template for other backends: the methods are all a backend needs.
+    """
+
+    def __init__(self, path=None, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._tasks = {}  # (kind, key) -> dict of the SQLite columns
+
+    def enqueue(self, kind, keys):
+        with self._lock:
+            new = 0
+            for key in keys:
+                if (kind, key) not in self._tasks:
+                    self._tasks[kind, key] = {
+                        'id': len(self._tasks), 'kind': kind, 'key': key, 'state': 'pending',
+                        'attempts': 0, 'owner': None, 'available_at': 0,
+                        'error': None, 'result': None,
+                    }
+                    new += 1
+            return new
+
+    def lease(self, owner, n=1):
+        now = time.time()
+        with self._lock:
+            for t in self._tasks.values():
+                if (t['state'] == 'leased' and t['available_at'] <= now
+                        and t['attempts'] >= self.max_attempts):
+                    t.update(state='failed', error=LEASE_EXPIRED, available_at=0)
+            ready = sorted((t for t in self._tasks.values()
+                            if t['state'] in ('pending', 'leased') and t['available_at'] <= now),
+                           key=lambda t: (t['available_at'], t['id']))[:n]
+            for t in ready:
+                t.update(state='leased', owner=owner, attempts=t['attempts'] + 1,
+                         available_at=now + self.lease_seconds)
+            return [Task(t['id'], t['kind'], t['key'], t['attempts'], owner) for t in ready]
+
+    def _held(self, task):
+        t = self._tasks[task.kind, task.key]
+        return t if t['state'] == 'leased' and t['owner'] == task.owner else None
+
+    def renew(self, task):
+        with self._lock:
+            t = self._held(task)
+            if t is not None:
+                t['available_at'] = time.time() + self.lease_seconds
+            return t is not None
+
+    def complete(self, task, result):
+        with self._lock:
+            t = self._held(task)
+            if t is not None:
+                t.update(state='done', result=result, error=None)
+            return t is not None
+
+    def fail(self, task, error):
+        with self._lock:
+            t = self._held(task)
+            if t is not None:
+                final = task.attempts >= self.max_attempts
+                t.update(state='failed' if final else 'pending', error=error,
+                         available_at=0 if final else _retry_at(task.attempts, time.time()))
+            return t is not None
+
+    def requeue_failed(self):
+        with self._lock:
+            failed = [t for t in self._tasks.values() if t['state'] == 'failed']
+            for t in failed:
+                t.update(state='pending', attempts=0, available_at=0)
+            return len(failed)
+
+    def counts(self):
+        with self._lock:
+            counts = {}
+            for t in self._tasks.values():
+                counts[t['state']] = counts.get(t['state'], 0) + 1
+            return counts
+
+    def results(self):
+        with self._lock:
+            finished = sorted((t for t in self._tasks.values() if t['state'] in ('done', 'failed')),
+                              key=lambda t: t['id'])
+        for t in finished:
+            yield {'kind': t['kind'], 'key': t['key'], 'status': t['state'],
+                   'attempts': t['attempts'], 'error': t['error'], 'result': t['result']}
+
+
+# Queue backends by URL scheme, e.g. sqlite:///data/queue.sqlite (a bare path means sqlite)
+QUEUE_BACKENDS = {
+    'sqlite': SQLiteQueue,
+    'memory': MemoryQueue,
+}
+
+
+def open_queue(url, **options):
+    scheme, sep, path = url.partition('://')
+    if not sep:
+        scheme, path = 'sqlite', url
+    return QUEUE_BACKENDS[scheme](path, **options)
+
+
+def run_task(task):
+    """Runs a leased task; returns its result dict (raises on failure)."""
+    result = TASK_KINDS[task.kind](task.key)
+    store = result_store.get_store()
+    if store is not None:
+        # Keyed by name / domain, so a repeated run just rewrites the same rows
+        if task.kind == 'socials':
+            store.record_candidate({'name': task.key, **result, 'error': None})
+        else:
+            store.record_contacts(task.key, result)
+    return result
+
+
+class Worker:
+    """
+    Leases tasks from a queue and runs up to `threads` at a time, renewing
+    the leases of running tasks every lease_seconds / 3. Returns from run()
+    once the queue has nothing left to do (nothing pending, nothing leased).
+    """
+
+    def __init__(self, queue, threads=4, name=None):
+        self.queue = queue
+        self.threads = threads
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(threads)  # released by _run_one as tasks finish
+        self._finished = threading.Event()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            with self._lock:
+                running = list(self._running)
+            for task in running:
+                self.queue.renew(task)
+
+    def _run_one(self, task):
+        try:
+            with metrics.timer('queue_task_seconds', kind=task.kind):
+                result = run_task(task)
+        except Exception as e:
+            outcome = 'retry' if self.queue.fail(task, repr(e)) else 'lost'
+        else:
+            outcome = 'done' if self.queue.complete(task, result) else 'lost'
+        finally:
+            with self._lock:
+                self._running.discard(task)
+            self._slots.release()
+            self._finished.set()
+        metrics.incr('queue_tasks_total', kind=task.kind, outcome=outcome)
+
+    def _free_slots(self):
+        """Waits for a free thread, then takes every other free one too; returns how many."""
+        self._slots.acquire()
+        free = 1
+        while free < self.threads and self._slots.acquire(blocking=False):
+            free += 1
+        return free
+
+    def run(self):
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+        try:
+            with ThreadPoolExecutor(self.threads) as pool:
+                while True:
+                    free = self._free_slots()
+                    self._finished.clear()
+                    tasks = self.queue.lease(self.name, free)
+                    for _ in range(free - len(tasks)):
+                        self._slots.release()
+                    if not tasks:
+                        counts = self.queue.counts()
+                        with self._lock:
+                            idle = not self._running
+                        if idle and not counts.get('pending') and not counts.get('leased'):
+                            return
+                        # Nothing runnable: wait for one of ours to finish (it may
+                        # be the last), a retry delay or another worker's lease to expire
+                        self._finished.wait(POLL_INTERVAL)
+                        continue
+                    for task in tasks:
+                        with self._lock:
+                            self._running.add(task)
+                        pool.submit(self._run_one, task)
+        finally:
+            self._stop.set()
+
+
+def _work(url, threads, options):
+    Worker(open_queue(url, **options), threads).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Shared work queue: enqueue a roster once, then run workers '
+                    '(on any number of processes or boxes) until it is drained.'
+    )
+    parser.add_argument('queue', help='queue URL or SQLite path (e.g. queue.sqlite)')
+    parser.add_argument('--lease', type=int, default=LEASE_SECONDS,
+                        help=f'seconds a worker holds a task (default: {LEASE_SECONDS})')
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS,
+                        help=f'tries per task before it is marked failed (default: {MAX_ATTEMPTS})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    enqueue = commands.add_parser('enqueue', help='queue candidates (or campaign sites) from a file')
+    enqueue.add_argument('roster', help='CSV or JSONL file of candidate names or site URLs')
+    enqueue.add_argument('--kind', choices=TASK_KINDS, default='socials')
+    work = commands.add_parser('work', help='run workers until the queue is drained')
+    work.add_argument('-w', '--workers', type=int, default=4, help='threads per process')
+    work.add_argument('-p', '--processes', type=int, default=1, help='worker processes')
+    commands.add_parser('status', help='task counts by state')
+    export = commands.add_parser('export', help='write finished tasks as JSON lines')
+    export.add_argument('-o', '--output', help='output file (default: stdout)')
+    commands.add_parser('requeue-failed', help='retry tasks that used up their attempts')
+    args = parser.parse_args(argv)
+
+    options = {'lease_seconds': args.lease, 'max_attempts': args.max_attempts}
+    queue = open_queue(args.queue, **options)
+    if args.command == 'enqueue':
+        if args.kind == 'contacts':
+            keys = [contact_info.normalize_site(url)
+                    for url in load_names(args.roster, URL_COLUMNS, 'url')]
+        else:
+            keys = list(load_names(args.roster))
+        new = queue.enqueue(args.kind, keys)
+        print(f"Queued {new} new {args.kind} tasks ({len(keys) - new} already queued)",
+              file=sys.stderr)
+    elif args.command == 'work':
+        if args.processes > 1:
+            procs = [multiprocessing.Process(target=_work, args=(args.queue, args.workers, options))
+                     for _ in range(args.processes)]
+            for proc in procs:
+                proc.start()
+            for proc in procs:
+                proc.join()
+        else:
+            Worker(queue, args.workers).run()
+            print(metrics.summary(), file=sys.stderr)
+        print(json.dumps(queue.counts()), file=sys.stderr)
+    elif args.command == 'status':
+        print(json.dumps(queue.counts()))
+    elif args.command == 'export':
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        try:
+            for row in queue.results():
+                out.write(json.dumps(row) + '\n')
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    else:
+        print(f"Requeued {queue.requeue_failed()} failed tasks", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()